@@ -0,0 +1,115 @@
+# ai_client.py
+# 共享的 AI 接口客户端：缓存 Token，拼装任务请求
+# 以前每次调用都要重新取两次 Token；提交与轮询由 job_engine 在共享事件循环里用同一个 httpx 连接池发出
+import time
+import threading
+import config
+import metrics
+
+# Token 提前多少秒视为过期，避免请求发出去时刚好失效
+TOKEN_REFRESH_MARGIN = 60
+# 服务端没返回 expires_in 时的默认有效期 (秒)
+DEFAULT_TOKEN_TTL = 300
+
+
+class AIClient:
+    """
+    线程安全的 AI 接口客户端，进程内共享一个实例即可 (见 get_shared_client)
+    """
+    def __init__(self, client_id=None, client_secret=None, auth_url=None, api_base_url=None):
+        self.client_id = client_id or config.CLIENT_ID
+        self.client_secret = client_secret or config.CLIENT_SECRET
+        self.auth_url = auth_url or config.AUTH_URL
+        self.api_base_url = api_base_url or config.API_BASE_URL
+
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+        self.token_fetches = 0  # 实际请求认证服务器的次数
+
+        # 只用来取 Token (keep-alive，刷新时不用重新握手)
+        # 延迟导入 requests：只导入 config / pipeline 的工具不需要加载它
+        import requests
+
+        self.session = requests.Session()
+
+    # ================= Token =================
+
+    def _token_valid(self):
+        return self._token and time.monotonic() < self._token_expires_at - TOKEN_REFRESH_MARGIN
+
+    def peek_token(self):
+        """
+        不发请求，只返回仍然有效的缓存 Token (没有则返回 None)
+        """
+        return self._token if self._token_valid() else None
+
+    def get_token(self, force_refresh=False):
+        """
+        返回缓存的 Token，快过期时才刷新；并发时只有一个线程真正去取，其余等待结果
+        """
+        if not force_refresh and self._token_valid():
+            return self._token
+
+        with self._token_lock:
+            # 拿到锁后再检查一次：可能别的线程刚刚刷新过
+            if not force_refresh and self._token_valid():
+                return self._token
+
+            payload = {'grant_type': 'client_credentials', 'client_id': self.client_id, 'client_secret': self.client_secret}
+            started = time.perf_counter()
+            try:
+                resp = self.session.post(self.auth_url, data=payload, timeout=10)
+                resp.raise_for_status()
+                data = resp.json()
+            except Exception as e:
+                print(f"❌ Token 获取失败: {e}")
+                metrics.observe("token", time.perf_counter() - started, error=str(e))
+                return None
+            metrics.observe("token", time.perf_counter() - started)
+
+            self.token_fetches += 1
+            self._token = data.get('access_token')
+            ttl = data.get('expires_in') or DEFAULT_TOKEN_TTL
+            self._token_expires_at = time.monotonic() + float(ttl)
+            return self._token
+
+    def invalidate_token(self, token):
+        """
+        服务端返回 401 时作废当前 Token (仅当它还是同一个 Token，避免误删别人刚刷新的)
+        """
+        with self._token_lock:
+            if self._token == token:
+                self._token = None
+                self._token_expires_at = 0.0
+
+    # ================= 请求 =================
+
+    def build_job_payload(self, prompt, priority=None):
+        metadata = config.API_METADATA
+        if priority is not None:
+            metadata = dict(metadata, priority=priority)
+        return {
+            "type": "callLlm",
+            "metadata": metadata,
+            "input": {"parameter": {"model_name": config.AI_MODEL_NAME, "prompt": prompt}}
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_client():
+    """
+    进程内共享的客户端 (Streamlit 各会话、批量模式各线程共用)
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = AIClient()
+    return _shared_client
@@ -0,0 +1,244 @@
+# batch_run.py
+# 批量模式：不用打开网页，一次处理整个文件夹 (或清单) 里的 PDF 研报
+#
+# 用法示例:
+#   python batch_run.py reports/ --category Equity --workers 8 --out output/
+#   python batch_run.py --manifest monday.csv --user Charlotte --workers 8
+#   python batch_run.py reports/ --category Equity --digest output/digest.docx   # 另外合并成一份带目录的日报
+#
+# 清单文件 (CSV 或 JSON) 每行一个 PDF：file, category[, user_name]
+#   CSV:  file,category
+#         reports/gs_tencent.pdf,Equity
+#         reports/gs_flows.pdf,Weekly Fund Flow
+#   JSON: [{"file": "reports/gs_tencent.pdf", "category": "Equity"}, ...]
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import config
+import metrics
+from scheduler import get_shared_scheduler, lane_scope
+from pipeline import REPORT_CATEGORIES, PIPELINE_MODES, PipelineError, generate_report
+
+DEFAULT_WORKERS = 4
+SUMMARY_FILENAME = "batch_summary.json"
+
+
+def load_manifest(manifest_path, default_user):
+    """
+    读取清单文件，返回任务列表 [{"file", "category", "user_name"}]
+    相对路径按清单文件所在目录解析
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    if manifest_path.lower().endswith(".json"):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+    else:
+        with open(manifest_path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+
+    tasks = []
+    for row in rows:
+        file_path = (row.get("file") or "").strip()
+        if not file_path: continue
+        if not os.path.isabs(file_path):
+            file_path = os.path.join(base_dir, file_path)
+        tasks.append({
+            "file": file_path,
+            "category": (row.get("category") or "").strip(),
+            "user_name": (row.get("user_name") or "").strip() or default_user,
+        })
+    return tasks
+
+
+def scan_directory(input_dir, category, default_user):
+    """
+    扫描文件夹下所有 PDF，统一使用 --category 指定的类别
+    """
+    tasks = []
+    for name in sorted(os.listdir(input_dir)):
+        if name.lower().endswith(".pdf"):
+            tasks.append({
+                "file": os.path.join(input_dir, name),
+                "category": category,
+                "user_name": default_user,
+            })
+    return tasks
+
+
+class OutputNames:
+    """
+    同一批次的输出文件名登记：重名时加 _2、_3 … 后缀
+    (同一天同一机构的多份资金流周报、不同目录下同名的 PDF 会得到相同的文件名，直接写会互相覆盖)
+    """
+    def __init__(self):
+        self._used = set()
+        self._lock = threading.Lock()
+
+    def claim(self, filename):
+        stem, ext = os.path.splitext(filename)
+        with self._lock:
+            candidate, n = filename, 1
+            while candidate.lower() in self._used:
+                n += 1
+                candidate = f"{stem}_{n}{ext}"
+            self._used.add(candidate.lower())
+        return candidate
+
+
+def process_one(task, output_dir, mode=None, save_json=False, names=None):
+    """
+    处理单个 PDF，任何异常都转成结果记录，不影响其他任务
+    save_json=True 时在 Word 旁边保存 final JSON (同名 .json，供 digest.py 合并日报)
+    names 为本批次的 OutputNames (None 时新建一个，即不与其他任务去重)
+    """
+    started = time.perf_counter()
+    name = os.path.basename(task["file"])
+
+    def log(msg):
+        print(f"[{name}] {msg}")
+
+    def save_payload(final_json, final_filename):
+        json_path = os.path.join(output_dir, os.path.splitext(final_filename)[0] + ".json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"category": task["category"], "source": task["file"], "final_json": final_json},
+                      f, ensure_ascii=False)
+        result["json"] = json_path
+
+    def claim_name(filename):
+        claimed = names.claim(filename)
+        if claimed != filename:
+            log(f"⚠️ 文件名 {filename} 已被本批次的其他 PDF 使用，改存为 {claimed}")
+            result["renamed_from"] = filename
+        return claimed
+
+    names = names or OutputNames()
+    result = {"file": task["file"], "category": task["category"], "user_name": task["user_name"]}
+    try:
+        # 批量任务走低优先级通道，网页上的用户不用排在整批研报后面
+        with lane_scope("batch"):
+            output_path, final_filename = generate_report(
+                task["file"], task["category"], task["user_name"],
+                output_dir=output_dir, on_status=log, mode=mode, on_payload=save_payload if save_json else None,
+                claim_name=claim_name
+            )
+        result.update({"status": "ok", "output": output_path})
+    except PipelineError as e:
+        result.update({"status": "failed", "stage": e.stage, "error": e.message})
+    except Exception as e:
+        result.update({"status": "failed", "stage": "unknown", "error": str(e)})
+    result["elapsed_sec"] = round(time.perf_counter() - started, 2)
+    log("✅ 完成" if result["status"] == "ok" else f"❌ 失败 ({result['stage']}): {result['error']}")
+    return result
+
+
+def run_batch(tasks, output_dir, workers=DEFAULT_WORKERS, mode=None, save_json=False):
+    """
+    用有限大小的线程池并发处理所有任务；每个任务大部分时间都在等 AI 返回，
+    所以线程数基本决定了吞吐，直到 AI 后端成为瓶颈
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    started_at = datetime.now()
+    started = time.perf_counter()
+    results = []
+    names = OutputNames()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(process_one, task, output_dir, mode, save_json, names) for task in tasks]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    # 按输入顺序输出，方便对照
+    order = {task["file"]: i for i, task in enumerate(tasks)}
+    results.sort(key=lambda r: order.get(r["file"], 0))
+
+    failed = [r for r in results if r["status"] != "ok"]
+    scheduler = get_shared_scheduler()
+    summary = {
+        "started_at": started_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "workers": workers,
+        "mode": mode or "per-category",
+        "total": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "elapsed_sec": round(time.perf_counter() - started, 2),
+        # 各类别、各阶段耗时 p50/p95 (本进程内的统计)
+        "stage_latency": metrics.registry.summary(),
+        # 提交调度：各通道排队时间、限流后的当前速率
+        "scheduler": scheduler.stats() if scheduler is not None else None,
+        "results": results,
+    }
+    with open(os.path.join(output_dir, SUMMARY_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    return summary
+
+
+def validate_tasks(tasks):
+    """
+    提前检查类别和文件是否存在，避免跑到一半才发现清单写错
+    """
+    errors = []
+    for task in tasks:
+        if task["category"] not in REPORT_CATEGORIES:
+            errors.append(f"{task['file']}: 未知类别 '{task['category']}' (可选: {', '.join(REPORT_CATEGORIES)})")
+        elif not os.path.isfile(task["file"]):
+            errors.append(f"{task['file']}: 文件不存在")
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量生成 AI 研报 Word 文档")
+    parser.add_argument("input_dir", nargs="?", help="PDF 所在文件夹")
+    parser.add_argument("--manifest", help="清单文件 (CSV/JSON)，逐个文件指定类别")
+    parser.add_argument("--category", help="文件夹模式下所有 PDF 使用的类别")
+    parser.add_argument("--user", default="Charlotte", help="用户名称 (User Name)")
+    parser.add_argument("--out", default="output", help="Word 输出目录")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="并发数")
+    parser.add_argument("--mode", choices=PIPELINE_MODES, help="流水线模式 (默认按 config.PIPELINE_MODE_BY_CATEGORY)")
+    parser.add_argument("--save-json", action="store_true", help="在 Word 旁边保存 final JSON (供 digest.py 合并)")
+    parser.add_argument("--digest", help="把成功的报告按输入顺序合并成一份带目录的 Word (路径)")
+    parser.add_argument("--batch-step2", action="store_true",
+                        help="同一类别的多份文档合并提交 Step 2 (见 step2_batch.py)")
+    args = parser.parse_args(argv)
+
+    if args.manifest:
+        tasks = load_manifest(args.manifest, args.user)
+    elif args.input_dir:
+        if not args.category:
+            parser.error("文件夹模式需要 --category，或改用 --manifest 逐个指定")
+        tasks = scan_directory(args.input_dir, args.category, args.user)
+    else:
+        parser.error("请指定 PDF 文件夹或 --manifest")
+
+    errors = validate_tasks(tasks)
+    if errors:
+        for err in errors: print(f"❌ {err}")
+        return 2
+    if not tasks:
+        print("⚠️ 没有找到 PDF 文件")
+        return 0
+
+    if args.batch_step2:
+        config.STEP2_BATCH_ENABLED = True
+    print(f"🚀 共 {len(tasks)} 个 PDF，并发 {args.workers}...")
+    summary = run_batch(tasks, args.out, workers=args.workers, mode=args.mode,
+                        save_json=args.save_json or bool(args.digest))
+    print(f"📊 成功 {summary['succeeded']} / 失败 {summary['failed']}，耗时 {summary['elapsed_sec']}s")
+    if args.digest:
+        from digest import iter_json_files, write_digest
+        paths = [r["json"] for r in summary["results"] if r["status"] == "ok" and r.get("json")]
+        count = write_digest(iter_json_files(paths), args.digest,
+                             title=f"Wall Street Highlights Digest {datetime.now().strftime('%Y/%m/%d')}")
+        print(f"📚 已合并 {count} 份报告: {args.digest}")
+    print(f"📝 汇总: {os.path.join(args.out, SUMMARY_FILENAME)}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
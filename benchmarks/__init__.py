@@ -0,0 +1 @@
+# 基准测试脚本，在仓库根目录运行: python -m benchmarks.<脚本名>
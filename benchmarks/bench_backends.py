@@ -0,0 +1,121 @@
+# benchmarks/bench_backends.py
+# PDF 文本后端对比 (pdf_backends.py)：每秒页数、峰值内存 (RSS)、与 pdfplumber 输出的相似度、乱码比例
+# 每个后端在单独的子进程里串行读取整个 PDF，峰值内存互不影响；pdfplumber-keep 为改动前不释放页面缓存的读法
+#
+#   python -m benchmarks.bench_backends --pages 10 80 300 --json bench_backends.json
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+from collections import Counter
+
+from benchmarks.fixtures import fixture_path
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = "pdfplumber"
+KEEP_CACHE = "pdfplumber-keep"
+
+
+def _worker(backend_name, pdf_path, out_path):
+    """
+    子进程里执行：读取整个 PDF，把文本写到 out_path，返回耗时与峰值 RSS
+    """
+    import io
+    import pdf_backends
+
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+    started = time.perf_counter()
+    if backend_name == KEEP_CACHE:
+        import pdfplumber
+
+        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+            texts = {i: page.extract_text() or "" for i, page in enumerate(pdf.pages)}
+    else:
+        backend = pdf_backends.get_backend(backend_name)
+        texts = backend.extract(pdf_bytes, list(range(backend.count_pages(pdf_bytes))))
+    elapsed = time.perf_counter() - started
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write("".join(f"{texts[i]}\n" for i in sorted(texts) if texts[i]))
+    # Linux 上 ru_maxrss 单位是 KB
+    return {"sec": elapsed, "pages": len(texts), "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def similarity(a, b):
+    """
+    按词频计算的相似度 (0 ~ 1)：各后端换行 / 空格位置可能不同，只比较内容
+    """
+    words_a, words_b = Counter(re.findall(r"\w+", a)), Counter(re.findall(r"\w+", b))
+    total = sum(words_a.values()) + sum(words_b.values())
+    return round(2 * sum((words_a & words_b).values()) / total, 4) if total else 1.0
+
+
+def bench_one(n_pages, backends):
+    import pdf_backends
+
+    pdf_path = fixture_path(n_pages)
+    rows, texts = [], {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in backends:
+            out_path = os.path.join(tmp, f"{name}.txt")
+            proc = subprocess.run([sys.executable, "-m", "benchmarks.bench_backends", "--worker", name, pdf_path, out_path],
+                                  cwd=REPO_ROOT, capture_output=True, text=True, timeout=600)
+            if proc.returncode != 0:
+                rows.append({"pages": n_pages, "backend": name, "error": proc.stderr.strip().splitlines()[-1:]})
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            with open(out_path, "r", encoding="utf-8") as f:
+                texts[name] = f.read()
+            rows.append({
+                "pages": n_pages,
+                "backend": name,
+                "pages_per_sec": round(result["pages"] / result["sec"], 1) if result["sec"] else None,
+                "sec": round(result["sec"], 3),
+                "peak_rss_mb": round(result["peak_rss_mb"], 1),
+                "garbled": round(pdf_backends.garbled_ratio(texts[name]) or 0.0, 4),
+            })
+    for row in rows:
+        if row["backend"] in texts and BASELINE in texts:
+            row["similarity"] = similarity(texts[BASELINE], texts[row["backend"]])
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PDF 文本后端基准测试")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 80])
+    parser.add_argument("--backends", nargs="+", help="默认: 全部已安装的后端 + pdfplumber-keep")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    parser.add_argument("--worker", nargs=3, metavar=("BACKEND", "PDF", "OUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(_worker(*args.worker)))
+        return 0
+
+    import pdf_backends
+
+    backends = args.backends or [KEEP_CACHE] + [name for name, b in pdf_backends.BACKENDS.items() if b.available()]
+    if BASELINE not in backends:
+        backends.append(BASELINE)
+    rows = [row for n in args.pages for row in bench_one(n, backends)]
+
+    print(f"{'pages':>6} {'backend':<16} {'pages/s':>9} {'sec':>8} {'RSS(MB)':>8} {'similar':>8} {'garbled':>8}")
+    for r in rows:
+        if "error" in r:
+            print(f"{r['pages']:>6} {r['backend']:<16} ❌ {r['error']}")
+            continue
+        print(f"{r['pages']:>6} {r['backend']:<16} {r['pages_per_sec']:>9} {r['sec']:>8} {r['peak_rss_mb']:>8} "
+              f"{r.get('similarity', '-'):>8} {r['garbled']:>8}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "backends", "results": rows}, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+# benchmarks/bench_docgen.py
+# Word 生成速度：每秒可生成多少份文档 (正文 10 / 100 / 1000 段)
+# --images：插入大图时的文档大小与生成耗时 (原图 vs 按打印宽度缩小压缩)，以及从 PDF 提取图表的耗时 (冷 / 缓存)
+#
+#   python -m benchmarks.bench_docgen --paragraphs 10 100 1000 --json bench_docgen.json
+#   python -m benchmarks.bench_docgen --images
+#   python -m benchmarks.bench_docgen --digest 20 200     # 日报合并：报告数增加时的耗时与内存峰值
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+import config
+from doc_generator import DocGenerator
+
+PARAGRAPH = ("**GS expect revenue to grow 12% in FY26 on cloud re-acceleration.** Margins expanded 180bp "
+             "year over year on mix and operating leverage, while **JPM highlight that valuation is attractive** "
+             "at 14x forward earnings versus the 5-year average.")
+
+
+def make_payload(n_paragraphs, report_category):
+    header = {
+        "category": f"Wall Street Highlights-{report_category}",
+        "date": "2026/01/01",
+        "title": "Goldman Sachs: Tencent Holdings (0700.HK) Stock maintain Buy",
+        "summary": "GS expect steady growth driven by gaming and advertising.",
+        "tags": "互联网/港股/游戏",
+    }
+    footer = {"stock": "0700.HK", "rating": "Buy", "price_target": "HKD520.00"}
+    return {"header_info": header, "body_content": [PARAGRAPH] * n_paragraphs, "footer_info": footer}
+
+
+def bench_one(n_paragraphs, report_category, min_seconds=1.0):
+    generator = DocGenerator()
+    payload = make_payload(n_paragraphs, report_category)
+    generator.render_bytes(payload, report_category=report_category)  # 预热 (构建模板)
+
+    count, started = 0, time.perf_counter()
+    while True:
+        generator.render_bytes(payload, report_category=report_category)
+        count += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds and count >= 3:
+            break
+    return {
+        "category": report_category,
+        "paragraphs": n_paragraphs,
+        "docs": count,
+        "docs_per_sec": round(count / elapsed, 2),
+        "ms_per_doc": round(elapsed / count * 1000, 2),
+    }
+
+
+def make_screenshot(width=3000, height=1800, seed=0):
+    """
+    模拟用户上传的高分辨率截图 (PNG)
+    """
+    from PIL import Image
+
+    size = width * height * 3
+    row = bytes(v for x in range(width) for v in (x * 255 // width, 96, 160))
+    noise = int.from_bytes(random.Random(seed).randbytes(size), "big") & int.from_bytes(b"\x0f" * size, "big")
+    raw = (int.from_bytes(row * height, "big") ^ noise).to_bytes(size, "big")
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (width, height), raw).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def bench_images(runs=3):
+    """
+    同一份正文分别不插图 / 插原图 / 插缩小后的图，记录 .docx 大小与生成耗时；再测从 PDF 提取图表
+    """
+    import figures
+    from benchmarks.fixtures import make_report_pdf
+
+    generator = DocGenerator()
+    payload = make_payload(10, "Equity")
+    screenshot = make_screenshot()
+    generator.render_bytes(payload, report_category="Equity")  # 预热
+
+    rows = []
+    dpi = config.DOCX_IMAGE_DPI
+    for label, images, keep_original in (("none", [], False), ("original", [screenshot], True),
+                                         ("fitted", [screenshot], False)):
+        # 把 DPI 调到极大相当于关闭缩小，得到以前「原图直接嵌入」的基线
+        config.DOCX_IMAGE_DPI = 10 ** 6 if keep_original else dpi
+        try:
+            samples = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                docx = generator.render_bytes(payload, report_category="Equity", images=images)
+                samples.append(time.perf_counter() - started)
+        finally:
+            config.DOCX_IMAGE_DPI = dpi
+        rows.append({"case": label, "input_kb": round(sum(len(i) for i in images) / 1024, 1),
+                     "docx_kb": round(len(docx) / 1024, 1), "ms_per_doc": round(min(samples) * 1000, 2)})
+
+    pdf = make_report_pdf(12, seed=7, with_figures=True)
+    extract = {}
+    for label in ("cold", "cached"):
+        started = time.perf_counter()
+        found = figures.extract_figures(pdf, max_images=2)
+        extract[f"{label}_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    extract["images"] = len(found)
+    extract["image_kb"] = [round(len(i) / 1024, 1) for i in found]
+    return rows, extract
+
+
+def bench_digest(counts, paragraphs=10):
+    """
+    把 n 份报告合并成一个 Word，记录耗时、Python 内存峰值 (tracemalloc) 与文件大小
+    """
+    from digest import write_digest
+
+    rows = []
+    for n in counts:
+        # 生成器逐份产出，模拟从磁盘 / 缓存逐条读取
+        items = (("Equity", make_payload(paragraphs, "Equity")) for _ in range(n))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/digest.docx"
+            tracemalloc.start()
+            started = time.perf_counter()
+            write_digest(items, path, title="Digest")
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            size = os.path.getsize(path)
+        rows.append({"reports": n, "sec": round(elapsed, 3), "peak_mb": round(peak / 1024 / 1024, 2),
+                     "docx_kb": round(size / 1024, 1)})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DocGenerator 渲染基准测试")
+    parser.add_argument("--paragraphs", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--categories", nargs="+", default=["Equity", "Weekly Fund Flow"])
+    parser.add_argument("--min-seconds", type=float, default=1.0)
+    parser.add_argument("--images", action="store_true", help="测试插图时的文档大小 / 耗时与图表提取")
+    parser.add_argument("--digest", type=int, nargs="+", help="日报合并的报告数 (如 20 200)")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    if args.digest:
+        rows = bench_digest(args.digest)
+        print(f"{'reports':>8} {'sec':>8} {'peak(MB)':>9} {'docx(KB)':>9}")
+        for r in rows:
+            print(f"{r['reports']:>8} {r['sec']:>8} {r['peak_mb']:>9} {r['docx_kb']:>9}")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"benchmark": "digest", "results": rows}, f, indent=2, ensure_ascii=False)
+        return 0
+
+    if args.images:
+        rows, extract = bench_images()
+        print(f"{'case':<10} {'input(KB)':>10} {'docx(KB)':>10} {'ms/doc':>9}")
+        for r in rows:
+            print(f"{r['case']:<10} {r['input_kb']:>10} {r['docx_kb']:>10} {r['ms_per_doc']:>9}")
+        print(f"🖼️ 图表提取: 冷 {extract['cold_ms']}ms / 缓存 {extract['cached_ms']}ms, {extract['images']} 张 "
+              f"{extract['image_kb']} KB")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"benchmark": "docgen_images", "results": rows, "figure_extract": extract},
+                          f, indent=2, ensure_ascii=False)
+        return 0
+
+    rows = [bench_one(n, c, args.min_seconds) for c in args.categories for n in args.paragraphs]
+    print(f"{'category':<18} {'paragraphs':>10} {'docs/sec':>9} {'ms/doc':>9}")
+    for r in rows:
+        print(f"{r['category']:<18} {r['paragraphs']:>10} {r['docs_per_sec']:>9} {r['ms_per_doc']:>9}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "docgen", "results": rows}, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+# benchmarks/bench_e2e.py
+# 端到端基准测试：本地模拟 AI 服务 + 样本 PDF，按生产路径 (pipeline.build_report) 跑完整报告，
+# 测量各阶段耗时 (读取/精简/Step 1/Step 2/生成，AI 阶段再拆成排队/提交/轮询/解析) 和不同并发下的吞吐。
+# 阶段耗时来自 metrics 的 JSON 日志，所以结果缓存、Schema 校验、分块、相同请求合并、调度器的退化都会反映出来。
+# 结果写成 JSON (带 git commit)，方便在不同提交之间对比是否退化
+#
+#   python -m benchmarks.bench_e2e --concurrency 1 4 16 --latency 2 --json bench_e2e.json
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fixtures import FIXTURE_SIZES, make_report_pdf
+from benchmarks.mock_server import MockAIServer, canned_output
+
+# 报告里的阶段 (metrics.stage / call_ai_stage 记录的名字)，按流水线顺序输出
+STAGE_ORDER = ("extract", "reduce", "step1_rules", "step1", "step2", "fused", "render", "total")
+# AI 阶段事件里的细分耗时字段
+AI_PARTS = ("queue", "submit", "poll", "parse")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def distinct_output(prompt):
+    """
+    模拟服务的固定返回对每份 PDF 都一样，Step 2 的输入会完全相同，被结果缓存 / 相同请求合并吃掉；
+    在 Step 1 的 meta 里加上输入的摘要，让每份报告都真正走完两步 AI (真实报告的 Step 1 结果各不相同)
+    """
+    output = canned_output(prompt)
+    body = json.loads(output.split("```json\n", 1)[1].rsplit("\n```", 1)[0])
+    if isinstance(body.get("meta"), dict) and "header_info" not in body:
+        body["meta"]["source_digest"] = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+    return "```json\n" + json.dumps(body, ensure_ascii=False, indent=2) + "\n```"
+
+
+def summarize_values(values):
+    from metrics import percentile
+
+    return {
+        "n": len(values),
+        "mean": round(statistics.mean(values), 4) if values else None,
+        "p50": round(percentile(values, 50), 4) if values else None,
+        "p95": round(percentile(values, 95), 4) if values else None,
+    }
+
+
+def run_report(pdf_bytes, category, source_name, mode=None):
+    """
+    用 build_report 跑一份报告；失败时返回 error (阶段耗时另外从指标日志读取)
+    """
+    from pipeline import PipelineError, build_report
+
+    started = time.perf_counter()
+    try:
+        build_report(pdf_bytes, category, "bench", source_name=source_name, on_status=lambda msg: None, mode=mode)
+    except PipelineError as e:
+        return {"source": source_name, "error": f"{e.stage}: {e.message}"}
+    return {"source": source_name, "elapsed": time.perf_counter() - started}
+
+
+def read_stage_samples(log_path):
+    """
+    从 metrics 的 JSON 日志里取出 {阶段: [秒]}；AI 阶段额外拆出 step1_queue / step1_submit / ...
+    只统计成功的报告
+    """
+    events = []
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    ok_reports = {e["report_id"] for e in events if e.get("event") == "report" and e["status"] == "ok"}
+    samples = {}
+    for e in events:
+        if e.get("event") == "report" and e["status"] == "ok":
+            samples.setdefault("total", []).append(e["duration_sec"])
+        if e.get("event") != "stage" or e.get("report_id") not in ok_reports or e["stage"] == "total":
+            continue
+        samples.setdefault(e["stage"], []).append(e["duration_sec"])
+        for part in AI_PARTS:
+            if e.get(f"{part}_sec") is not None:
+                samples.setdefault(f"{e['stage']}_{part}", []).append(e[f"{part}_sec"])
+    return samples
+
+
+def ordered_stages(samples):
+    order = []
+    for stage in STAGE_ORDER:
+        order += [name for name in [stage] + [f"{stage}_{part}" for part in AI_PARTS] if name in samples]
+    return order + sorted(name for name in samples if name not in order)
+
+
+def run_level(concurrency, n_reports, sizes, category, seed_base, mode=None):
+    """
+    在给定并发下跑 n_reports 份报告 (每份 PDF 内容不同，避免命中按页缓存和结果缓存)
+    """
+    pdfs = [make_report_pdf(sizes[i % len(sizes)], seed=seed_base + i) for i in range(n_reports)]
+    names = [f"c{concurrency}_{i}.pdf" for i in range(n_reports)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda pdf, name: run_report(pdf, category, name, mode=mode), pdfs, names))
+    wall = time.perf_counter() - started
+    failures = [r["error"] for r in results if "error" in r]
+    return {
+        "concurrency": concurrency,
+        "reports": n_reports,
+        "failures": len(failures),
+        "errors": failures[:5],
+        "wall_sec": round(wall, 3),
+        "reports_per_sec": round((n_reports - len(failures)) / wall, 3),
+        "total_sec": summarize_values([r["elapsed"] for r in results if "error" not in r]),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="端到端基准测试 (本地模拟 AI 服务)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--reports", type=int, default=0, help="每个并发级别的报告数 (默认 2 × 并发, 至少 4)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(FIXTURE_SIZES), help="样本 PDF 页数")
+    parser.add_argument("--category", default="Equity")
+    parser.add_argument("--mode", help="流水线模式 (默认按 config.PIPELINE_MODE)")
+    parser.add_argument("--latency", type=float, default=2.0, help="模拟 AI 任务平均耗时 (秒)")
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    server = MockAIServer(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate, seed=args.seed,
+                          output_fn=distinct_output).start()
+    # 必须在导入 config 之前设置，config 会读取这些环境变量
+    os.environ["AI_AUTH_URL"] = server.auth_url
+    os.environ["AI_API_BASE_URL"] = server.api_base_url
+    os.environ.setdefault("CLIENT_ID", "bench")
+    os.environ.setdefault("CLIENT_SECRET", "bench")
+
+    import config
+    # 结果缓存、相同请求合并照常开启 (走生产路径)，但放在临时目录：每次运行都从空缓存开始，结果可比
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    config.RESULT_CACHE_PATH = os.path.join(workdir, "ai_results.sqlite3")
+    config.METRICS_LOG_PATH = os.path.join(workdir, "metrics.jsonl")
+    config.METRICS_PROM_PATH = ""
+
+    levels = []
+    try:
+        for i, concurrency in enumerate(args.concurrency):
+            n_reports = args.reports or max(4, 2 * concurrency)
+            level = run_level(concurrency, n_reports, args.sizes, args.category, seed_base=args.seed + 1000 * i,
+                              mode=args.mode)
+            levels.append(level)
+            print(f"⚙️ 并发 {concurrency:>3}: {level['reports_per_sec']} 份/秒, 失败 {level['failures']}, "
+                  f"p50 {level['total_sec']['p50']}s, p95 {level['total_sec']['p95']}s")
+    finally:
+        server.stop()
+
+    samples = read_stage_samples(config.METRICS_LOG_PATH)
+    stages = {name: summarize_values(samples[name]) for name in ordered_stages(samples)}
+    report = {
+        "benchmark": "e2e",
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": vars(args),
+        "stages": stages,
+        "throughput": levels,
+        "mock_counters": dict(server.state.counters),
+    }
+
+    print(f"{'stage':<16} {'mean':>8} {'p50':>8} {'p95':>8}")
+    for stage, s in stages.items():
+        print(f"{stage:<16} {str(s['mean']):>8} {str(s['p50']):>8} {str(s['p95']):>8}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+# benchmarks/bench_extract.py
+# PDF 读取速度：串行 vs 进程池并行，以及按页缓存命中后的重复读取
+#
+#   python -m benchmarks.bench_extract --pages 5 20 80 --json bench_extract.json
+#   python -m benchmarks.bench_extract --backend pdfplumber   # 指定文本后端 (默认按 config.PDF_TEXT_BACKEND)
+import sys
+import json
+import time
+import argparse
+
+import pdf_extract
+from benchmarks.fixtures import fixture_path
+
+
+def _timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def bench_one(n_pages, repeat=3, backend=None):
+    with open(fixture_path(n_pages), "rb") as f:
+        pdf_bytes = f.read()
+
+    serial, parallel = [], []
+    for _ in range(repeat):
+        pdf_extract.page_cache.clear()
+        t, serial_text = _timed(pdf_extract.extract_text, pdf_bytes, parallel=False, backend=backend)
+        serial.append(t)
+        pdf_extract.page_cache.clear()
+        t, parallel_text = _timed(pdf_extract.extract_text, pdf_bytes, parallel=True, backend=backend)
+        parallel.append(t)
+    assert serial_text == parallel_text, "并行结果与串行不一致"
+
+    cached, _ = _timed(pdf_extract.extract_text, pdf_bytes, backend=backend)
+    best_serial, best_parallel = min(serial), min(parallel)
+    return {
+        "pages": n_pages,
+        "serial_sec": round(best_serial, 4),
+        "parallel_sec": round(best_parallel, 4),
+        "cached_sec": round(cached, 4),
+        "speedup": round(best_serial / best_parallel, 2) if best_parallel else None,
+        "workers": pdf_extract._pool_size(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PDF 并行读取基准测试")
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 8, 20, 40, 80])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", help="文本后端 (pdfplumber / pdfminer / pypdfium2 / pymupdf)")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    # 预热进程池，避免把启动时间算进第一组
+    pdf_extract._get_pool().submit(int).result()
+
+    rows = [bench_one(n, repeat=args.repeat, backend=args.backend) for n in args.pages]
+    print(f"{'pages':>6} {'serial(s)':>10} {'parallel(s)':>12} {'cached(s)':>10} {'speedup':>8}")
+    for r in rows:
+        print(f"{r['pages']:>6} {r['serial_sec']:>10} {r['parallel_sec']:>12} {r['cached_sec']:>10} {r['speedup']:>8}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "extract", "results": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
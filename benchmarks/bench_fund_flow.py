@@ -0,0 +1,110 @@
+# benchmarks/bench_fund_flow.py
+# 资金流周报 Step 1 规则提取基准 (fund_flow_rules.py)：对周报样式的样本 PDF 测量规则命中率、本地提取耗时、
+# 与生成样本时的标题是否一致；再用本地模拟 AI 服务跑完整报告，对比开启 / 关闭规则时每份报告的 AI 任务数与耗时
+# 版面不符合的样本 (普通研报样式) 用来确认会回退到 AI
+#
+#   python -m benchmarks.bench_fund_flow --reports 20 --latency 2
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+from benchmarks.fixtures import FUND_FLOW_TITLES, make_fund_flow_pdf, make_report_pdf
+from benchmarks.mock_server import MockAIServer
+
+
+def bench_rules(samples):
+    import fund_flow_rules
+
+    fund_flow_rules.read_lines(samples[0][1])  # 预热：导入 pdfplumber 不计入
+    rows = []
+    for kind, pdf_bytes in samples:
+        started = time.perf_counter()
+        data, problems = fund_flow_rules.extract_step1(pdf_bytes)
+        elapsed = time.perf_counter() - started
+        title = data["meta"]["title_en"] if data else None
+        rows.append({"kind": kind, "matched": data is not None, "ms": round(elapsed * 1000, 1),
+                     "title_ok": title in FUND_FLOW_TITLES if data else None, "problems": problems})
+    return rows
+
+
+def bench_reports(samples, rules, server):
+    import config
+    from metrics import percentile
+    from pipeline import FUND_FLOW_CATEGORY, build_report
+
+    config.FUND_FLOW_RULES_ENABLED = rules
+    submits_before = server.state.counters["submit"]
+    elapsed = []
+    for _, pdf_bytes in samples:
+        started = time.perf_counter()
+        build_report(pdf_bytes, FUND_FLOW_CATEGORY, "bench", source_name="flows.pdf", on_status=lambda msg: None)
+        elapsed.append(time.perf_counter() - started)
+    return {
+        "reports": len(samples),
+        "ai_jobs_per_report": round((server.state.counters["submit"] - submits_before) / len(samples), 2),
+        "mean_sec": round(statistics.mean(elapsed), 3),
+        "p95_sec": round(percentile(elapsed, 95), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="资金流周报规则提取基准测试")
+    parser.add_argument("--reports", type=int, default=20, help="周报样式的样本数")
+    parser.add_argument("--other", type=int, default=5, help="版面不符合的样本数 (应回退到 AI)")
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=2.0, help="模拟服务的任务耗时 (秒)")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    samples = [("fund_flow", make_fund_flow_pdf(args.pages, seed=i)) for i in range(args.reports)]
+    samples += [("other", make_report_pdf(args.pages, seed=i)) for i in range(args.other)]
+
+    server = MockAIServer(latency=args.latency, jitter=0, seed=0).start()
+    # 必须在导入 config 之前设置，config 会读取这些环境变量
+    os.environ["AI_AUTH_URL"] = server.auth_url
+    os.environ["AI_API_BASE_URL"] = server.api_base_url
+    os.environ.setdefault("CLIENT_ID", "bench")
+    os.environ.setdefault("CLIENT_SECRET", "bench")
+    try:
+        import config
+        from metrics import percentile
+        config.RESULT_CACHE_ENABLED = False  # 每次都要真正走完 AI 阶段
+        config.STEP2_BATCH_ENABLED = False
+        config.METRICS_LOG_PATH = ""
+        rule_rows = bench_rules(samples)
+        reports = {mode: bench_reports([s for s in samples if s[0] == "fund_flow"], mode == "rules", server)
+                   for mode in ("ai", "rules")}
+    finally:
+        server.stop()
+
+    summary = {}
+    for kind in ("fund_flow", "other"):
+        rows = [r for r in rule_rows if r["kind"] == kind]
+        if not rows:
+            continue
+        ms = [r["ms"] for r in rows]
+        summary[kind] = {
+            "samples": len(rows),
+            "matched": sum(r["matched"] for r in rows),
+            "title_ok": sum(1 for r in rows if r["title_ok"]),
+            "p50_ms": percentile(ms, 50),
+            "p95_ms": percentile(ms, 95),
+        }
+        print(f"{kind:<10} 命中规则 {summary[kind]['matched']}/{len(rows)}, 标题正确 {summary[kind]['title_ok']}, "
+              f"本地提取 p50 {summary[kind]['p50_ms']}ms / p95 {summary[kind]['p95_ms']}ms")
+    for mode, row in reports.items():
+        print(f"{'规则 + AI Step 2' if mode == 'rules' else 'AI Step 1 + 2':<16} 每份报告 AI 任务 {row['ai_jobs_per_report']}, "
+              f"耗时 mean {row['mean_sec']}s / p95 {row['p95_sec']}s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "fund_flow_rules", "params": vars(args), "rules": summary, "reports": reports},
+                      f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
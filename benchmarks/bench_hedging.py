@@ -0,0 +1,104 @@
+# benchmarks/bench_hedging.py
+# 对冲请求基准：模拟服务里让一部分任务进入长尾，对比开启 / 关闭对冲时单个任务的 p50/p95/p99 与后端提交量
+#
+#   python -m benchmarks.bench_hedging --jobs 200 --latency 1 --tail-rate 0.05 --tail-latency 20 --hedge-delay 3
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+from benchmarks.mock_server import MockAIServer
+
+
+def run_batch(n_jobs, hedge, waves, prompt):
+    """
+    分 waves 批提交 n_jobs 个任务 (前面的批次为后面的批次积累耗时样本和对冲令牌)
+    """
+    from job_engine import JobEngine, PollPolicy, run_sync
+
+    policy = PollPolicy(initial_delay=0.2, max_interval=0.5, backoff=1.5)
+    per_wave = max(1, n_jobs // waves)
+
+    async def _go():
+        results = []
+        async with JobEngine(policy=policy, hedge=hedge) as engine:
+            for start in range(0, n_jobs, per_wave):
+                batch = [(prompt, f"doc {i}") for i in range(start, min(n_jobs, start + per_wave))]
+                results += await engine.run_many(batch)
+        return results
+
+    return run_sync(_go)
+
+
+def summarize(results, counters, n_jobs):
+    from metrics import percentile
+
+    elapsed = [r.elapsed for r in results if r.ok]
+    return {
+        "jobs": n_jobs,
+        "failures": sum(1 for r in results if not r.ok),
+        "mean": round(statistics.mean(elapsed), 3) if elapsed else None,
+        "p50": round(percentile(elapsed, 50), 3) if elapsed else None,
+        "p95": round(percentile(elapsed, 95), 3) if elapsed else None,
+        "p99": round(percentile(elapsed, 99), 3) if elapsed else None,
+        "hedged": sum(1 for r in results if r.extra.get("hedged")),
+        "hedge_won": sum(1 for r in results if r.extra.get("hedge_won")),
+        "submits_per_job": round(counters["submit"] / n_jobs, 3),
+        "cancelled": counters["cancelled"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对冲请求基准测试 (本地模拟 AI 服务)")
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--waves", type=int, default=4, help="分几批提交")
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--tail-latency", type=float, default=20.0)
+    parser.add_argument("--hedge-delay", type=float, default=3.0, help="样本不足时的对冲延迟 (秒)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    server = MockAIServer(latency=args.latency, jitter=args.jitter, tail_rate=args.tail_rate,
+                          tail_latency=args.tail_latency, seed=args.seed).start()
+    # 必须在导入 config 之前设置，config 会读取这些环境变量
+    os.environ["AI_AUTH_URL"] = server.auth_url
+    os.environ["AI_API_BASE_URL"] = server.api_base_url
+    os.environ.setdefault("CLIENT_ID", "bench")
+    os.environ.setdefault("CLIENT_SECRET", "bench")
+
+    import config
+    import job_engine
+    config.AI_HEDGE_DEFAULT_DELAY = args.hedge_delay
+    config.AI_HEDGE_MIN_DELAY = min(config.AI_HEDGE_MIN_DELAY, args.hedge_delay)
+    config.AI_JOB_CANCEL_METHOD = "DELETE"
+
+    rows = {}
+    try:
+        for hedge in (False, True):
+            for name in server.state.counters:
+                server.state.counters[name] = 0
+            job_engine.hedging = job_engine.HedgeController()  # 每轮从零积累样本和令牌
+            started = time.perf_counter()
+            results = run_batch(args.jobs, hedge, args.waves, config.FUND_FLOW_STEP1)
+            row = summarize(results, server.state.counters, args.jobs)
+            row["wall_sec"] = round(time.perf_counter() - started, 3)
+            rows["hedged" if hedge else "baseline"] = row
+            print(f"{'对冲' if hedge else '基线'}: p50 {row['p50']}s, p95 {row['p95']}s, p99 {row['p99']}s, "
+                  f"提交/任务 {row['submits_per_job']}, 对冲 {row['hedged']} (胜出 {row['hedge_won']}), "
+                  f"失败 {row['failures']}")
+    finally:
+        server.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "hedging", "params": vars(args), "results": rows}, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+# benchmarks/bench_reduce.py
+# 送入 AI 之前的文本精简 (text_reduce.py)：样本 PDF 精简前后的 Prompt 大小、精简本身的耗时，
+# 以及 Step 1 在本地模拟服务上的等待时间 (模拟服务按 Prompt 长度增加耗时，--latency-per-kchar)
+#
+#   python -m benchmarks.bench_reduce --pages 2 10 40 80 --json bench_reduce.json
+import os
+import sys
+import json
+import time
+import argparse
+
+from benchmarks.fixtures import fixture_path
+from benchmarks.mock_server import MockAIServer
+
+
+def bench_one(n_pages, server=None):
+    import pdf_extract
+    import pipeline
+    import text_reduce
+
+    with open(fixture_path(n_pages), "rb") as f:
+        page_texts = pdf_extract.extract_pages(f.read())
+    full_text = pdf_extract.join_pages(page_texts)
+
+    started = time.perf_counter()
+    reduced_text, stats = text_reduce.reduce_pages(page_texts, bank=pipeline.detect_bank(page_texts[0]))
+    reduce_ms = (time.perf_counter() - started) * 1000
+
+    row = {
+        "pages": n_pages,
+        "bank": stats["bank"],
+        "chars_full": len(full_text),
+        "chars_reduced": len(reduced_text),
+        "removed_pct": round(stats["removed_chars"] * 100 / max(1, len(full_text)), 1),
+        "header_chars": stats["header_chars"],
+        "appendix_chars": stats["appendix_chars"],
+        "boilerplate_chars": stats["boilerplate_chars"],
+        "reduce_ms": round(reduce_ms, 2),
+    }
+    if server is not None:
+        # 长文本会被切块并发提交 (chunking.py)，所以同时记录提交的任务数
+        prompt = pipeline.STEP_1_PROMPT_TEMPLATE.format(category="Equity")
+        for label, text in (("full", full_text), ("reduced", reduced_text)):
+            submits = server.state.counters["submit"]
+            started = time.perf_counter()
+            result = pipeline.call_step1(prompt, text)
+            row[f"step1_{label}_sec"] = round(time.perf_counter() - started, 3) if result.ok else None
+            row[f"step1_{label}_jobs"] = server.state.counters["submit"] - submits
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PDF 文本精简基准测试")
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 10, 40, 80])
+    parser.add_argument("--latency", type=float, default=1.0, help="模拟服务的基础耗时 (秒)")
+    parser.add_argument("--latency-per-kchar", type=float, default=0.05, help="Prompt 每 1000 字符额外的耗时 (秒)")
+    parser.add_argument("--no-ai", action="store_true", help="只比较文本大小，不跑 Step 1")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    server = None
+    if not args.no_ai:
+        server = MockAIServer(latency=args.latency, jitter=0, latency_per_kchar=args.latency_per_kchar,
+                              seed=0).start()
+        # 必须在导入 config 之前设置，config 会读取这些环境变量
+        os.environ["AI_AUTH_URL"] = server.auth_url
+        os.environ["AI_API_BASE_URL"] = server.api_base_url
+        os.environ.setdefault("CLIENT_ID", "bench")
+        os.environ.setdefault("CLIENT_SECRET", "bench")
+    try:
+        import config
+        config.RESULT_CACHE_ENABLED = False
+        config.METRICS_LOG_PATH = ""
+        rows = [bench_one(n, server) for n in args.pages]
+    finally:
+        if server:
+            server.stop()
+
+    print(f"{'pages':>6} {'bank':>5} {'chars':>8} {'reduced':>8} {'removed%':>9} {'reduce(ms)':>11} "
+          f"{'step1(s)':>9} {'reduced(s)':>11} {'jobs':>6}")
+    for r in rows:
+        jobs = f"{r['step1_full_jobs']}->{r['step1_reduced_jobs']}" if "step1_full_jobs" in r else "-"
+        print(f"{r['pages']:>6} {r['bank']:>5} {r['chars_full']:>8} {r['chars_reduced']:>8} {r['removed_pct']:>9} "
+              f"{r['reduce_ms']:>11} {str(r.get('step1_full_sec', '-')):>9} {str(r.get('step1_reduced_sec', '-')):>11} "
+              f"{jobs:>6}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "reduce", "params": vars(args), "results": rows}, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
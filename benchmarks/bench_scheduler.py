@@ -0,0 +1,132 @@
+# benchmarks/bench_scheduler.py
+# 提交调度基准 (scheduler.py)：模拟服务限制每秒提交数 (超过返回 429)，先压入一大批 batch 任务，
+# 随后网页用户陆续提交 interactive 任务；对比关闭 / 开启调度时两个通道的失败数、排队时间和端到端耗时
+#
+#   python -m benchmarks.bench_scheduler --batch-jobs 120 --interactive-jobs 10 --backend-rate 5 --rate 8
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import statistics
+
+from benchmarks.mock_server import MockAIServer
+
+
+def run_lane(lane, requests, scheduler, policy, results, delay=0.0, spacing=0.0):
+    """
+    在单独的线程里按 lane 通道执行 requests；spacing > 0 时逐个间隔提交 (模拟网页用户陆续上传)
+    """
+    from job_engine import JobEngine, run_sync
+    from scheduler import lane_scope
+
+    async def _go():
+        import asyncio
+
+        async with JobEngine(policy=policy, scheduler=scheduler) as engine:
+            await asyncio.sleep(delay)
+            if not spacing:
+                return await engine.run_many(requests)
+            tasks = []
+            for system_prompt, user_content in requests:
+                tasks.append(asyncio.create_task(engine.run(system_prompt, user_content)))
+                await asyncio.sleep(spacing)
+            return await asyncio.gather(*tasks)
+
+    with lane_scope(lane):
+        results[lane] = run_sync(_go)
+
+
+def summarize(results):
+    from metrics import percentile
+
+    ok = [r for r in results if r.ok]
+    waits = [r.extra.get("queue_sec", 0.0) for r in results]
+    elapsed = [r.elapsed for r in ok]
+    return {
+        "jobs": len(results),
+        "failures": len(results) - len(ok),
+        "wait_p50": round(percentile(waits, 50), 3) if waits else None,
+        "wait_p95": round(percentile(waits, 95), 3) if waits else None,
+        "elapsed_mean": round(statistics.mean(elapsed), 3) if elapsed else None,
+        "elapsed_p95": round(percentile(elapsed, 95), 3) if elapsed else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="提交调度基准测试 (本地模拟 AI 服务)")
+    parser.add_argument("--batch-jobs", type=int, default=120)
+    parser.add_argument("--interactive-jobs", type=int, default=10)
+    parser.add_argument("--interactive-spacing", type=float, default=0.5, help="interactive 任务的提交间隔 (秒)")
+    parser.add_argument("--backend-rate", type=float, default=5.0, help="模拟服务每秒最多接受的提交数")
+    parser.add_argument("--rate", type=float, default=8.0, help="调度器的初始速率 (故意高于后端限额，观察退避)")
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    server = MockAIServer(latency=args.latency, jitter=args.jitter, rate_limit=args.backend_rate,
+                          seed=args.seed).start()
+    # 必须在导入 config 之前设置，config 会读取这些环境变量
+    os.environ["AI_AUTH_URL"] = server.auth_url
+    os.environ["AI_API_BASE_URL"] = server.api_base_url
+    os.environ.setdefault("CLIENT_ID", "bench")
+    os.environ.setdefault("CLIENT_SECRET", "bench")
+
+    import config
+    from job_engine import PollPolicy
+    from scheduler import Scheduler
+
+    policy = PollPolicy(initial_delay=0.2, max_interval=0.5, backoff=1.5)
+    prompt = config.FUND_FLOW_STEP1
+    rows = {}
+    try:
+        for mode in ("off", "scheduler"):
+            for name in server.state.counters:
+                server.state.counters[name] = 0
+            server.state.priorities.clear()
+            config.AI_SCHEDULER_ENABLED = mode == "scheduler"
+            scheduler = Scheduler(rate=args.rate) if mode == "scheduler" else None
+
+            results = {}
+            threads = [
+                threading.Thread(target=run_lane, args=(
+                    "batch", [(prompt, f"batch doc {i}") for i in range(args.batch_jobs)], scheduler, policy, results)),
+                # batch 任务先占满队列，interactive 任务 1 秒后开始陆续到达
+                threading.Thread(target=run_lane, args=(
+                    "interactive", [(prompt, f"interactive doc {i}") for i in range(args.interactive_jobs)],
+                    scheduler, policy, results, 1.0, args.interactive_spacing)),
+            ]
+            started = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            row = {lane: summarize(results[lane]) for lane in ("interactive", "batch")}
+            row["wall_sec"] = round(time.perf_counter() - started, 3)
+            row["submits"] = server.state.counters["submit"]
+            row["http_429"] = server.state.counters["throttled"]
+            row["priorities"] = {str(k): v for k, v in sorted(server.state.priorities.items(), key=str)}
+            if scheduler is not None:
+                row["final_rate"] = scheduler.stats()["rate"]
+            rows[mode] = row
+            print(f"{'调度' if scheduler else '无调度'}: 总耗时 {row['wall_sec']}s, 提交 {row['submits']} 次, "
+                  f"429 {row['http_429']} 次")
+            for lane in ("interactive", "batch"):
+                r = row[lane]
+                print(f"    {lane:<12} 失败 {r['failures']}/{r['jobs']}, 排队 p50 {r['wait_p50']}s / p95 {r['wait_p95']}s, "
+                      f"端到端 mean {r['elapsed_mean']}s / p95 {r['elapsed_p95']}s")
+    finally:
+        server.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "scheduler", "params": vars(args), "results": rows}, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
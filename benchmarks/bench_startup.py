@@ -0,0 +1,121 @@
+# benchmarks/bench_startup.py
+# 冷启动基准：每个模块在全新的解释器里导入，记录导入耗时、导入时加载了哪些重量级依赖、是否发起了网络请求
+# 用 --check 在超出预算 / 出现导入时副作用时返回非 0，防止退化
+#
+#   python -m benchmarks.bench_startup --runs 5 --check --json bench_startup.json
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ("config", "metrics", "result_cache", "single_flight", "scheduler", "chunking", "text_reduce",
+           "fund_flow_rules", "ai_client", "job_engine", "pdf_backends", "pdf_extract", "figures", "doc_generator",
+           "step2_batch", "pipeline", "report_queue", "service_client", "batch_run")
+
+# 这些依赖只应在第一次用到时加载
+HEAVY_MODULES = ("streamlit", "pptx", "pdfplumber", "docx", "requests", "httpx", "PIL")
+
+# 导入时允许加载的重量级依赖 (模块本身就是对它的封装)
+ALLOWED_HEAVY = {"doc_generator": {"docx"}}
+
+# 导入耗时预算 (毫秒，中位数)；留有余量，主要用于发现「又在导入时加载了重量级依赖」这类退化
+BUDGET_MS = {"config": 60, "pipeline": 300, "report_queue": 300, "batch_run": 300}
+DEFAULT_BUDGET_MS = 250
+
+_PROBE = """
+import sys, time, json
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"sec": elapsed, "heavy": sorted(m for m in {heavy!r} if m in sys.modules)}}))
+"""
+
+
+class _CountingHandler(BaseHTTPRequestHandler):
+    # 充当认证服务器：记录导入期间是否有人来取 Token
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.server.hits += 1
+        self.send_response(500)
+        self.end_headers()
+
+    do_GET = do_POST
+
+
+def measure(module, runs, env):
+    samples, heavy = [], set()
+    for _ in range(runs):
+        code = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+        proc = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, env=env,
+                              capture_output=True, text=True, timeout=120)
+        if proc.returncode != 0:
+            return {"module": module, "error": proc.stderr.strip().splitlines()[-1:]}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        samples.append(result["sec"] * 1000)
+        heavy.update(result["heavy"])
+    return {
+        "module": module,
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "heavy_loaded": sorted(heavy - ALLOWED_HEAVY.get(module, set())),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模块导入 (冷启动) 基准测试")
+    parser.add_argument("--modules", nargs="+", default=list(MODULES))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--check", action="store_true", help="超出预算、导入时加载重量级依赖或发起网络请求时返回 1")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    auth = ThreadingHTTPServer(("127.0.0.1", 0), _CountingHandler)
+    auth.hits = 0
+    threading.Thread(target=auth.serve_forever, daemon=True).start()
+    host, port = auth.server_address[:2]
+    env = dict(os.environ, AI_AUTH_URL=f"http://{host}:{port}/token", AI_API_BASE_URL=f"http://{host}:{port}/v3/ai",
+               CLIENT_ID=os.environ.get("CLIENT_ID", "bench"), CLIENT_SECRET=os.environ.get("CLIENT_SECRET", "bench"))
+
+    try:
+        rows = [measure(m, args.runs, env) for m in args.modules]
+    finally:
+        auth.shutdown()
+        auth.server_close()
+
+    problems = []
+    print(f"{'module':<14} {'median(ms)':>10} {'budget':>7}  heavy deps loaded at import")
+    for r in rows:
+        if "error" in r:
+            print(f"{r['module']:<14} 导入失败: {r['error']}")
+            problems.append(f"{r['module']}: 导入失败")
+            continue
+        budget = BUDGET_MS.get(r["module"], DEFAULT_BUDGET_MS)
+        r["budget_ms"] = budget
+        print(f"{r['module']:<14} {r['median_ms']:>10} {budget:>7}  {', '.join(r['heavy_loaded']) or '-'}")
+        if r["median_ms"] > budget:
+            problems.append(f"{r['module']}: {r['median_ms']}ms > {budget}ms")
+        if r["heavy_loaded"]:
+            problems.append(f"{r['module']}: 导入时加载了 {', '.join(r['heavy_loaded'])}")
+    if auth.hits:
+        problems.append(f"导入期间请求了认证服务器 {auth.hits} 次")
+    print(f"🌐 导入期间的认证请求: {auth.hits}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "startup", "results": rows, "auth_requests": auth.hits, "problems": problems},
+                      f, indent=2, ensure_ascii=False)
+    for p in problems:
+        print(f"❌ {p}")
+    return 1 if args.check and problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# benchmarks/compare_modes.py
+# 两步模式 vs 单次调用 (fused) 模式：同一批 PDF 分别跑一遍，对比耗时与输出差异，按类别决定用哪种模式
+#
+#   python -m benchmarks.compare_modes --manifest fixtures.csv --json compare_modes.json
+#   python -m benchmarks.compare_modes reports/ --category Equity
+import sys
+import json
+import time
+import argparse
+import difflib
+import statistics
+
+import config
+import pipeline
+from batch_run import load_manifest, scan_directory
+
+# 正文相似度不低于该值、且更快时，建议该类别使用 fused
+DEFAULT_MIN_SIMILARITY = 0.6
+
+
+def _norm(value):
+    return " ".join(str(value or "").split()).lower()
+
+
+def _header_value(header, key):
+    # Step 2 的 Prompt 里大小写键名都出现过 (title / Title)
+    for k, v in header.items():
+        if k.lower() == key:
+            return v
+    return ""
+
+
+def diff_outputs(two_step, fused):
+    """
+    对比两种模式的最终 JSON：header 字段是否一致、正文相似度、段落数、机构缩写
+    """
+    (raw_a, final_a), (raw_b, final_b) = two_step, fused
+    header_a, header_b = final_a.get("header_info", {}), final_b.get("header_info", {})
+    keys = sorted({k.lower() for k in list(header_a) + list(header_b)} - {"date"})
+    header_diff = {
+        k: {"two_step": _header_value(header_a, k), "fused": _header_value(header_b, k)}
+        for k in keys if _norm(_header_value(header_a, k)) != _norm(_header_value(header_b, k))
+    }
+
+    body_a = final_a.get("body_content", [])
+    body_b = final_b.get("body_content", [])
+    body_a = [body_a] if isinstance(body_a, str) else body_a
+    body_b = [body_b] if isinstance(body_b, str) else body_b
+    similarity = difflib.SequenceMatcher(None, "\n".join(body_a), "\n".join(body_b)).ratio()
+
+    acronym_a = pipeline.get_bank_acronym(raw_a.get("meta", {}).get("institution"))
+    acronym_b = pipeline.get_bank_acronym(raw_b.get("meta", {}).get("institution"))
+    return {
+        "header_fields_differ": header_diff,
+        "header_agreement": round(1 - len(header_diff) / len(keys), 3) if keys else 1.0,
+        "body_similarity": round(similarity, 3),
+        "paragraphs": {"two_step": len(body_a), "fused": len(body_b)},
+        "bank_acronym": {"two_step": acronym_a, "fused": acronym_b},
+    }
+
+
+def run_mode(pdf_text, category, mode):
+    started = time.perf_counter()
+    try:
+        output = pipeline.run_ai_stages(pdf_text, category, on_status=lambda msg: None, mode=mode)
+        error = None
+    except pipeline.PipelineError as e:
+        output, error = None, e.message
+    return output, round(time.perf_counter() - started, 2), error
+
+
+def compare_one(task):
+    pdf_text = pipeline.extract_pdf_text(task["file"])
+    row = {"file": task["file"], "category": task["category"]}
+    if not pdf_text:
+        row["error"] = "PDF 读取失败或为空"
+        return row
+
+    outputs = {}
+    for mode in pipeline.PIPELINE_MODES:
+        outputs[mode], row[f"{mode}_sec"], row[f"{mode}_error"] = run_mode(pdf_text, task["category"], mode)
+    if outputs["two_step"] and outputs["fused"]:
+        row["diff"] = diff_outputs(outputs["two_step"], outputs["fused"])
+    return row
+
+
+def summarize(rows, min_similarity=DEFAULT_MIN_SIMILARITY):
+    """
+    按类别汇总：平均耗时、失败数、平均正文相似度，并给出建议模式
+    """
+    summary = {}
+    for category in sorted({r["category"] for r in rows}):
+        group = [r for r in rows if r["category"] == category and "error" not in r]
+        both = [r for r in group if "diff" in r]
+        stats = {"reports": len(group)}
+        for mode in pipeline.PIPELINE_MODES:
+            times = [r[f"{mode}_sec"] for r in group if not r[f"{mode}_error"]]
+            stats[f"{mode}_mean_sec"] = round(statistics.mean(times), 2) if times else None
+            stats[f"{mode}_failures"] = sum(1 for r in group if r[f"{mode}_error"])
+        stats["body_similarity_mean"] = round(statistics.mean(r["diff"]["body_similarity"] for r in both), 3) if both else None
+        stats["header_agreement_mean"] = round(statistics.mean(r["diff"]["header_agreement"] for r in both), 3) if both else None
+
+        faster = (stats["fused_mean_sec"] or float("inf")) < (stats["two_step_mean_sec"] or float("inf"))
+        similar = (stats["body_similarity_mean"] or 0) >= min_similarity
+        reliable = stats["fused_failures"] <= stats["two_step_failures"]
+        stats["recommended_mode"] = "fused" if faster and similar and reliable else "two_step"
+        summary[category] = stats
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对比两步模式与单次调用模式的耗时和输出")
+    parser.add_argument("input_dir", nargs="?", help="PDF 所在文件夹")
+    parser.add_argument("--manifest", help="清单文件 (CSV/JSON)，逐个文件指定类别")
+    parser.add_argument("--category", help="文件夹模式下所有 PDF 使用的类别")
+    parser.add_argument("--min-similarity", type=float, default=DEFAULT_MIN_SIMILARITY)
+    parser.add_argument("--json", help="完整结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    if args.manifest:
+        tasks = load_manifest(args.manifest, "compare")
+    elif args.input_dir and args.category:
+        tasks = scan_directory(args.input_dir, args.category, "compare")
+    else:
+        parser.error("请指定 --manifest，或 PDF 文件夹 + --category")
+
+    # 对比必须真正调用 AI，不能命中缓存
+    config.RESULT_CACHE_ENABLED = False
+
+    rows = [compare_one(task) for task in tasks]
+    summary = summarize(rows, args.min_similarity)
+
+    print(f"{'category':<18} {'n':>3} {'two_step(s)':>12} {'fused(s)':>9} {'similarity':>11} {'recommend':>10}")
+    for category, s in summary.items():
+        print(f"{category:<18} {s['reports']:>3} {str(s['two_step_mean_sec']):>12} {str(s['fused_mean_sec']):>9} "
+              f"{str(s['body_similarity_mean']):>11} {s['recommended_mode']:>10}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "compare_modes", "summary": summary, "results": rows}, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
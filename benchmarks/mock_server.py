@@ -0,0 +1,327 @@
+# benchmarks/mock_server.py
+# 本地模拟的 AI 任务接口：Token 端点、POST /job、GET /job/JOB_ID/{id}、DELETE /job/JOB_ID/{id}
+# 延迟、失败率、返回内容都可配置，用于在不访问 easyview 的情况下测量整条流水线
+#
+#   python -m benchmarks.mock_server --port 8765 --latency 3 --jitter 1 --failure-rate 0.05
+#   然后: AI_AUTH_URL=http://127.0.0.1:8765/token AI_API_BASE_URL=http://127.0.0.1:8765/v3/ai streamlit run app.py
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# --- 预设的 AI 输出 (与 config.py 中各 Prompt 的输出格式一致) ---
+CANNED_WSH_STEP1 = {
+    "meta": {"institution": "Goldman Sachs", "analyst": "Jane Doe"},
+    "stock": {"ticker": "0700.HK", "name": "Tencent Holdings", "rating": "Buy",
+              "target_price": "520", "target_price_previous": "480", "currency": "HKD"},
+    "content_raw": {
+        "thesis_summary": "Cloud revenue growth re-accelerates into 2H with margin expansion.",
+        "drivers": ["Gaming pipeline", "Advertising recovery", "Cloud margin"],
+        "financial_outlook": "FY26 revenue growth of 8-10% with stable margins.",
+    },
+}
+CANNED_FUND_FLOW_STEP1 = {
+    "meta": {"institution": "Goldman Sachs", "title_en": "Robust Bond Flows Year-to-Date"},
+    "raw_content": {
+        "summary_text": "Mutual funds saw net inflows of $12.4bn led by the US and Mainland China.",
+        "body_text": "Equity funds saw negative flows. Fixed income funds recorded strong inflows. Cross-border FX flows stayed positive.",
+    },
+}
+CANNED_FINAL = {
+    "header_info": {
+        "category": "Wall Street Highlights-Equity",
+        "date": "2026/01/01",
+        "title": "Goldman Sachs: Tencent Holdings (0700.HK) Stock maintain Buy on cloud re-acceleration",
+        "summary": "GS expect Tencent's cloud revenue growth to re-accelerate into 2H as margins expand.",
+        "tags": "互联网/港股/游戏",
+        "stock": "0700.HK",
+        "rating": "Buy",
+        "price_target": "HKD520.00 (Previous Price Target: HKD480.00)",
+    },
+    "body_content": [
+        "**GS expect cloud revenue growth to re-accelerate into 2H.** Margins expanded on mix.",
+        "**GS highlight that the gaming pipeline remains strong.** New titles support FY26 growth.",
+        "**GS estimate advertising revenue to grow 15% in FY26.** Video accounts monetisation improves.",
+        "**GS believe the valuation is attractive.** The stock trades at 14x forward earnings.",
+    ],
+    "footer_info": {"stock": "0700.HK", "rating": "Buy", "price_target": "HKD520.00 (Previous Price Target: HKD480.00)"},
+}
+
+
+def canned_output(prompt):
+    """
+    根据 Prompt 判断是哪一步，返回带 ```json 代码块的文本 (模仿真实 LLM 输出)
+    """
+    if "Task: JSON Reformat" in prompt:
+        # 重排格式任务：按 Prompt 里要求的结构返回
+        schema = prompt.split("exactly this structure:", 1)[-1].split("\n", 1)[0]
+        if '"header_info"' in schema:
+            body = dict(CANNED_FINAL, meta={"institution": "Goldman Sachs"}) if '"meta"' in schema else CANNED_FINAL
+        elif '"raw_content"' in schema:
+            body = CANNED_FUND_FLOW_STEP1
+        else:
+            body = CANNED_WSH_STEP1
+    elif "# Batch Notice" in prompt:
+        # Step 2 批处理：按文档 ID 各返回一份
+        doc_ids = re.findall(r"^=== DOCUMENT (D\d+) ===$", prompt, re.M)
+        body = {doc_id: CANNED_FINAL for doc_id in doc_ids}
+    elif "Pipeline Mode: Single Pass" in prompt:
+        body = dict(CANNED_FINAL, meta={"institution": "Goldman Sachs"})
+    elif "Output Schema" in prompt:
+        body = CANNED_FINAL
+    elif "raw_content" in prompt:
+        body = CANNED_FUND_FLOW_STEP1
+    else:
+        body = CANNED_WSH_STEP1
+    return "```json\n" + json.dumps(body, ensure_ascii=False, indent=2) + "\n```"
+
+
+def corrupt_output(text, rng):
+    """
+    模拟 LLM 常见的 JSON 格式错误：多余逗号 / 截断结尾 / 缺少字段
+    """
+    kind = rng.choice(("trailing_comma", "truncated", "missing_key"))
+    if kind == "trailing_comma":
+        return text.replace("\n}", ",\n}", 1)
+    if kind == "truncated":
+        return text[: int(len(text) * 0.8)]
+    return text.replace('"meta"', '"metadata"').replace('"header_info"', '"header"')
+
+
+class MockState:
+    def __init__(self, latency=2.0, jitter=0.5, failure_rate=0.0, submit_error_rate=0.0,
+                 token_ttl=300, seed=None, output_fn=canned_output, malformed_rate=0.0,
+                 tail_rate=0.0, tail_latency=60.0, latency_per_kchar=0.0, rate_limit=0.0, html_error_rate=0.0):
+        self.latency = latency
+        self.latency_per_kchar = latency_per_kchar  # Prompt 每 1000 字符额外的耗时 (模拟输入 token 越多越慢)
+        self.jitter = jitter
+        self.tail_rate = tail_rate          # 一部分任务在后端排队很久 (长尾)
+        self.tail_latency = tail_latency
+        self.failure_rate = failure_rate
+        self.submit_error_rate = submit_error_rate
+        self.html_error_rate = html_error_rate  # 轮询返回 200 + HTML 错误页的比例 (模拟网关)
+        self.rate_limit = rate_limit        # 每秒最多接受多少次提交，超过返回 429 + Retry-After (0 表示不限)
+        self.recent_submits = deque()
+        self.token_ttl = token_ttl
+        self.output_fn = output_fn
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.counters = {"token": 0, "submit": 0, "poll": 0, "submit_errors": 0, "malformed": 0, "tail": 0,
+                         "cancelled": 0, "throttled": 0, "html_errors": 0, "connections": 0}
+        self.priorities = {}  # metadata.priority -> 提交次数
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def over_rate_limit(self):
+        # 滑动 1 秒窗口内的提交数
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self.recent_submits and self.recent_submits[0] <= now - 1.0:
+                self.recent_submits.popleft()
+            if len(self.recent_submits) >= self.rate_limit:
+                return True
+            self.recent_submits.append(now)
+            return False
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive，才能测出连接池的效果
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        # 每个 TCP 连接一个 handler 实例：连接数可以看出客户端有没有复用连接
+        super().setup()
+        self.state.count("connections")
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def _send(self, code, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_POST(self):
+        raw = self._read_body()
+        state = self.state
+        if self.path.endswith("/token"):
+            state.count("token")
+            return self._send(200, {"access_token": uuid.uuid4().hex, "expires_in": state.token_ttl})
+
+        if self.path.endswith("/job"):
+            state.count("submit")
+            if state.over_rate_limit():
+                state.count("throttled")
+                return self._send(429, {"error": "mock: rate limited"}, headers={"Retry-After": "1"})
+            if state.rng.random() < state.submit_error_rate:
+                state.count("submit_errors")
+                return self._send(503, {"error": "mock: service unavailable"})
+            payload = json.loads(raw or b"{}")
+            priority = payload.get("metadata", {}).get("priority")
+            with state.lock:
+                state.priorities[priority] = state.priorities.get(priority, 0) + 1
+            prompt = payload.get("input", {}).get("parameter", {}).get("prompt", "")
+            job_id = uuid.uuid4().hex
+            duration = max(0.0, state.rng.gauss(state.latency, state.jitter))
+            duration += len(prompt) / 1000 * state.latency_per_kchar
+            if state.rng.random() < state.tail_rate:
+                state.count("tail")
+                duration += state.tail_latency
+            failed = state.rng.random() < state.failure_rate
+            malformed = "Task: JSON Reformat" not in prompt and state.rng.random() < state.malformed_rate
+            if malformed:
+                state.count("malformed")
+            with state.lock:
+                state.jobs[job_id] = {"done_at": time.monotonic() + duration, "failed": failed, "prompt": prompt,
+                                      "malformed": malformed}
+            return self._send(200, {"id": job_id})
+
+        self._send(404, {"error": "not found"})
+
+    def do_GET(self):
+        state = self.state
+        if "/job/JOB_ID/" not in self.path:
+            return self._send(404, {"error": "not found"})
+        state.count("poll")
+        if state.html_error_rate and state.rng.random() < state.html_error_rate:
+            state.count("html_errors")
+            data = b"<html><body><h1>502 Bad Gateway</h1></body></html>"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            return self.wfile.write(data)
+        job_id = self.path.rsplit("/", 1)[-1]
+        with state.lock:
+            job = state.jobs.get(job_id)
+        if job is None:
+            return self._send(404, {"error": "unknown job"})
+        if time.monotonic() < job["done_at"]:
+            return self._send(200, {"id": job_id, "status": "RUNNING"})
+        if job["failed"]:
+            return self._send(200, {"id": job_id, "status": "FAILED", "error": "mock: injected failure"})
+        output = state.output_fn(job["prompt"])
+        if job["malformed"]:
+            output = corrupt_output(output, random.Random(job_id))
+        return self._send(200, {"id": job_id, "status": "SUCCESS", "output": output})
+
+    def do_DELETE(self):
+        # 取消任务 (配合 AI_JOB_CANCEL_METHOD=DELETE)
+        state = self.state
+        if "/job/JOB_ID/" not in self.path:
+            return self._send(404, {"error": "not found"})
+        job_id = self.path.rsplit("/", 1)[-1]
+        with state.lock:
+            job = state.jobs.pop(job_id, None)
+        if job is None:
+            return self._send(404, {"error": "unknown job"})
+        state.count("cancelled")
+        self._send(200, {"id": job_id, "status": "CANCELLED"})
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    # listen() 在构造时调用，backlog 必须在类上设置；默认的 5 在高并发下会丢连接
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class MockAIServer:
+    """
+    在后台线程里运行的模拟服务：
+        with MockAIServer(latency=1.0) as server:
+            os.environ["AI_AUTH_URL"] = server.auth_url
+    """
+    def __init__(self, host="127.0.0.1", port=0, **state_kwargs):
+        self.httpd = _MockHTTPServer((host, port), MockHandler)
+        self.httpd.state = MockState(**state_kwargs)
+        self._thread = None
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    @property
+    def base(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def auth_url(self):
+        return f"{self.base}/token"
+
+    @property
+    def api_base_url(self):
+        return f"{self.base}/v3/ai"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟 AI 任务接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=2.0, help="任务平均耗时 (秒)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="耗时标准差 (秒)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="任务返回 FAILED 的比例")
+    parser.add_argument("--submit-error-rate", type=float, default=0.0, help="提交返回 503 的比例")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="返回格式错误 JSON 的比例")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="长尾任务的比例")
+    parser.add_argument("--tail-latency", type=float, default=60.0, help="长尾任务额外的耗时 (秒)")
+    parser.add_argument("--latency-per-kchar", type=float, default=0.0, help="Prompt 每 1000 字符额外的耗时 (秒)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="每秒最多接受的提交数，超过返回 429 (0 表示不限)")
+    parser.add_argument("--html-error-rate", type=float, default=0.0, help="轮询返回 200 + HTML 错误页的比例")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    server = MockAIServer(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                          failure_rate=args.failure_rate, submit_error_rate=args.submit_error_rate,
+                          malformed_rate=args.malformed_rate, tail_rate=args.tail_rate,
+                          tail_latency=args.tail_latency, latency_per_kchar=args.latency_per_kchar,
+                          rate_limit=args.rate_limit, html_error_rate=args.html_error_rate, seed=args.seed)
+    print(f"🧪 模拟服务已启动: AI_AUTH_URL={server.auth_url} AI_API_BASE_URL={server.api_base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
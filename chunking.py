@@ -0,0 +1,140 @@
+# chunking.py
+# 长报告的 Step 1 分块 (map-reduce)：按章节切成有重叠的几段，并发提取，再合并成 Step 2 需要的同一个 JSON 结构
+import re
+import config
+
+# 看起来像章节标题的行：全大写短句、编号标题、或常见的研报小标题
+HEADING_RE = re.compile(
+    r"^\s*(?:"
+    r"[A-Z][A-Z0-9 &/,'\-\.:]{3,80}"                       # WEEKLY FUND FLOWS / KEY RISKS
+    r"|(?:\d+(?:\.\d+)*|[IVX]+)[\.\)]\s+\S.{0,80}"          # 1. Investment thesis / II) Valuation
+    r"|(?:Exhibit|Figure|Table)\s+\d+.*"                    # Exhibit 3: ...
+    r")\s*$"
+)
+
+# 合并时需要拼接 (而不是取第一个非空值) 的长文本字段
+CONCAT_KEYS = {"body_text", "thesis_summary", "financial_outlook"}
+
+CHUNK_NOTE = """
+
+# Chunk Notice
+The INPUT DATA below is part {index} of {total} of a longer report (consecutive parts overlap slightly).
+Extract only what appears in this part, using the same Output Format. Leave any field you cannot find here as an empty string or empty list; do not guess.
+"""
+
+
+def should_chunk(text):
+    mode = config.STEP1_CHUNK_MODE
+    if mode == "on":
+        return True
+    if mode == "off":
+        return False
+    return len(text) > config.STEP1_CHUNK_THRESHOLD
+
+
+def _sections(text):
+    """
+    按标题行切成若干节，每节是连续行的列表
+    """
+    sections, current = [], []
+    for line in text.splitlines():
+        if current and HEADING_RE.match(line):
+            sections.append(current)
+            current = []
+        current.append(line)
+    if current:
+        sections.append(current)
+    return sections
+
+
+def split_text(text, max_chars=None, overlap=None):
+    """
+    把文本切成不超过 max_chars 的块：优先在章节边界切，单节太长时按行切；
+    相邻块之间保留约 overlap 个字符的重叠，避免句子/表格被切断后丢失
+    """
+    max_chars = max_chars or config.STEP1_CHUNK_SIZE
+    overlap = config.STEP1_CHUNK_OVERLAP if overlap is None else overlap
+
+    # 先把过长的节按行拆开，得到「不可再分」的单元 (给重叠部分预留空间)
+    unit_limit = max(1, max_chars - overlap)
+    units = []
+    for section in _sections(text):
+        block = "\n".join(section)
+        if len(block) <= unit_limit:
+            units.append(block)
+            continue
+        piece = []
+        size = 0
+        for line in section:
+            line = line[:unit_limit]
+            if piece and size + len(line) + 1 > unit_limit:
+                units.append("\n".join(piece))
+                piece, size = [], 0
+            piece.append(line)
+            size += len(line) + 1
+        if piece:
+            units.append("\n".join(piece))
+
+    chunks, current, size = [], [], 0
+    for unit in units:
+        if current and size + len(unit) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            # 重叠：带上上一块末尾的若干行
+            tail, tail_size = [], 0
+            for line in reversed(chunks[-1].splitlines()):
+                if tail_size + len(line) + 1 > overlap:
+                    break
+                tail.insert(0, line)
+                tail_size += len(line) + 1
+            current, size = (["\n".join(tail)], tail_size) if tail else ([], 0)
+            if size + len(unit) + 1 > max_chars:
+                current, size = [], 0
+        current.append(unit)
+        size += len(unit) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def chunk_prompt(system_prompt, index, total):
+    return system_prompt + CHUNK_NOTE.format(index=index, total=total)
+
+
+def _merge_values(key, values):
+    values = [v for v in values if v not in (None, "", [], {})]
+    if not values:
+        return ""
+    first = values[0]
+    if isinstance(first, dict):
+        keys = []
+        for v in values:
+            if isinstance(v, dict):
+                keys.extend(k for k in v if k not in keys)
+        return {k: _merge_values(k, [v.get(k) for v in values if isinstance(v, dict)]) for k in keys}
+    if isinstance(first, list):
+        merged = []
+        for v in values:
+            for item in (v if isinstance(v, list) else [v]):
+                if item not in merged:
+                    merged.append(item)
+        return merged
+    if key in CONCAT_KEYS:
+        parts = []
+        for v in values:
+            text = str(v).strip()
+            # 重叠区域可能让两块提取出相同的段落
+            if text and not any(text in p for p in parts):
+                parts.append(text)
+        return "\n".join(parts)
+    # 机构名、标题、评级等：以最靠前 (通常是首页) 的块为准
+    return first
+
+
+def merge_step1(partials):
+    """
+    合并各块的 Step 1 JSON (meta/raw_content 或 meta/stock/content_raw)，结构与单次提取一致
+    """
+    partials = [p for p in partials if isinstance(p, dict)]
+    if not partials:
+        return None
+    return _merge_values(None, partials)
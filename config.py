@@ -1,9 +1,7 @@
 # config.py
-from pptx.dml.color import RGBColor
-import requests
+# 导入本模块不做任何网络请求，也不导入 streamlit / requests 等重量级依赖 (见 benchmarks/bench_startup.py)
 import os
 from dotenv import load_dotenv
-import streamlit as st
 # ==============================================================================
 # 加载 .env 文件中的变量
 load_dotenv()
@@ -15,16 +13,198 @@ load_dotenv()
 # 1. AI API 与 认证配置
 # ==============================================================================
 
-AUTH_URL = "https://auth-v2.easyview.xyz/realms/evhk/protocol/openid-connect/token"
-API_BASE_URL = "https://api-v2.easyview.xyz/v3/ai"
-# AI 服务的专用凭据
+# 可通过环境变量覆盖 (例如基准测试时指向本地的模拟服务 benchmarks/mock_server.py)
+AUTH_URL = os.getenv("AI_AUTH_URL", "https://auth-v2.easyview.xyz/realms/evhk/protocol/openid-connect/token")
+API_BASE_URL = os.getenv("AI_API_BASE_URL", "https://api-v2.easyview.xyz/v3/ai")
+# AI 服务的专用凭据：优先读环境变量 / .env，没有时在第一次使用时读 Streamlit secrets (见文件末尾 __getattr__)
 # CLIENT_ID = "cioinsight-api-client"
 # CLIENT_SECRET = "b02fe9e7-36e6-4c81-a389-9399184eda9b"
-CLIENT_ID = st.secrets["CLIENT_ID"]
-CLIENT_SECRET = st.secrets["CLIENT_SECRET"]
+if os.getenv("CLIENT_ID"):
+    CLIENT_ID = os.getenv("CLIENT_ID")
+if os.getenv("CLIENT_SECRET"):
+    CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 # AI 模型名称
 AI_MODEL_NAME = "claude-sonnet-4"
 
+# AI 任务轮询策略 (秒)：先快速检查，之后逐步放慢，直到总截止时间
+AI_POLL_INITIAL_DELAY = 1.0
+AI_POLL_MAX_INTERVAL = 5.0
+AI_POLL_BACKOFF = 1.5
+AI_JOB_DEADLINE = 180
+
+# 对冲请求 (hedging)：任务超过近期耗时的 AI_HEDGE_PERCENTILE 分位仍未完成时，再提交一个相同的任务，谁先完成用谁
+# 样本不足 AI_HEDGE_MIN_SAMPLES 时使用 AI_HEDGE_DEFAULT_DELAY；对冲任务数最多为普通任务的 AI_HEDGE_MAX_RATIO 倍
+AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "0") == "1"
+AI_HEDGE_PERCENTILE = 90
+AI_HEDGE_MIN_SAMPLES = 20
+AI_HEDGE_DEFAULT_DELAY = 45.0
+AI_HEDGE_MIN_DELAY = 10.0
+AI_HEDGE_MAX_RATIO = 0.1
+# 取消后端任务的 HTTP 方法 (对冲输掉的任务、超时的任务)；None 表示后端不支持取消，只是不再轮询
+AI_JOB_CANCEL_METHOD = os.getenv("AI_JOB_CANCEL_METHOD") or None
+
+# AI 任务提交调度 (scheduler.py)：令牌桶限速 (每秒 AI_SUBMIT_RATE 个，最多积攒 AI_SUBMIT_BURST 个) + 最多 AI_MAX_IN_FLIGHT 个在途任务
+# 优先级通道 -> 提交时写入 metadata.priority 的值；字典顺序即排队顺序 (网页用户优先于批量模式)，按后端约定调整
+AI_SCHEDULER_ENABLED = os.getenv("AI_SCHEDULER_ENABLED", "1") == "1"
+AI_SUBMIT_RATE = float(os.getenv("AI_SUBMIT_RATE", "10"))
+AI_SUBMIT_BURST = 20
+AI_MAX_IN_FLIGHT = int(os.getenv("AI_MAX_IN_FLIGHT", "100"))
+AI_PRIORITY_LANES = {
+    "interactive": 1,
+    "batch": 2,
+}
+AI_SCHEDULER_POLL_SEC = 0.05
+# 后端返回 429 / 5xx 时：暂停提交 (优先按 Retry-After，否则从 BASE 秒起指数退避到 MAX 秒)，速率减半 (不低于 MIN_RATE)，
+# 之后每秒恢复 AI_SUBMIT_RATE 的 RECOVERY 比例；单个任务最多重试 AI_SUBMIT_RETRIES 次
+AI_THROTTLE_BACKOFF_BASE = 1.0
+AI_THROTTLE_BACKOFF_MAX = 60.0
+AI_THROTTLE_MIN_RATE = 0.5
+AI_THROTTLE_RECOVERY = 0.1
+AI_SUBMIT_RETRIES = 4
+
+# 每份报告从开始生成算起的总时间预算 (秒)，按类别配置：AI 任务的等待不会超过它，用完后不再提交新任务 (含重排格式)
+AI_REPORT_BUDGET_DEFAULT = 300
+AI_REPORT_BUDGET_BY_CATEGORY = {
+    "Equity": 240,
+    "Macro": 240,
+    "FX&Commodity": 240,
+    "Weekly Fund Flow": 180,
+}
+
+# AI 结果缓存 (同一 PDF + Prompt + 模型 直接复用上次的 JSON)
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_PATH = os.path.join(".cache", "ai_results.sqlite3")
+RESULT_CACHE_MAX_MB = 200
+RESULT_CACHE_MAX_AGE_DAYS = 30
+
+# 相同 AI 阶段的请求合并 (single_flight.py)：同一 (阶段, PDF 哈希, Prompt, 模型) 正在运行时，后来者等待其结果；
+# CROSS_PROCESS 通过结果缓存所在的 SQLite 文件在多个进程间合并 (需要 RESULT_CACHE_ENABLED)，每 POLL_SEC 秒检查一次
+SINGLE_FLIGHT_ENABLED = True
+SINGLE_FLIGHT_CROSS_PROCESS = True
+SINGLE_FLIGHT_POLL_SEC = 1.0
+
+# PDF 读取：页数达到 PDF_PARALLEL_MIN_PAGES 才使用进程池；WORKERS = None 表示使用全部 CPU
+PDF_PARALLEL_MIN_PAGES = 8
+PDF_EXTRACT_WORKERS = None
+PDF_PAGE_CACHE_MAX_PAGES = 2000
+# PDF 文本后端 (pdf_backends.py)：pdfplumber / pdfminer / pypdfium2 / pymupdf，或 auto —— 按 ORDER 依次试读前 PROBE_PAGES 页，
+# 选第一个已安装且乱码比例 (缺字形的 (cid:N)、替换字符等) 不超过 MAX_GARBLED_RATIO 的后端
+PDF_TEXT_BACKEND = os.getenv("PDF_TEXT_BACKEND", "auto")
+PDF_TEXT_BACKEND_ORDER = ("pypdfium2", "pymupdf", "pdfminer", "pdfplumber")
+PDF_TEXT_PROBE_PAGES = 3
+PDF_TEXT_MAX_GARBLED_RATIO = 0.02
+
+# 自动提取图表 (没有上传封面图时)：扫描前 FIGURE_SCAN_PAGES 页，取面积最大的 FIGURE_MAX_IMAGES 张放进 Word
+# 候选区域：内嵌位图，或矢量图形 (曲线 / 填充矩形) 达到 FIGURE_MIN_VECTOR_OBJECTS 个的区域；面积至少占页面的 MIN_AREA_RATIO
+FIGURE_AUTO_EXTRACT = True
+FIGURE_SCAN_PAGES = 6
+FIGURE_MAX_IMAGES = 1
+FIGURE_MIN_AREA_RATIO = 0.08
+FIGURE_MIN_VECTOR_OBJECTS = 15
+FIGURE_CACHE_MAX_PAGES = 200
+
+# Word 里图片的打印宽度 (英寸) 与分辨率：更大的图片先缩小再以 JPEG 重新压缩，避免 .docx 过大
+DOCX_IMAGE_WIDTH_IN = 6.0
+DOCX_IMAGE_DPI = 150
+DOCX_IMAGE_JPEG_QUALITY = 80
+
+# 长报告 Step 1 分块：auto = 文本超过阈值时自动分块；on / off 强制开关 (单位: 字符)
+STEP1_CHUNK_MODE = "auto"
+STEP1_CHUNK_THRESHOLD = 60000
+STEP1_CHUNK_SIZE = 24000
+STEP1_CHUNK_OVERLAP = 1500
+
+# 资金流周报 Step 1 的规则提取 (fund_flow_rules.py)：按前 RULES_PAGES 页的版面 (行、字号、项目符号) 在本地提取
+# 机构、标题 (TITLE_MARKER 之后 TITLE_SEARCH_LINES 行内)、摘要 (第一个项目符号段落) 和正文 (之后的项目符号段落，
+# 遇到 BODY_STOP 开头的行结束)；任何一项置信度检查不通过都回退到 AI Step 1。页面上下 MARGIN_RATIO 内视为页眉页脚
+FUND_FLOW_RULES_ENABLED = os.getenv("FUND_FLOW_RULES_ENABLED", "1") == "1"
+FUND_FLOW_RULES_PAGES = 2
+FUND_FLOW_RULES_MARGIN_RATIO = 0.03
+FUND_FLOW_TITLE_MARKER = r"WEEKLY FUND FLOWS?"
+FUND_FLOW_TITLE_SEARCH_LINES = 6
+# "n" 是 Wingdings 黑点被提取成的字母；\uf06e 等是未映射到 Unicode 的符号字体字符
+FUND_FLOW_BULLETS = ("n", "•", "▪", "■", "●", "◼", "\uf06e", "\uf0a7", "\uf0b7")
+FUND_FLOW_BODY_STOP = r"(?:exhibit|figure|chart|source|disclosure appendix|important disclosures)\b"
+FUND_FLOW_MIN_SUMMARY_CHARS = 80
+FUND_FLOW_MAX_BODY_CHARS = 6000
+
+# 送入 AI 之前精简 PDF 文本 (text_reduce.py)：去掉页眉页脚 (出现在每页开头 / 结尾 EDGE_LINES 行内、
+# 至少 REPEAT_MIN_PAGES 页且占页数 REPEAT_MIN_RATIO 以上的行) 和文末的免责声明附录 (起始行在全文 APPENDIX_MIN_RATIO 之后)
+TEXT_REDUCE_ENABLED = os.getenv("TEXT_REDUCE_ENABLED", "1") == "1"
+TEXT_REDUCE_EDGE_LINES = 3
+TEXT_REDUCE_REPEAT_MIN_PAGES = 3
+TEXT_REDUCE_REPEAT_MIN_RATIO = 0.5
+TEXT_REDUCE_APPENDIX_MIN_RATIO = 0.3
+# 按机构的规则 (键为 get_bank_acronym 返回的缩写，"*" 对所有机构生效)：
+#   sections: 附录起始行 (行首匹配，从这一行删到文末)；lines: 整行删除的固定提示语；enabled: False 关闭该机构的精简
+TEXT_REDUCE_RULES = {
+    "*": {
+        "sections": [
+            r"(?:disclosure appendix|important disclosures|required disclosures|general disclosures|"
+            r"analyst certifications?\b|disclosures? (?:and|&) disclaimers?|legal disclaimer|regulatory disclosures)",
+            r"(?:免责声明|分析师声明|重要声明|法律声明|一般声明)",
+        ],
+        "lines": [
+            r"does and seeks to do business with",
+            r"see (?:the )?(?:disclosure appendix|page \d+|pages? \d+\s*-\s*\d+).{0,40}(?:disclosures|certification)",
+            r"refer to important disclosures on page",
+        ],
+    },
+    "GS": {
+        "sections": [r"Reg AC\b"],
+        "lines": [r"Investors should consider this report as only a single factor",
+                  r"For Reg AC certification and other important disclosures"],
+    },
+    "MS": {"sections": [r"Disclosure Section"]},
+    "JPM": {"lines": [r"including non-US analyst disclosures"]},
+    "BofA": {"lines": [r"BofA Securities does and seeks"]},
+    "UBS": {"sections": [r"Statement of Risk"],
+            "lines": [r"ANALYST CERTIFICATION AND REQUIRED DISCLOSURES BEGIN ON PAGE"]},
+    "HSBC": {"lines": [r"This document must be read with the disclosures"]},
+    "DB": {"sections": [r"Appendix 1\b"]},
+    "CITICS": {"sections": [r"分析师声明"]},
+}
+
+# Step 2 跨文档批处理 (批量模式 --batch-step2 开启)：同一类别的 Step 2 请求在 WINDOW 秒内攒成一批，
+# 合并成一个任务提交；每批 Prompt 不超过 MAX_CHARS 字符、最多 MAX_DOCS 份文档
+STEP2_BATCH_ENABLED = False
+STEP2_BATCH_WINDOW_SEC = 3.0
+STEP2_BATCH_MAX_CHARS = 60000
+STEP2_BATCH_MAX_DOCS = 6
+
+# 指标：每个阶段一行 JSON 日志；Prometheus 文本文件 (每份报告结束时刷新)；METRICS_PORT 非空时提供 /metrics 端点
+METRICS_LOG_PATH = os.getenv("METRICS_LOG_PATH", os.path.join(".cache", "metrics.jsonl"))
+METRICS_PROM_PATH = os.getenv("METRICS_PROM_PATH", os.path.join(".cache", "metrics.prom"))
+METRICS_PORT = int(os.getenv("METRICS_PORT") or 0) or None
+
+# Streamlit 会话内缓存 (app.py)：PDF 文本按上传文件哈希缓存、AI 结果按 (哈希, 类别, 模式) 缓存；超过条数或 TTL 自动淘汰
+APP_CACHE_TTL_SEC = 3600
+APP_CACHE_MAX_TEXTS = 16
+APP_CACHE_MAX_RESULTS = 64
+
+# 后台生成队列 (app.py / service.py)：任务状态、后端 job_id、生成结果都存在本地 SQLite，页面刷新/进程重启后可恢复
+REPORT_QUEUE_PATH = os.getenv("REPORT_QUEUE_PATH", os.path.join(".cache", "report_queue.sqlite3"))
+REPORT_QUEUE_WORKERS = int(os.getenv("REPORT_QUEUE_WORKERS") or 2)
+# 运行中任务的心跳间隔；超过 STALE_SEC 没有心跳视为进程已退出，任务重新排队
+REPORT_QUEUE_HEARTBEAT_SEC = 10
+REPORT_QUEUE_STALE_SEC = 60
+# 同一任务最多执行几次：每次都把进程搞崩的任务 (例如读取时内存溢出的 PDF) 达到次数后标记为失败，不再重新排队
+REPORT_QUEUE_MAX_ATTEMPTS = 3
+# 已完成 / 失败的任务保留多少天
+REPORT_QUEUE_KEEP_DAYS = 7
+
+# 流水线 HTTP 服务 (service.py)：设置 PIPELINE_SERVICE_URL 时网页只是客户端 (提交 / 查询 / 下载)，生成在服务端的 worker 里进行；
+# SERVICE_RUN_WORKERS=0 时服务只提供 API，任务由单独的 worker 进程 (python service.py --worker-only) 执行。
+# 任务、PDF 和 Word 都在 API 所在机器的任务库 (REPORT_QUEUE_PATH，本地 SQLite) 里，API 是唯一有状态的部分；
+# 设置 SERVICE_QUEUE_URL 的 worker 不读本地任务库，而是通过 API 的 /worker 接口领取任务、回传结果，可以跑在任意多台机器上
+PIPELINE_SERVICE_URL = os.getenv("PIPELINE_SERVICE_URL") or None
+SERVICE_RUN_WORKERS = os.getenv("SERVICE_RUN_WORKERS", "1") == "1"
+SERVICE_QUEUE_URL = os.getenv("SERVICE_QUEUE_URL") or None
+# /worker 接口的共享口令 (请求头 X-Worker-Token)；为空时不校验，只适合内网
+SERVICE_WORKER_TOKEN = os.getenv("SERVICE_WORKER_TOKEN") or None
+SERVICE_MAX_UPLOAD_MB = 50
+SERVICE_CLIENT_TIMEOUT = 30
+
 # 请求元数据 (Metadata)
 API_METADATA = {
     "tenantId": "GOLDHORSE",
@@ -33,21 +213,21 @@ API_METADATA = {
     "priority": 1,
     "custom": {}
 }
-# 获取访问令牌的函数
+# 获取访问令牌的函数 (新代码请用 ai_client.get_shared_client().get_token()，带缓存)
 def get_access_token_b(CLIENT_ID, CLIENT_SECRET):
+    import requests
     payload = {
         'grant_type': 'client_credentials',
         'client_id': CLIENT_ID,
         'client_secret': CLIENT_SECRET
     }
     try:
-        resp = requests.post(AUTH_URL, data=payload)
+        resp = requests.post(AUTH_URL, data=payload, timeout=10)
         resp.raise_for_status()
         return resp.json().get('access_token')
     except Exception as e:
         print(f" 认证失败: {e}")
         return None
-API_TOKEN = get_access_token_b(CLIENT_ID, CLIENT_SECRET)
 # --- 资金流周报 (Weekly Fund Flow) ---
 FUND_FLOW_STEP1 = """
 # Role
@@ -210,16 +390,67 @@ In `body_content`, identify the core viewpoint in EACH paragraph and wrap it wit
 """
 
 
+# --- 单次调用 (fused) 模式：Step 1 + Step 2 合并为一次 AI 任务 ---
+# 每个类别使用的流水线模式："two_step" (默认，两次调用) 或 "fused" (一次调用)
+PIPELINE_MODE_DEFAULT = "two_step"
+PIPELINE_MODE_BY_CATEGORY = {
+    "Equity": "two_step",
+    "Macro": "two_step",
+    "FX&Commodity": "two_step",
+    "Weekly Fund Flow": "two_step",
+}
 
+FUSED_PROMPT_PREFIX = """
+# Pipeline Mode: Single Pass
+Complete BOTH stages below in ONE pass, working directly from the report text in INPUT DATA.
+- Stage 1 is your own intermediate extraction: do NOT output the Stage 1 JSON.
+- Apply Stage 2 to your Stage 1 result and output ONE JSON object that follows the Stage 2 Output Schema exactly,
+  plus one extra top-level key "meta" with the institution name from Stage 1: "meta": {{ "institution": "..." }}
+"""
 
+# WSH 模板保留 {category} 占位符，使用方式与 STEP_1/STEP_2 相同: .format(category=...)
+STEP_FUSED_PROMPT_TEMPLATE = (
+    FUSED_PROMPT_PREFIX
+    + "\n# ========== Stage 1 ==========\n" + STEP_1_PROMPT_TEMPLATE
+    + "\n# ========== Stage 2 ==========\n" + STEP_2_PROMPT_TEMPLATE
+)
+
+# 资金流模板不需要 format，花括号保持单层
+FUND_FLOW_FUSED = (
+    FUSED_PROMPT_PREFIX.replace("{{", "{").replace("}}", "}")
+    + "\n# ========== Stage 1 ==========\n" + FUND_FLOW_STEP1
+    + "\n# ========== Stage 2 ==========\n" + FUND_FLOW_STEP2
+)
+
+# --- JSON 重排格式 (本地修复失败或结构不对时的兜底) ---
+# 只把上一步的原始输出发回去重排格式，不重新读 PDF，比重跑整步快得多
+JSON_REFORMAT_ENABLED = True
+JSON_REFORMAT_PROMPT_TEMPLATE = """
+# Role
+You are a strict JSON formatter. Task: JSON Reformat.
 
+# Task
+The INPUT DATA below is the output of a previous step. It was supposed to be ONE JSON object but it is malformed
+or does not match the required structure.
+Problems found: {problems}
+
+1. Output ONE valid JSON object with exactly this structure: {schema}
+2. Keep every value (text, numbers, names, Chinese wording, ** markers) exactly as in the input. Do NOT translate,
+   summarize, rewrite or invent content. Only fix syntax, nesting and key names.
+3. If a part of the input was cut off, keep what is there; do not complete sentences.
+4. Output the JSON only, without code fences or explanations.
+"""
 
 
-
-
-
-
-
-
-
-
+# 延迟读取的配置 (PEP 562)：第一次访问时才读 Streamlit secrets / 请求 Token，导入时没有副作用
+def __getattr__(name):
+    if name in ("CLIENT_ID", "CLIENT_SECRET"):
+        import streamlit as st
+        value = st.secrets[name]
+        globals()[name] = value
+        return value
+    if name == "API_TOKEN":
+        # 兼容旧代码；走共享客户端的 Token 缓存，不再在导入时请求
+        from ai_client import get_shared_client
+        return get_shared_client().get_token()
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
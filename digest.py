@@ -0,0 +1,259 @@
+# digest.py
+# 日报合并：把当天 (或整月) 多份报告的 final JSON 写进同一个 Word —— 开头是目录，每份报告一节
+# 每写完一份就把它的段落 XML 序列化到临时文件并从内存中移除，最后再流式拼出 document.xml；
+# 内存占用与报告数量基本无关，月底 200 份的合集也是一次生成
+#
+#   python digest.py output/ --out digest.docx --title "WSH Daily 2026/10/18"   # batch_run.py --save-json 保存的 JSON
+#   python digest.py --from-cache --since 2026-10-18 --out digest.docx          # 结果缓存里当天的 Step 2 / 单次调用结果
+import os
+import sys
+import json
+import glob
+import shutil
+import zipfile
+import argparse
+import tempfile
+from io import BytesIO
+from datetime import datetime
+from lxml import etree
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from doc_generator import DocGenerator, new_styled_document
+
+FUND_FLOW_CATEGORY = "Weekly Fund Flow"
+DOCUMENT_PART = "word/document.xml"
+
+
+def guess_category(payload, default="Equity"):
+    """
+    从 header_info.category ("Wall Street Highlights-Equity") 推断报告类别
+    """
+    label = str((payload.get("header_info") or {}).get("category") or "")
+    if "fund flow" in label.lower():
+        return FUND_FLOW_CATEGORY
+    if "-" in label:
+        return label.rsplit("-", 1)[-1].strip() or default
+    return default
+
+
+def report_title(payload, index):
+    header = payload.get("header_info") or {}
+    return str(header.get("title") or header.get("Title") or f"Report {index}")
+
+
+def _run(text=None, bold=False):
+    r = OxmlElement("w:r")
+    if bold:
+        rPr = OxmlElement("w:rPr")
+        rPr.append(OxmlElement("w:b"))
+        r.append(rPr)
+    if text is not None:
+        t = OxmlElement("w:t")
+        t.text = text
+        t.set(qn("xml:space"), "preserve")
+        r.append(t)
+    return r
+
+
+def _field_char(kind):
+    r = OxmlElement("w:r")
+    fld = OxmlElement("w:fldChar")
+    fld.set(qn("w:fldCharType"), kind)
+    r.append(fld)
+    return r
+
+
+class DigestWriter:
+    """
+    用法:
+        with DigestWriter("digest.docx", title="WSH Daily 2026/10/18") as digest:
+            for category, payload in payloads:      # 可以是生成器，逐份读取
+                digest.add(payload, report_category=category)
+    合集只包含文字内容，不插图 (图片会让内存随报告数增长)
+    """
+    def __init__(self, output_path, title=None, report_category=None, page_break=True):
+        self.output_path = output_path
+        self.title = title
+        self.page_break = page_break
+        self.generator = DocGenerator()
+        self.doc = new_styled_document(report_category)
+        self.body = self.doc.element.body
+        self.heading_style_id = self.doc.styles["Heading 1"].style_id
+        self.entries = []  # 目录只需要 (书签名, 标题)
+        self._spool = tempfile.TemporaryFile()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._spool.close()
+
+    @property
+    def count(self):
+        return len(self.entries)
+
+    def add(self, payload, report_category=None):
+        """
+        追加一份报告 (一节：带书签的标题 + 与单份 Word 相同的内容)，写完立即移出内存
+        """
+        if not payload:
+            return
+        report_category = report_category or guess_category(payload)
+        index = self.count + 1
+        bookmark = f"_Digest{index:04d}"
+        title = report_title(payload, index)
+
+        heading = self.doc.add_paragraph()
+        heading._p.style = self.heading_style_id
+        if self.page_break and index > 1:
+            heading.paragraph_format.page_break_before = True
+        start = OxmlElement("w:bookmarkStart")
+        start.set(qn("w:id"), str(index))
+        start.set(qn("w:name"), bookmark)
+        end = OxmlElement("w:bookmarkEnd")
+        end.set(qn("w:id"), str(index))
+        heading._p.append(start)
+        heading._p.append(_run(title))
+        heading._p.append(end)
+
+        self.generator.write_report(self.doc, payload, report_category)
+        self.entries.append((bookmark, title))
+        self._flush()
+
+    def _flush(self):
+        # 段落序列化后从文档树中移除，只保留节属性 (sectPr)
+        for child in list(self.body):
+            if child.tag == qn("w:sectPr"):
+                continue
+            self._spool.write(etree.tostring(child, encoding="utf-8"))
+            self.body.remove(child)
+
+    def _write_toc(self):
+        """
+        标题 + 目录域 (TOC)：域结果预先填好各报告标题 (带跳转链接)，Word 打开时会提示更新为带页码的目录
+        """
+        if self.title:
+            self.doc.add_paragraph(self.title, style="Title")
+        self.doc.add_paragraph().add_run("目录 (Contents)").bold = True
+
+        begin = self.doc.add_paragraph()._p
+        begin.append(_field_char("begin"))
+        instr = OxmlElement("w:r")
+        instr_text = OxmlElement("w:instrText")
+        instr_text.set(qn("xml:space"), "preserve")
+        instr_text.text = ' TOC \\o "1-1" \\h \\z \\u '
+        instr.append(instr_text)
+        begin.append(instr)
+        begin.append(_field_char("separate"))
+        for i, (bookmark, title) in enumerate(self.entries, 1):
+            p = begin if i == 1 else self.doc.add_paragraph()._p
+            link = OxmlElement("w:hyperlink")
+            link.set(qn("w:anchor"), bookmark)
+            link.set(qn("w:history"), "1")
+            link.append(_run(f"{i}. {title}"))
+            p.append(link)
+        self.doc.add_paragraph()._p.append(_field_char("end"))
+
+        settings = self.doc.settings.element
+        update = OxmlElement("w:updateFields")
+        update.set(qn("w:val"), "true")
+        settings.append(update)
+
+    def close(self):
+        """
+        写出最终的 .docx：模板里除 document.xml 之外的部分原样复制，document.xml 按 目录 + 临时文件 + sectPr 流式拼接
+        """
+        self._write_toc()
+        skeleton = BytesIO()
+        self.doc.save(skeleton)
+        with zipfile.ZipFile(skeleton) as source:
+            document_xml = source.read(DOCUMENT_PART)
+            split = document_xml.rindex(b"<w:sectPr")
+            head, tail = document_xml[:split], document_xml[split:]
+            with zipfile.ZipFile(self.output_path, "w", zipfile.ZIP_DEFLATED) as target:
+                for info in source.infolist():
+                    if info.filename != DOCUMENT_PART:
+                        target.writestr(info, source.read(info.filename))
+                        continue
+                    with target.open(DOCUMENT_PART, "w", force_zip64=True) as out:
+                        out.write(head)
+                        self._spool.seek(0)
+                        shutil.copyfileobj(self._spool, out, 1024 * 1024)
+                        out.write(tail)
+        self._spool.close()
+        return self.output_path
+
+
+# ================= 数据来源 =================
+
+def iter_json_files(paths):
+    """
+    逐个读取 batch_run.py --save-json 保存的 JSON，返回 (类别, final_json)
+    """
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if "final_json" in data:
+            yield data.get("category") or guess_category(data["final_json"]), data["final_json"]
+        else:
+            yield guess_category(data), data
+
+
+def iter_cached(since=None, stages=("step2", "fused")):
+    """
+    逐条读取结果缓存里 since 之后的 Step 2 / 单次调用结果；同一份 PDF 只取最新的一条
+    缓存里是后处理之前的原始结果，这里做与生成单份 Word 相同的后处理 (资金流字段过滤、日期)
+    """
+    from result_cache import ResultCache
+    from pipeline import finalize_report_json
+    for created, _, category, payload in ResultCache().iter_values(stages, since=since, latest_per_source=True):
+        if isinstance(payload, dict) and payload.get("header_info"):
+            payload.pop("meta", None)
+            category = category or guess_category(payload)
+            yield category, finalize_report_json(payload, category, date=datetime.fromtimestamp(created))
+
+
+def write_digest(items, output_path, title=None, categories=None):
+    """
+    items 为 (类别, final_json) 的可迭代对象；categories 非空时只收录这些类别。返回收录的报告数
+    """
+    with DigestWriter(output_path, title=title) as digest:
+        for category, payload in items:
+            if categories and category not in categories:
+                continue
+            digest.add(payload, report_category=category)
+        return digest.count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把多份报告合并成一个带目录的 Word 日报")
+    parser.add_argument("input_dir", nargs="?", help="batch_run.py --save-json 的输出目录")
+    parser.add_argument("--from-cache", action="store_true", help="从结果缓存读取 (配合 --since)")
+    parser.add_argument("--since", help="只收录该日期之后的结果，格式 YYYY-MM-DD (默认今天)")
+    parser.add_argument("--categories", nargs="+", help="只收录这些类别 (默认全部)")
+    parser.add_argument("--title", help="合集标题 (默认 Wall Street Highlights Digest + 日期)")
+    parser.add_argument("--out", default="digest.docx")
+    args = parser.parse_args(argv)
+
+    if args.from_cache:
+        since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else datetime.now().replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        items = iter_cached(since.timestamp())
+    elif args.input_dir:
+        paths = sorted(p for p in glob.glob(os.path.join(args.input_dir, "*.json"))
+                       if os.path.basename(p) != "batch_summary.json")
+        items = iter_json_files(paths)
+    else:
+        parser.error("请指定 JSON 所在目录或 --from-cache")
+
+    title = args.title or f"Wall Street Highlights Digest {datetime.now().strftime('%Y/%m/%d')}"
+    count = write_digest(items, args.out, title=title, categories=args.categories)
+    print(f"📚 已合并 {count} 份报告: {args.out}")
+    return 0 if count else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,63 +1,195 @@
+import io
 import re
 import os
+import threading
 from docx import Document
 from docx.shared import Pt, RGBColor, Inches 
+from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
+from docx.enum.style import WD_STYLE_TYPE
+import config
 
 # 指定红色 (RGB: 192, 0, 0)
 CUSTOM_RED = RGBColor(192, 0, 0) 
+BLACK = RGBColor(0, 0, 0)
 
-class DocGenerator:
-    def create_styled_doc(self, json_data, output_path="Output.docx", img_path=None, report_category=None):
-        if not json_data:
-            print("❌ 数据为空，无法生成")
-            return
+# 标红重点句的分词：**...** 为重点，其余为普通文字 (预编译，避免每段重新解析)
+HIGHLIGHT_RE = re.compile(r'(\*\*.*?\*\*)')
 
-        doc = Document()
+# 模板中的命名段落样式 (两端对齐 / 左对齐)；每个模板都带两种版式的样式，
+# 日报合集 (digest.py) 里资金流的一节也能用自己的 14 号字和段距
+BODY_STYLE = "Report Body"
+BODY_LEFT_STYLE = "Report Body Left"
+FUND_FLOW_BODY_STYLE = "Fund Flow Body"
+FUND_FLOW_BODY_LEFT_STYLE = "Fund Flow Body Left"
 
-        # --- 基础字体设置 ---
-        style = doc.styles['Normal']
-        style.font.name = 'DengXian'
-        style.element.rPr.rFonts.set(qn('w:eastAsia'), '等线 (中文正文)') 
-        
-        # 🔥 根据截图要求：如果是 Weekly Fund Flow，字号设为 14 
-        if report_category == "Weekly Fund Flow":
-            style.font.size = Pt(14)
-        else:
-            style.font.size = Pt(11)
+# 每种版式只构建一次模板，之后直接从字节克隆
+_TEMPLATE_BYTES = {}
+_TEMPLATE_LOCK = threading.Lock()
 
-        # --- 辅助函数：段落排版 (根据截图优化) ---
-        def apply_paragraph_style(paragraph, align_justify=True):
-            pf = paragraph.paragraph_format
-            pf.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY if align_justify else WD_ALIGN_PARAGRAPH.LEFT
-            
-            # 🔥 匹配截图设置:
-            if report_category == "Weekly Fund Flow":
+
+def _template_kind(report_category):
+    return "fund_flow" if report_category == "Weekly Fund Flow" else "wsh"
+
+
+def body_style_names(report_category):
+    """
+    该类别正文使用的 (两端对齐, 左对齐) 样式名
+    """
+    if _template_kind(report_category) == "fund_flow":
+        return FUND_FLOW_BODY_STYLE, FUND_FLOW_BODY_LEFT_STYLE
+    return BODY_STYLE, BODY_LEFT_STYLE
+
+
+def _build_template(kind):
+    """
+    构建带样式的空白模板：Normal 字体 + 两个命名段落样式 (段前段后、行距已按截图设置)
+    """
+    doc = Document()
+
+    # --- 基础字体设置 ---
+    style = doc.styles['Normal']
+    style.font.name = 'DengXian'
+    style.element.rPr.rFonts.set(qn('w:eastAsia'), '等线 (中文正文)') 
+    
+    # 🔥 根据截图要求：如果是 Weekly Fund Flow，字号设为 14 
+    if kind == "fund_flow":
+        style.font.size = Pt(14)
+    else:
+        style.font.size = Pt(11)
+
+    # --- 段落排版 (根据截图优化) ---
+    for body_kind in ("wsh", "fund_flow"):
+        justify_name, left_name = body_style_names("Weekly Fund Flow" if body_kind == "fund_flow" else None)
+        for name, alignment in ((justify_name, WD_ALIGN_PARAGRAPH.JUSTIFY), (left_name, WD_ALIGN_PARAGRAPH.LEFT)):
+            body = doc.styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+            body.base_style = style
+            pf = body.paragraph_format
+            pf.alignment = alignment
+
+            # 🔥 匹配截图设置 (字号写在样式上，不依赖 Normal)：
+            if body_kind == "fund_flow":
+                body.font.size = Pt(14)
                 pf.space_before = Pt(0)   # 段前: 0 磅
                 pf.space_after = Pt(8)    # 段后: 8 磅
                 pf.line_spacing = 1.08    # 设置值: 1.08
             else:
+                body.font.size = Pt(11)
                 pf.space_before = Pt(12)
                 pf.space_after = Pt(0)
                 pf.line_spacing = 1.07
-                
+
             pf.line_spacing_rule = WD_LINE_SPACING.MULTIPLE # 多倍行距
 
-        # --- 核心函数：标红重点句 ---
-        def add_paragraph_with_highlight(document, text):
-            p = document.add_paragraph()
-            apply_paragraph_style(p)
-            segments = re.split(r'(\*\*.*?\*\*)', str(text))
-            for seg in segments:
-                if not seg: continue
-                if seg.startswith('**') and seg.endswith('**'):
-                    clean_text = seg[2:-2]
-                    run = p.add_run(clean_text)
-                    run.font.color.rgb = CUSTOM_RED
-                else:
-                    run = p.add_run(seg)
-                    run.font.color.rgb = RGBColor(0, 0, 0)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def new_styled_document(report_category=None):
+    """
+    从缓存的模板克隆一个新文档 (第一次调用时构建模板)
+    """
+    kind = _template_kind(report_category)
+    template = _TEMPLATE_BYTES.get(kind)
+    if template is None:
+        with _TEMPLATE_LOCK:
+            template = _TEMPLATE_BYTES.get(kind)
+            if template is None:
+                template = _TEMPLATE_BYTES[kind] = _build_template(kind)
+    return Document(io.BytesIO(template))
+
+
+def _append_colored_run(paragraph, text, color):
+    """
+    直接拼 <w:r><w:rPr><w:color/></w:rPr><w:t/></w:r>：
+    python-docx 的 add_run 会逐字符处理文本，长正文时是主要耗时
+    """
+    if any(c in text for c in "\t\n\r"):
+        # 含制表符/换行时交给 python-docx 转换成 <w:tab/> / <w:br/>
+        paragraph.add_run(text).font.color.rgb = color
+        return
+    r = OxmlElement('w:r')
+    rPr = OxmlElement('w:rPr')
+    color_el = OxmlElement('w:color')
+    color_el.set(qn('w:val'), str(color))
+    rPr.append(color_el)
+    r.append(rPr)
+    t = OxmlElement('w:t')
+    t.text = text
+    if text != text.strip():
+        t.set(qn('xml:space'), 'preserve')
+    r.append(t)
+    paragraph._p.append(r)
+
+
+def add_highlighted_runs(paragraph, text):
+    """
+    按 **...** 分词：重点句标红，其余为黑色
+    """
+    for seg in HIGHLIGHT_RE.split(str(text)):
+        if not seg: continue
+        if seg.startswith('**') and seg.endswith('**') and len(seg) >= 4:
+            _append_colored_run(paragraph, seg[2:-2], CUSTOM_RED)
+        else:
+            _append_colored_run(paragraph, seg, BLACK)
+
+
+class DocGenerator:
+    def render_bytes(self, json_data, img_path=None, report_category=None, images=None):
+        """
+        直接在内存里生成 Word，返回 .docx 字节 (不写临时文件)
+        """
+        buffer = io.BytesIO()
+        if self.create_styled_doc(json_data, buffer, img_path=img_path, report_category=report_category,
+                                  images=images) is None:
+            return None
+        return buffer.getvalue()
+
+    def create_styled_doc(self, json_data, output_path="Output.docx", img_path=None, report_category=None,
+                          images=None):
+        """
+        output_path 可以是文件路径或可写的文件对象 (如 io.BytesIO)
+        img_path 可以是图片路径、图片字节 (bytes) 或文件对象 (如 Streamlit 上传的图片)
+        images 为图片列表 (每项同 img_path)，依次插在正文之后；同时给出 img_path 时它排在最前面
+        成功时返回 output_path
+        """
+        if not json_data:
+            print("❌ 数据为空，无法生成")
+            return
+
+        # 样式 (字体、段距、行距) 都在模板里，段落只需引用样式 ID
+        doc = new_styled_document(report_category)
+        self.write_report(doc, json_data, report_category)
+
+        # --- 3. 插入图片 ---
+        for img in [img_path] + list(images or []):
+            image = self._open_image(img)
+            if image is None:
+                continue
+            img_p = doc.add_paragraph()
+            img_p.alignment = WD_ALIGN_PARAGRAPH.CENTER 
+            img_p.paragraph_format.space_before = Pt(24) 
+            run = img_p.add_run()
+            run.add_picture(image, width=Inches(config.DOCX_IMAGE_WIDTH_IN))
+
+        doc.save(output_path)
+        return output_path
+
+    def write_report(self, doc, json_data, report_category=None):
+        """
+        把一份报告的页眉信息、正文、页脚追加到 doc 末尾 (单份 Word 与日报合并 digest.py 共用)
+        """
+        # 按名称查样式每次都要遍历整个样式表，这里只查一次，之后直接写 pStyle
+        justify_name, left_name = body_style_names(report_category)
+        body_style_id = doc.styles[justify_name].style_id
+        left_style_id = doc.styles[left_name].style_id
+
+        def add_paragraph(text=None, align_justify=True):
+            p = doc.add_paragraph(text)
+            p._p.style = body_style_id if align_justify else left_style_id
+            return p
 
         # --- 1. 顶部信息 (Header) ---
         header = json_data.get("header_info", {})
@@ -87,8 +219,7 @@ class DocGenerator:
             
             # Weekly Fund Flow 模式强制显示所有标签 
             if report_category == "Weekly Fund Flow":
-                p = doc.add_paragraph()
-                apply_paragraph_style(p)
+                p = add_paragraph()
                 run = p.add_run(f"#{label}# ")
                 run.font.bold = False
                 if val:
@@ -97,8 +228,7 @@ class DocGenerator:
                    # --- 2. 正文 (Content) ---
             
             elif val:
-                p = doc.add_paragraph()
-                apply_paragraph_style(p, align_justify=True)
+                p = add_paragraph(align_justify=True)
                 # 标签部分
                 run = p.add_run(f"#{label}# ")
                 run.font.bold = True
@@ -107,8 +237,7 @@ class DocGenerator:
                 run_val.font.bold = True # Header部分全部加粗
                    # --- 2. 正文 (Content) ---
 
-        p = doc.add_paragraph()
-        apply_paragraph_style(p)
+        p = add_paragraph()
         
         if report_category == "Weekly Fund Flow":      
             run = p.add_run("#Content#")
@@ -120,8 +249,7 @@ class DocGenerator:
             run.font.bold = True
             
             # 2. 创建一个新段落，实现“下一行”的效果
-            p_next = doc.add_paragraph()
-            apply_paragraph_style(p_next)
+            p_next = add_paragraph()
             # 写入 Wall Street Highlights 内容
             run_highlight = p_next.add_run(f"Wall Street Highlights-{report_category}")
             run_highlight.font.bold = True
@@ -131,7 +259,7 @@ class DocGenerator:
 
         for paragraph_text in body_list:
             if paragraph_text.strip():
-                add_paragraph_with_highlight(doc, paragraph_text)
+                add_highlighted_runs(add_paragraph(), paragraph_text)
                     
         
         if report_category != "Weekly Fund Flow":
@@ -145,21 +273,28 @@ class DocGenerator:
                 ]
                 for label, val in footer_items:
                     if val:
-                        p = doc.add_paragraph(f"{label}: {val}")
-                        apply_paragraph_style(p, align_justify=False)
+                        p = add_paragraph(f"{label}: {val}", align_justify=False)
                         for run in p.runs:
                             run.font.bold = True
                             run.font.color.rgb = CUSTOM_RED # 🔴 底部也用同一个红色
 
-        # --- 3. 插入图片 ---
-        if img_path and os.path.exists(img_path):
-            img_p = doc.add_paragraph()
-            img_p.alignment = WD_ALIGN_PARAGRAPH.CENTER 
-            img_p.paragraph_format.space_before = Pt(24) 
-            run = img_p.add_run()
-            run.add_picture(img_path, width=Inches(6.0))
-
-        doc.save(output_path)
+    @staticmethod
+    def _open_image(img):
+        # 路径 / bytes / 文件对象 统一读成字节，超过打印宽度的图片缩小压缩后再交给 add_picture
+        if not img:
+            return None
+        if isinstance(img, (bytes, bytearray, memoryview)):
+            data = bytes(img)
+        elif hasattr(img, "read"):
+            if hasattr(img, "seek"): img.seek(0)
+            data = img.read()
+        elif os.path.exists(img):
+            with open(img, "rb") as f:
+                data = f.read()
+        else:
+            return None
+        from figures import fit_image
+        return io.BytesIO(fit_image(data))
 
 
 
@@ -0,0 +1,168 @@
+# figures.py
+# 从 PDF 里自动找出图表 / 封面图，按 Word 的打印宽度渲染并压缩，省去用户手动截图上传
+# 检测 + 渲染都在 pdf_extract 的进程池里按页并发执行 (pdfium 不是线程安全的)；结果按 (PDF 哈希, 页码) 缓存
+import io
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import config
+import metrics
+from result_cache import sha256_hex
+# 共用 pdf_extract 的进程池和按页缓存的实现
+from pdf_extract import PageCache, _get_pool, _pool_size, _split_batches, count_pages
+
+figure_cache = PageCache(config.FIGURE_CACHE_MAX_PAGES)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def target_width_px():
+    return int(config.DOCX_IMAGE_WIDTH_IN * config.DOCX_IMAGE_DPI)
+
+
+def encode_image(image, quality=None):
+    """
+    PIL 图片 -> 字节：有透明通道的保存为 PNG，其余保存为 JPEG
+    """
+    buffer = io.BytesIO()
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(buffer, format="JPEG", quality=quality or config.DOCX_IMAGE_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def fit_image(data, max_width_px=None):
+    """
+    超过打印宽度对应像素的图片缩小并重新压缩 (不放大)；重新压缩反而更大时保留原图
+    """
+    from PIL import Image  # 延迟导入：只有生成带图片的 Word 时才需要
+
+    max_width_px = max_width_px or target_width_px()
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception:
+        return data  # 无法识别的格式交给 python-docx 处理 (与以前一致)
+    if image.width <= max_width_px:
+        return data  # 不超过打印宽度：保持原样 (截图里的文字不被 JPEG 压糊)
+    height = max(1, round(image.height * max_width_px / image.width))
+    encoded = encode_image(image.resize((max_width_px, height), Image.LANCZOS))
+    return encoded if len(encoded) < len(data) else data
+
+
+def _vector_bbox(page):
+    # 矢量图表：曲线 + 填充矩形 (柱状图的柱子)；表格通常只有线条，不计入
+    objects = list(page.curves) + [r for r in page.rects if r.get("fill")]
+    if len(objects) < config.FIGURE_MIN_VECTOR_OBJECTS:
+        return None
+    x0, top = min(o["x0"] for o in objects), min(o["top"] for o in objects)
+    x1, bottom = max(o["x1"] for o in objects), max(o["bottom"] for o in objects)
+    # 把紧挨着图形的线条 (坐标轴、网格线) 也框进来
+    for line in page.lines:
+        if line["x0"] <= x1 + 12 and line["x1"] >= x0 - 12 and line["top"] <= bottom + 12 and line["bottom"] >= top - 12:
+            x0, top = min(x0, line["x0"]), min(top, line["top"])
+            x1, bottom = max(x1, line["x1"]), max(bottom, line["bottom"])
+    return x0, top, x1, bottom
+
+
+def _candidates(page):
+    """
+    一页上的候选区域 [(面积占比, bbox, 类型)]，bbox 为 pdfplumber 坐标 (x0, top, x1, bottom)
+    """
+    page_area = float(page.width * page.height) or 1.0
+    boxes = [((img["x0"], img["top"], img["x1"], img["bottom"]), "image") for img in page.images]
+    vector = _vector_bbox(page)
+    if vector:
+        boxes.append((vector, "chart"))
+    found = []
+    for (x0, top, x1, bottom), kind in boxes:
+        # 留一点边距，并裁到页面范围内
+        x0, top = max(0, x0 - 4), max(0, top - 4)
+        x1, bottom = min(page.width, x1 + 4), min(page.height, bottom + 4)
+        ratio = (x1 - x0) * (bottom - top) / page_area
+        if ratio >= config.FIGURE_MIN_AREA_RATIO:
+            found.append((ratio, (x0, top, x1, bottom), kind))
+    return found
+
+
+def _figures_on_pages(pdf_bytes, page_numbers, width_px):
+    """
+    进程池里执行：检测并渲染指定页上的图表，返回 {页码: [{"page", "kind", "area", "image"}]}
+    """
+    import pdfplumber
+
+    results = {}
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for i in page_numbers:
+            page = pdf.pages[i]
+            figures = []
+            for ratio, bbox, kind in _candidates(page):
+                rendered = page.crop(bbox).to_image(width=width_px, antialias=True).original
+                figures.append({"page": i, "kind": kind, "area": round(ratio, 4), "image": encode_image(rendered)})
+            results[i] = figures
+    return results
+
+
+def find_figures(pdf_bytes, max_pages=None, parallel=None):
+    """
+    返回前 max_pages 页的全部候选图表 (按页码顺序)，每项包含渲染好的图片字节
+    """
+    pdf_hash = sha256_hex(pdf_bytes)
+    page_count = min(count_pages(pdf_bytes), max_pages or config.FIGURE_SCAN_PAGES)
+    found = figure_cache.get_many(pdf_hash, page_count)
+    missing = [i for i in range(page_count) if i not in found]
+
+    if missing:
+        width_px = target_width_px()
+        if parallel is None:
+            parallel = len(missing) > 1
+        if parallel:
+            pool = _get_pool()
+            futures = [pool.submit(_figures_on_pages, pdf_bytes, batch, width_px)
+                       for batch in _split_batches(missing, _pool_size())]
+            fresh = {}
+            for future in futures:
+                fresh.update(future.result())
+        else:
+            fresh = _figures_on_pages(pdf_bytes, missing, width_px)
+        figure_cache.put_many(pdf_hash, fresh)
+        found.update(fresh)
+
+    return [figure for i in range(page_count) for figure in found[i]]
+
+
+def extract_figures(pdf_bytes, max_images=None):
+    """
+    选出面积最大的 max_images 张图 (按页码排列)，返回图片字节列表；任何失败都只打印警告，返回空列表
+    """
+    max_images = config.FIGURE_MAX_IMAGES if max_images is None else max_images
+    with metrics.stage("figures") as info:
+        try:
+            candidates = find_figures(pdf_bytes)
+        except Exception as e:
+            print(f"⚠️ 图表提取失败: {e}")
+            info["error"] = str(e)
+            return []
+        chosen = sorted(candidates, key=lambda f: f["area"], reverse=True)[:max_images]
+        chosen.sort(key=lambda f: f["page"])
+        info["candidates"] = len(candidates)
+        info["images"] = len(chosen)
+        info["bytes"] = sum(len(f["image"]) for f in chosen)
+    return [f["image"] for f in chosen]
+
+
+def extract_figures_async(pdf_bytes, max_images=None):
+    """
+    在后台线程里提取 (与 AI 阶段同时进行)，返回 Future；指标仍记在当前报告下
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="figures")
+    context = contextvars.copy_context()
+    return _executor.submit(context.run, extract_figures, pdf_bytes, max_images)
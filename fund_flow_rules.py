@@ -0,0 +1,221 @@
+# fund_flow_rules.py
+# 资金流周报 (Weekly Fund Flow) Step 1 的规则提取：周报版面非常固定 ——「WEEKLY FUND FLOWS」之后一行是标题，
+# 正文第一段以项目符号 "n" (Wingdings 的黑点) 开头，描述共同基金整体情况，后面几段是股票 / 固定收益 / 外汇的资金流。
+# 按 pdfplumber 的单词版面 (行位置、字号) 在本地提取，输出与 AI Step 1 相同的 JSON；
+# 任何一项置信度检查不通过都返回失败原因，由 pipeline 回退到 AI Step 1
+import io
+import re
+import statistics
+import config
+
+# 机构全名 (与 AI Step 1 输出的写法一致) 及其在版面中的识别关键字 (大写)
+INSTITUTIONS = (
+    ("J.P. Morgan", ("J.P. MORGAN", "JPMORGAN")),
+    ("Goldman Sachs", ("GOLDMAN SACHS",)),
+    ("Morgan Stanley", ("MORGAN STANLEY",)),
+    ("Deutsche Bank", ("DEUTSCHE BANK",)),
+    ("CITIC Securities", ("CITIC SECURITIES", "CITICS")),
+    ("BofA Global Research", ("BOFA", "BANK OF AMERICA")),
+    ("UBS", ("UBS",)),
+    ("HSBC", ("HSBC",)),
+)
+
+_DATE_RE = re.compile(
+    r"^(?:\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}|\d{4}[/.-]\d{1,2}[/.-]\d{1,2}|"
+    r"(?:\d{1,2}\s+)?(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?(?:\s+\d{1,2},?)?\s+\d{4})$",
+    re.IGNORECASE,
+)
+_BODY_TOPIC_RE = re.compile(r"\b(?:equit|fixed income|bond|fx\b|cross-border|money market)", re.IGNORECASE)
+
+
+class Line:
+    def __init__(self, words, page_no):
+        self.words = [w["text"] for w in words]
+        self.text = " ".join(self.words)
+        self.size = round(statistics.median(w.get("size") or 0 for w in words), 1)
+        self.top = min(w["top"] for w in words)
+        self.bottom = max(w["bottom"] for w in words)
+        self.page_no = page_no
+        self.edge = False  # 在页面上下边距内 (页眉页脚)
+
+
+def read_lines(pdf_bytes, max_pages=None):
+    """
+    读取前 max_pages 页，按行返回 [Line]；页面上下边距内的行 (页眉页脚) 标记为 edge
+    """
+    import pdfplumber
+
+    max_pages = max_pages or config.FUND_FLOW_RULES_PAGES
+    lines = []
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for page_no, page in enumerate(pdf.pages[:max_pages]):
+            height = page.height
+            margin = height * config.FUND_FLOW_RULES_MARGIN_RATIO
+            words = page.extract_words(extra_attrs=["size"])
+            page.close()
+            words.sort(key=lambda w: (round(w["top"]), w["x0"]))
+            groups, current = [], []
+            for word in words:
+                # 同一行的单词 top 相差不超过 3pt (上下标、不同字体的基线略有差别)
+                if current and abs(word["top"] - current[0]["top"]) > 3:
+                    groups.append(current)
+                    current = []
+                current.append(word)
+            if current:
+                groups.append(current)
+            for group in groups:
+                line = Line(sorted(group, key=lambda w: w["x0"]), page_no)
+                line.edge = line.top < margin or line.bottom > height - margin
+                lines.append(line)
+    return lines
+
+
+def _join(lines):
+    # 拼接一段里的多行：行尾连字符断开的单词接回去
+    text = ""
+    for line in lines:
+        if text.endswith("-") and line.text[:1].islower():
+            text = text[:-1] + line.text
+        else:
+            text = f"{text} {line.text}" if text else line.text
+    return text.strip()
+
+
+def _is_bullet(line):
+    return (len(line.words) > 1 and line.words[0] in config.FUND_FLOW_BULLETS
+            and line.words[1][:1].isalnum() and not line.words[1][:1].islower())
+
+
+def _strip_bullet(text):
+    return text.split(" ", 1)[1] if " " in text else text
+
+
+def find_institution(lines):
+    for line in lines:
+        upper = line.text.upper()
+        for name, keys in INSTITUTIONS:
+            if any(re.search(rf"(?<![A-Z]){re.escape(key)}(?![A-Z])", upper) for key in keys):
+                return name
+    return None
+
+
+def find_title(lines, institution):
+    """
+    返回 (标题, 标题所在行号)：「WEEKLY FUND FLOWS」之后第一行描述性的英文短句；
+    标题折行时 (下一行字号相同且比正文大) 合并
+    """
+    marker = re.compile(config.FUND_FLOW_TITLE_MARKER)
+    start = next((i for i, line in enumerate(lines) if line.page_no == 0 and marker.search(line.text)), None)
+    if start is None:
+        return None, None
+    # 标题和标记在同一行 (如 "WEEKLY FUND FLOWS: Robust Bond Flows Year-to-Date")
+    rest = marker.split(lines[start].text, 1)[-1].strip(" :|-–—")
+    if len(rest.split()) >= 3:
+        return rest, start
+
+    body_size = statistics.median(line.size for line in lines) if lines else 0
+    for i in range(start + 1, min(len(lines), start + 1 + config.FUND_FLOW_TITLE_SEARCH_LINES)):
+        line = lines[i]
+        if _is_bullet(line):
+            break
+        text = line.text.strip()
+        if (not text or _DATE_RE.match(text) or "@" in text
+                or (institution and institution.upper() in text.upper())):
+            continue
+        parts, end = [line], i
+        while (end + 1 < len(lines) and line.size > body_size
+               and abs(lines[end + 1].size - line.size) < 0.3 and not _is_bullet(lines[end + 1])):
+            end += 1
+            parts.append(lines[end])
+        return _join(parts), end
+    return None, None
+
+
+def find_paragraphs(lines, start):
+    """
+    从 start 行之后找项目符号开头的段落：[[Line, ...], ...]；遇到图表标题、来源、免责声明时结束
+    一段延续到下一个项目符号、明显的空行间隔或字号变化为止
+    """
+    stop = re.compile(config.FUND_FLOW_BODY_STOP, re.IGNORECASE)
+    gaps = [b.top - a.top for a, b in zip(lines, lines[1:]) if a.page_no == b.page_no and b.top > a.top]
+    line_gap = statistics.median(gaps) if gaps else 0
+    paragraphs, current = [], None
+    for prev, line in zip([None] + lines[start + 1:], lines[start + 1:]):
+        if stop.match(line.text):
+            break
+        if _is_bullet(line):
+            current = [line]
+            paragraphs.append(current)
+            continue
+        if current is None:
+            continue
+        broken = (prev.page_no == line.page_no and line_gap and line.top - prev.top > line_gap * 1.8) \
+            or abs(line.size - current[0].size) >= 0.5
+        if broken:
+            current = None
+        else:
+            current.append(line)
+    return paragraphs
+
+
+def check(data, text):
+    """
+    置信度检查：返回问题列表 (空列表表示可以直接使用)
+    """
+    from pdf_backends import garbled_ratio
+
+    meta, raw = data["meta"], data["raw_content"]
+    problems = []
+    if not meta["institution"]:
+        problems.append("未识别到机构名称")
+    title = meta["title_en"] or ""
+    words = title.split()
+    if not title:
+        problems.append(f"没有找到「{config.FUND_FLOW_TITLE_MARKER}」之后的标题")
+    elif not 2 <= len(words) <= 25 or title.isupper() or not re.search(r"[A-Za-z]{3}", title):
+        problems.append(f"标题不像描述性短句: {title[:60]!r}")
+    summary = raw["summary_text"]
+    if len(summary) < config.FUND_FLOW_MIN_SUMMARY_CHARS:
+        problems.append(f"摘要过短 ({len(summary)} 字符)")
+    elif not re.search(r"\bfund|\bflow", summary, re.IGNORECASE):
+        problems.append("摘要没有提到基金 / 资金流")
+    body = raw["body_text"]
+    if not body:
+        problems.append("没有找到正文段落")
+    elif not _BODY_TOPIC_RE.search(body) or not re.search(r"\d", body):
+        problems.append("正文没有股票 / 固定收益 / 外汇的资金流数据")
+    ratio = garbled_ratio(text)
+    if ratio is not None and ratio > config.PDF_TEXT_MAX_GARBLED_RATIO:
+        problems.append(f"乱码比例过高 ({ratio:.1%})")
+    return problems
+
+
+def extract_step1(pdf_bytes):
+    """
+    返回 (Step 1 JSON, 问题列表)；问题列表非空时 JSON 为 None，应回退到 AI
+    """
+    try:
+        lines = read_lines(pdf_bytes)
+    except Exception as e:
+        return None, [f"版面读取失败: {e}"]
+    if not lines:
+        return None, ["前几页没有文字"]
+
+    institution = find_institution([line for line in lines if line.page_no == 0])
+    lines = [line for line in lines if not line.edge]
+    title, title_end = find_title(lines, institution)
+    paragraphs = find_paragraphs(lines, title_end if title_end is not None else -1)
+    texts = [_strip_bullet(_join(paragraph)) for paragraph in paragraphs]
+    body, size = [], 0
+    for text in texts[1:]:
+        if size + len(text) > config.FUND_FLOW_MAX_BODY_CHARS:
+            break
+        body.append(text)
+        size += len(text)
+
+    data = {
+        "meta": {"institution": institution or "", "title_en": title or ""},
+        "raw_content": {"summary_text": texts[0] if texts else "", "body_text": "\n".join(body)},
+    }
+    problems = check(data, "\n".join(line.text for line in lines))
+    return (None, problems) if problems else (data, [])
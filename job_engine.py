@@ -0,0 +1,504 @@
+# job_engine.py
+# 基于 asyncio 的 AI 任务引擎：一个事件循环里同时提交、轮询成百上千个任务
+# 不再是「一个任务占一个线程 + time.sleep(2) × 60」
+import os
+import time
+import asyncio
+import hashlib
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import config
+import metrics
+from ai_client import get_shared_client
+from scheduler import get_shared_scheduler, priority_lane, retry_after_seconds, SchedulerTimeout, THROTTLE_STATUS
+
+# 当前报告的任务日志 (由 report_queue 设置)：提交后立刻记下后端 job_id，
+# 进程重启后重新执行同一个 Prompt 时直接恢复轮询，而不是重复提交
+# (lookup / record 是阻塞的 SQLite 调用，可能等写锁，在线程池里执行，别卡住共享的事件循环)
+job_journal = contextvars.ContextVar("job_journal", default=None)
+
+# 当前报告的截止时间 (time.monotonic())，由 pipeline.build_report 按类别预算设置：
+# 任何 AI 任务的等待都不会超过它，预算用完后也不再提交新任务 (重试、重排格式)
+report_deadline = contextvars.ContextVar("report_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """
+    在 with 块内限定所有 AI 任务的总时长；嵌套时取更早的截止时间
+    """
+    deadline = time.monotonic() + seconds
+    outer = report_deadline.get()
+    token = report_deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        report_deadline.reset(token)
+
+
+def remaining_budget():
+    deadline = report_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class HedgeController:
+    """
+    对冲请求的决策 (进程内共享)：
+    - 按 Prompt 类型记录最近成功任务的耗时，超过 AI_HEDGE_PERCENTILE 分位仍未完成才对冲
+    - 令牌桶限制对冲数量：每个普通任务积攒 AI_HEDGE_MAX_RATIO 个令牌，每次对冲花 1 个，
+      后端整体变慢时不会把负载翻倍
+    """
+    def __init__(self, window=200, burst=10.0):
+        self.lock = threading.Lock()
+        self.window = window
+        self.burst = burst
+        self.samples = {}
+        self.tokens = 0.0
+
+    @staticmethod
+    def key(system_prompt):
+        # 分块任务只在 system_prompt 后面追加说明，同一阶段的任务共用一组样本
+        return hashlib.sha256(system_prompt[:500].encode("utf-8")).hexdigest()[:16]
+
+    def record(self, key, elapsed):
+        with self.lock:
+            self.samples.setdefault(key, deque(maxlen=self.window)).append(elapsed)
+
+    def delay(self, key):
+        with self.lock:
+            samples = list(self.samples.get(key, ()))
+        if len(samples) < config.AI_HEDGE_MIN_SAMPLES:
+            return config.AI_HEDGE_DEFAULT_DELAY
+        return max(config.AI_HEDGE_MIN_DELAY, metrics.percentile(samples, config.AI_HEDGE_PERCENTILE))
+
+    def on_submit(self):
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + config.AI_HEDGE_MAX_RATIO)
+
+    def try_acquire(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+hedging = HedgeController()
+
+
+@dataclass
+class PollPolicy:
+    """
+    自适应轮询：第一次检查很快，之后按 backoff 倍数放慢，最长 max_interval，总时长不超过 deadline
+    """
+    initial_delay: float = config.AI_POLL_INITIAL_DELAY
+    max_interval: float = config.AI_POLL_MAX_INTERVAL
+    backoff: float = config.AI_POLL_BACKOFF
+    deadline: float = config.AI_JOB_DEADLINE
+
+    def intervals(self):
+        delay = self.initial_delay
+        while True:
+            yield delay
+            delay = min(delay * self.backoff, self.max_interval)
+
+
+@dataclass
+class JobResult:
+    """
+    单个 AI 任务的结构化结果：ok=False 时 error 说明失败原因 (不再只是 None)
+    """
+    ok: bool
+    data: object = None        # 经 parser 解析后的 JSON
+    output: object = None      # 后端原始 output/result
+    error: str = None
+    job_id: str = None
+    polls: int = 0
+    elapsed: float = 0.0
+    extra: dict = field(default_factory=dict)
+
+
+class JobError(Exception):
+    pass
+
+
+QUEUE_BUDGET_ERROR = "超出报告时间预算 (排队等待提交)"
+
+# 共享事件循环里 httpx 连接池的大小 (在途任务数由调度器的 AI_MAX_IN_FLIGHT 限制)
+HTTP_MAX_CONNECTIONS = 100
+
+
+def _new_http_client(max_connections):
+    import httpx  # 延迟导入 (约 70ms)：只导入 pipeline 的工具、启动阶段都不需要
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(30.0))
+
+
+class BackgroundLoop:
+    """
+    进程内共享的事件循环线程：同步调用 (Streamlit、批量线程池、队列 worker) 的 AI 任务都在这里执行，
+    共用一个 httpx.AsyncClient，提交与轮询复用同一批 keep-alive 连接，不再每个任务重新握手
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.http = None  # 第一次在事件循环里使用时创建
+        self.thread = threading.Thread(target=self.loop.run_forever, name="ai-job-loop", daemon=True)
+        self.thread.start()
+
+
+_background = None
+_background_lock = threading.Lock()
+
+
+def get_background_loop():
+    global _background
+    if _background is None:
+        with _background_lock:
+            if _background is None:
+                _background = BackgroundLoop()
+    return _background
+
+
+def _reset_background():
+    # fork 出来的子进程里没有这个线程，第一次使用时重新创建
+    global _background
+    _background = None
+
+
+os.register_at_fork(after_in_child=_reset_background)
+
+
+class JobEngine:
+    """
+    用法:
+        async with JobEngine(parser=clean_json) as engine:
+            results = await engine.run_many([(prompt_1, text_1), (prompt_2, text_2)])
+    """
+    def __init__(self, client=None, parser=None, policy=None, max_connections=HTTP_MAX_CONNECTIONS, hedge=None,
+                 scheduler=None):
+        self.client = client or get_shared_client()
+        self.scheduler = scheduler or get_shared_scheduler()
+        self.parser = parser
+        self.policy = policy or PollPolicy()
+        self.hedge = config.AI_HEDGE_ENABLED if hedge is None else hedge
+        self.max_connections = max_connections
+        self._http = None
+        self._owns_http = False
+        self._errors = (JobError,)
+
+    async def __aenter__(self):
+        import httpx
+        self._errors = (httpx.HTTPError, JobError)  # 可重试 / 可转成 JobResult 的异常
+        background = _background
+        if background is not None and asyncio.get_running_loop() is background.loop:
+            # 共享事件循环：复用它的连接池 (只在这个线程里访问，不需要加锁)
+            if background.http is None:
+                background.http = _new_http_client(HTTP_MAX_CONNECTIONS)
+            self._http, self._owns_http = background.http, False
+        else:
+            self._http, self._owns_http = _new_http_client(self.max_connections), True
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._owns_http:
+            await self._http.aclose()
+        self._http = None
+
+    # ================= HTTP =================
+
+    async def _token(self):
+        # 大部分时候直接命中缓存；过期时在线程里刷新，不阻塞事件循环
+        return self.client.peek_token() or await asyncio.to_thread(self.client.get_token)
+
+    async def _request(self, method, url, **kwargs):
+        for attempt in range(2):
+            token = await self._token()
+            if not token:
+                raise JobError("Token 获取失败")
+            headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+            resp = await self._http.request(method, url, headers=headers, **kwargs)
+            if resp.status_code != 401 or attempt == 1:
+                return resp
+            self.client.invalidate_token(token)
+        return resp
+
+    async def submit(self, prompt, retries=None):
+        """
+        提交任务，返回后端 job_id；metadata.priority 取当前优先级通道的值
+        第一次提交的令牌由调用方向调度器申请；后端返回 429 / 5xx 时通知调度器退避，
+        重新排队拿到令牌后重试，最多 retries 次 (默认 config.AI_SUBMIT_RETRIES)
+        """
+        url = f"{self.client.api_base_url}/job"
+        scheduler = self.scheduler
+        lane = priority_lane.get()
+        payload = self.client.build_job_payload(prompt, priority=scheduler.priority(lane) if scheduler else None)
+        if scheduler is None:
+            retries = 0
+        elif retries is None:
+            retries = config.AI_SUBMIT_RETRIES
+        for attempt in range(retries + 1):
+            if attempt:
+                try:
+                    await scheduler.acquire(lane, need_slot=False, deadline=report_deadline.get())
+                except SchedulerTimeout:
+                    raise JobError(QUEUE_BUDGET_ERROR)
+            resp = await self._request("POST", url, json=payload)
+            if scheduler is None or resp.status_code not in THROTTLE_STATUS:
+                break
+            scheduler.on_throttle(resp.status_code, retry_after_seconds(resp))
+        if resp.status_code != 200:
+            raise JobError(f"提交失败 (HTTP {resp.status_code}): {resp.text[:200]}")
+        if scheduler is not None:
+            scheduler.on_success()
+        try:
+            body = resp.json()
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            # 网关错误页、被截断的响应等：按提交失败处理
+            raise JobError(f"提交返回的不是 JSON 对象: {resp.text[:200]}")
+        job_id = body.get("id") or body.get("uuid")
+        if not job_id:
+            raise JobError(f"提交成功但没有返回任务 ID: {str(body)[:200]}")
+        return job_id
+
+    async def cancel(self, job_id):
+        """
+        尽力取消后端任务 (config.AI_JOB_CANCEL_METHOD 未设置时什么都不做)，返回是否成功
+        """
+        method = config.AI_JOB_CANCEL_METHOD
+        if not method or not job_id:
+            return False
+        try:
+            resp = await self._request(method, f"{self.client.api_base_url}/job/JOB_ID/{job_id}")
+        except self._errors:
+            return False
+        cancelled = resp.status_code in (200, 202, 204)
+        if cancelled:
+            metrics.registry.count("ai_jobs_cancelled_total")
+        return cancelled
+
+    async def wait(self, job_id, policy=None, started=None):
+        """
+        按轮询策略等待 job_id 完成；可用于恢复一个已经提交过的任务
+        截止时间取 policy.deadline 与当前报告预算中更早的一个，超时后尝试取消后端任务
+        """
+        policy = policy or self.policy
+        started = started or time.monotonic()
+        url = f"{self.client.api_base_url}/job/JOB_ID/{job_id}"
+        polls = 0
+        last_error = None
+        deadline_at = started + policy.deadline
+        budget_at = report_deadline.get()
+        over_budget = budget_at is not None and budget_at < deadline_at
+        if over_budget:
+            deadline_at = budget_at
+
+        for delay in policy.intervals():
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(delay, remaining))
+            polls += 1
+            try:
+                resp = await self._request("GET", url)
+            except self._errors as e:
+                # 网络抖动不算失败，继续轮询直到截止时间
+                last_error = str(e)
+                continue
+            if resp.status_code != 200:
+                last_error = f"HTTP {resp.status_code}"
+                if resp.status_code == 429 and self.scheduler is not None:
+                    # 轮询也被限流：让所有提交一起退避
+                    self.scheduler.on_throttle(429, retry_after_seconds(resp))
+                continue
+
+            try:
+                res = resp.json()
+            except ValueError:
+                res = None
+            if not isinstance(res, dict):
+                # 网关返回的 HTML 错误页、被截断的响应：与网络抖动一样继续轮询
+                last_error = f"返回内容不是 JSON 对象: {resp.text[:80]!r}"
+                continue
+            status = res.get("status")
+            if status in ["SUCCESS", "COMPLETED"]:
+                output = res.get("output") or res.get("result")
+                parse_started = time.monotonic()
+                data = self.parser(output) if self.parser else output
+                timings = {"parse_sec": time.monotonic() - parse_started}
+                elapsed = time.monotonic() - started
+                if data is None:
+                    return JobResult(False, output=output, error="AI 返回内容无法解析为 JSON",
+                                     job_id=job_id, polls=polls, elapsed=elapsed, extra=timings)
+                return JobResult(True, data=data, output=output, job_id=job_id, polls=polls, elapsed=elapsed,
+                                 extra=timings)
+            elif status == "FAILED":
+                reason = res.get("error") or res.get("message") or "后端返回 FAILED"
+                return JobResult(False, error=f"AI 任务失败: {reason}", job_id=job_id,
+                                 polls=polls, elapsed=time.monotonic() - started)
+
+        if over_budget:
+            error = "超出报告时间预算"
+        else:
+            error = f"等待超时 ({policy.deadline:.0f}s)"
+        if last_error: error += f"，最后一次错误: {last_error}"
+        # 不再需要结果的任务别让它在后端继续占资源
+        await self.cancel(job_id)
+        return JobResult(False, error=error, job_id=job_id, polls=polls, elapsed=time.monotonic() - started)
+
+    async def _wait_hedged(self, full_prompt, job_id, policy, started, key):
+        """
+        等待 job_id；超过对冲延迟仍未完成时再提交一个相同的任务，用先成功的那个，另一个取消
+        """
+        delay = hedging.delay(key)
+        primary = asyncio.create_task(self.wait(job_id, policy=policy, started=started))
+        done, _ = await asyncio.wait({primary}, timeout=max(0.0, delay - (time.monotonic() - started)))
+        if done or not hedging.try_acquire():
+            return await primary
+        if self.scheduler is not None and not self.scheduler.try_token():
+            # 正在排队或限流：对冲只会加重后端负担
+            return await primary
+
+        print(f"🪁 任务 {job_id} 超过 {delay:.0f}s 仍未完成，提交对冲任务")
+        try:
+            hedge_id = await self.submit(full_prompt, retries=0)
+        except self._errors as e:
+            print(f"⚠️ 对冲任务提交失败: {e}")
+            return await primary
+        backup = asyncio.create_task(self.wait(hedge_id, policy=policy, started=started))
+        job_ids = {primary: job_id, backup: hedge_id}
+
+        pending, winner = {primary, backup}, None
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((t for t in done if t.result().ok), None)
+        # 两个都失败时以原任务的结果为准
+        result = (winner or primary).result()
+        for task in pending:
+            # 输掉的任务：停止轮询，并尽力取消后端任务
+            task.cancel()
+            await self.cancel(job_ids[task])
+
+        hedge_won = result.job_id == hedge_id
+        metrics.registry.count("ai_hedges_total", outcome="won" if hedge_won and result.ok else "lost")
+        result.extra["hedged"] = True
+        result.extra["hedge_won"] = hedge_won
+        return result
+
+    async def exists(self, job_id):
+        """
+        后端是否还认识这个任务 (恢复之前确认一下，任务过期了就重新提交)
+        """
+        try:
+            resp = await self._request("GET", f"{self.client.api_base_url}/job/JOB_ID/{job_id}")
+        except self._errors:
+            return True  # 网络问题时先假定存在，交给 wait 的截止时间兜底
+        return resp.status_code != 404
+
+    async def run(self, system_prompt, user_content, policy=None):
+        """
+        提交 + 等待，任何异常都转成 JobResult
+        设置了 job_journal 时，同一个 Prompt 已经提交过的任务会直接恢复轮询
+        提交前先向调度器排队 (令牌 + 在途名额)，拿到结果后归还名额
+        """
+        started = time.monotonic()
+        remaining = remaining_budget()
+        if remaining is not None and remaining <= 0:
+            return JobResult(False, error="超出报告时间预算，未提交")
+        full_prompt = f"{system_prompt}\n\n=== INPUT DATA ===\n{user_content}"
+        journal = job_journal.get()
+        prompt_key = hashlib.sha256(full_prompt.encode("utf-8")).hexdigest() if journal else None
+
+        job_id = await asyncio.to_thread(journal.lookup, prompt_key) if journal else None
+        if job_id and not await self.exists(job_id):
+            print(f"⚠️ 后端任务 {job_id} 已不存在，重新提交")
+            job_id = None
+        resumed = job_id is not None
+        queue_sec = 0.0
+        if self.scheduler is not None:
+            try:
+                # 恢复轮询的任务不再提交，只占在途名额、不消耗令牌
+                queue_sec = await self.scheduler.acquire(need_token=not resumed, deadline=report_deadline.get())
+            except SchedulerTimeout:
+                return JobResult(False, error=QUEUE_BUDGET_ERROR, elapsed=time.monotonic() - started)
+        try:
+            if not resumed:
+                try:
+                    job_id = await self.submit(full_prompt)
+                except self._errors as e:
+                    return JobResult(False, error=str(e) or type(e).__name__, elapsed=time.monotonic() - started,
+                                     extra={"queue_sec": queue_sec})
+                if journal:
+                    await asyncio.to_thread(journal.record, prompt_key, job_id)
+                hedging.on_submit()
+            submit_sec = time.monotonic() - started - queue_sec
+            key = hedging.key(system_prompt)
+            if self.hedge and not resumed:
+                result = await self._wait_hedged(full_prompt, job_id, policy or self.policy, started, key)
+            else:
+                result = await self.wait(job_id, policy=policy, started=started)
+        finally:
+            if self.scheduler is not None:
+                self.scheduler.release()
+        if result.ok and not resumed:
+            hedging.record(key, result.elapsed - queue_sec)
+        result.extra["resumed"] = resumed
+        # 各阶段耗时：排队 / 提交 / 轮询等待 / 解析 JSON
+        result.extra["queue_sec"] = queue_sec
+        result.extra["submit_sec"] = submit_sec
+        result.extra["poll_sec"] = result.elapsed - queue_sec - submit_sec - result.extra.get("parse_sec", 0.0)
+        return result
+
+    async def run_many(self, requests, policy=None, max_in_flight=None):
+        """
+        并发执行多个 (system_prompt, user_content)，结果顺序与输入一致
+        """
+        semaphore = asyncio.Semaphore(max_in_flight) if max_in_flight else None
+
+        async def _one(system_prompt, user_content):
+            if semaphore is None:
+                return await self.run(system_prompt, user_content, policy=policy)
+            async with semaphore:
+                return await self.run(system_prompt, user_content, policy=policy)
+
+        return await asyncio.gather(*(_one(s, u) for s, u in requests))
+
+
+def run_sync(coro_factory):
+    """
+    在同步代码里执行协程：交给共享的后台事件循环 (见 BackgroundLoop)，当前线程等待结果
+    调用方的 contextvars (指标的报告上下文、任务日志、截止时间、优先级通道) 会随任务带过去
+    """
+    background = get_background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is background.loop:
+        raise RuntimeError("不能在 AI 任务的事件循环里同步等待 AI 任务")
+    # call_soon_threadsafe 在调用线程里复制 contextvars，任务在这份副本里运行
+    return asyncio.run_coroutine_threadsafe(coro_factory(), background.loop).result()
+
+
+def run_job_sync(system_prompt, user_content, parser=None, policy=None):
+    """
+    同步版本：给 Streamlit 页面和线程池使用
+    """
+    async def _go():
+        async with JobEngine(parser=parser, policy=policy) as engine:
+            return await engine.run(system_prompt, user_content)
+    return run_sync(_go)
+
+
+def run_many_sync(requests, parser=None, policy=None, max_in_flight=None):
+    """
+    同步版本的 run_many：一次并发提交多个任务，结果顺序与输入一致
+    """
+    async def _go():
+        async with JobEngine(parser=parser, policy=policy) as engine:
+            return await engine.run_many(requests, max_in_flight=max_in_flight)
+    return run_sync(_go)
@@ -0,0 +1,234 @@
+# json_repair.py
+# 本地修复 AI 输出的 JSON + 按阶段校验结构
+# LLM 经常输出多余的逗号、字符串里未转义的引号/换行、被截断的结尾，以前整步直接返回 None，用户只能从头再等一分钟
+# 这里先尽量在本地修好；修不好或结构不对时，pipeline 再用一个很便宜的「只重排格式」任务兜底 (见 pipeline.call_ai_stage)
+import re
+import json
+
+_FENCED_BLOCK_RE = re.compile(r"```(?:json|JSON)?[ \t]*\n?(.*?)(?:```|$)", re.S)
+_WORD_RE = re.compile(r"[A-Za-z]+")
+_LITERALS = {"True": "true", "False": "false", "None": "null", "NaN": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+_VALUE_END = set('"}]') | set("0123456789") | set("el")  # 字符串 / 对象 / 数组 / 数字 / true false null 的结尾
+_VALUE_START = set('"{[-') | set("0123456789")
+
+
+def _strip_fences(text):
+    """
+    去掉代码块标记和前言：有代码块时只取第一个代码块 (截断时没有结束标记，取到结尾)；
+    各阶段的输出顶层都是 object，从第一个 { 开始，没有 { 时才从 [ 开始 (前言里的 [1]、[JSON] 不会被当成开头)
+    """
+    block = _FENCED_BLOCK_RE.search(text)
+    if block and ("{" in block.group(1) or "[" in block.group(1)):
+        text = block.group(1)
+    start = text.find("{")
+    if start == -1:
+        start = text.find("[")
+    return text[start:] if start != -1 else text
+
+
+def _next_significant(text, i):
+    n = len(text)
+    while i < n and text[i] in " \t\r\n":
+        i += 1
+    return text[i] if i < n else ""
+
+
+def _closes_string(text, i):
+    """
+    字符串里 i 位置的引号是不是结束引号：后面紧跟 : } ] 、另一个字符串或结尾才算；
+    后面是逗号时，逗号之后还得是一个新的键 / 值，"Stocks "rallied", analysts said" 里的引号是正文
+    """
+    nxt = _next_significant(text, i + 1)
+    if nxt in (":", "}", "]", '"', ""):
+        return True
+    if nxt != ",":
+        return False
+    j = text.index(",", i + 1) + 1
+    after = _next_significant(text, j)
+    if after in _VALUE_START or after in ("}", "]", ""):
+        return True
+    rest = text[j:].lstrip()
+    return rest.startswith(("true", "false", "null"))
+
+
+def _last_significant(out):
+    for piece in reversed(out):
+        stripped = piece.rstrip()
+        if stripped:
+            return stripped[-1]
+    return ""
+
+
+def _close(out, stack):
+    # 去掉结尾多余的逗号；悬空的冒号补 null；再按栈补齐括号
+    text = "".join(out).rstrip()
+    while text.endswith(","):
+        text = text[:-1].rstrip()
+    if text.endswith(":"):
+        text += "null"
+    return text + "".join(_CLOSERS[c] for c in reversed(stack))
+
+
+def repair_json(text):
+    """
+    逐字符扫描修复常见问题，返回修复后的 JSON 文本 (不保证一定合法)：
+    代码块标记、首尾多余文字、多余逗号、缺少逗号、字符串里的换行/未转义引号、
+    Python 字面量 (True/None)、// 注释、被截断的字符串与括号
+    """
+    return _repair(_strip_fences(text))[0]
+
+
+def _repair(text):
+    """
+    返回 (修复后的文本, 是否丢弃了内容)；丢弃内容的修复不可信 (正文被悄悄截掉)，由调用方决定是否采用
+    """
+    out, stack = [], []
+    commas = []  # 每个逗号的位置与当时的括号栈，截断修复失败时回退到最后一个完整元素
+    in_string = escaped = False
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if in_string:
+            if escaped:
+                out.append(c)
+                escaped = False
+            elif c == "\\":
+                out.append(c)
+                escaped = True
+            elif c == '"':
+                # 后面紧跟分隔符 (或另一个字符串) 才是真正的结束引号，否则是正文里未转义的引号
+                if _closes_string(text, i):
+                    out.append(c)
+                    in_string = False
+                else:
+                    out.append('\\"')
+            elif c == "\n":
+                out.append("\\n")
+            elif c == "\r":
+                out.append("\\r")
+            elif c == "\t":
+                out.append("\\t")
+            elif ord(c) >= 0x20:
+                out.append(c)
+            i += 1
+            continue
+
+        if c == '"' or c in "{[":
+            if _last_significant(out) in _VALUE_END and stack:
+                out.append(",")  # 两个元素之间漏了逗号
+            if c == '"':
+                in_string = True
+            else:
+                stack.append(c)
+            out.append(c)
+        elif c in "}]":
+            if not stack:
+                break
+            while out and out[-1].strip() in ("", ","):
+                out.pop()
+            out.append(_CLOSERS[stack.pop()])
+            if not stack:
+                break  # 顶层对象结束，后面的文字忽略
+        elif c == ",":
+            commas.append((len(out), list(stack)))
+            out.append(c)
+        elif c == "/" and text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        else:
+            word = _WORD_RE.match(text, i)
+            if word and word.group() in _LITERALS:
+                out.append(_LITERALS[word.group()])
+                i += len(word.group())
+                continue
+            out.append(c)
+        i += 1
+
+    if in_string:
+        if escaped:
+            out.pop()
+        out.append('"')
+    repaired = _close(out, stack)
+    if stack and commas:
+        try:
+            json.loads(repaired)
+        except ValueError:
+            # 截断在一个不完整的元素中间：丢掉它，保留前面完整的部分
+            position, stack_then = commas[-1]
+            return _close(out[:position], stack_then), True
+    return repaired, False
+
+
+def loads(text):
+    """
+    宽松解析：返回 (对象, 是否经过修复)；无法修复、或修复时要丢弃内容时抛出 ValueError (交给重排格式兜底)
+    """
+    text = _strip_fences(str(text)).strip()
+    try:
+        # 快速路径：合法 JSON，允许后面跟着多余的文字
+        return json.JSONDecoder().raw_decode(text)[0], False
+    except ValueError:
+        pass
+    repaired, dropped = _repair(text)
+    try:
+        data = json.loads(repaired)
+    except ValueError as e:
+        raise ValueError(f"JSON 修复失败: {e}") from e
+    if dropped:
+        raise ValueError("JSON 修复失败: 需要丢弃部分内容才能解析")
+    return data, True
+
+
+# ================= 结构校验 =================
+
+# 各阶段输出的必需字段及类型；OPTIONAL 中的字段可以缺失，但出现时类型必须正确
+SCHEMAS = {
+    "wsh_step1": {"required": {"meta": dict, "content_raw": dict}, "optional": {"stock": dict}},
+    "fund_flow_step1": {"required": {"meta": dict, "raw_content": dict}, "optional": {}},
+    "wsh_final": {"required": {"header_info": dict, "body_content": (list, str)}, "optional": {"footer_info": dict}},
+    "fund_flow_final": {"required": {"header_info": dict, "body_content": (list, str)}, "optional": {}},
+}
+SCHEMAS["wsh_fused"] = {"required": dict(SCHEMAS["wsh_final"]["required"], meta=dict),
+                        "optional": SCHEMAS["wsh_final"]["optional"]}
+SCHEMAS["fund_flow_fused"] = {"required": dict(SCHEMAS["fund_flow_final"]["required"], meta=dict), "optional": {}}
+
+_TYPE_NAMES = {dict: "object", list: "array", str: "string"}
+
+
+def _type_name(expected):
+    types = expected if isinstance(expected, tuple) else (expected,)
+    return " | ".join(_TYPE_NAMES.get(t, t.__name__) for t in types)
+
+
+def validate(data, schema_name):
+    """
+    返回问题列表 (空列表表示通过)
+    """
+    schema = SCHEMAS[schema_name]
+    if not isinstance(data, dict):
+        return [f"顶层应为 object，实际为 {type(data).__name__}"]
+    problems = []
+    for key, expected in schema["required"].items():
+        if key not in data:
+            problems.append(f"缺少字段 {key}")
+        elif not isinstance(data[key], expected):
+            problems.append(f"{key} 应为 {_type_name(expected)}")
+    for key, expected in schema["optional"].items():
+        if key in data and data[key] is not None and not isinstance(data[key], expected):
+            problems.append(f"{key} 应为 {_type_name(expected)}")
+    body = data.get("body_content")
+    if isinstance(body, list) and not all(isinstance(p, str) for p in body):
+        problems.append("body_content 的每一项都应为 string")
+    return problems
+
+
+def describe(schema_name):
+    """
+    给「重排格式」Prompt 用的结构说明
+    """
+    schema = SCHEMAS[schema_name]
+    fields = [f'"{k}": {_type_name(t)}' for k, t in schema["required"].items()]
+    fields += [f'"{k}": {_type_name(t)} (optional)' for k, t in schema["optional"].items()]
+    return "{ " + ", ".join(fields) + " }"
@@ -0,0 +1,334 @@
+# metrics.py
+# 流水线各阶段的结构化计时与指标：耗时、轮询次数、Prompt/返回大小、任务 ID、缓存命中、失败原因
+# 输出两种形式：
+#   1. JSON 日志 (每个阶段 / 每份报告一行)，写入 config.METRICS_LOG_PATH
+#   2. Prometheus 文本格式，可写文件 (config.METRICS_PROM_PATH) 或起一个 /metrics 端点 (config.METRICS_PORT)
+#
+# 汇总历史日志: python metrics.py .cache/metrics.jsonl
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+import config
+
+# 每个 (类别, 阶段) 保留最近多少个耗时样本用于计算分位数
+WINDOW_SIZE = 2000
+
+_current_trace = contextvars.ContextVar("report_trace", default=None)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class ReportTrace:
+    """
+    一份报告的全部阶段记录；通过 contextvars 传递，流水线里任何位置都能找到当前报告
+    """
+    def __init__(self, category, source=None):
+        self.report_id = uuid.uuid4().hex[:12]
+        self.category = category or "unknown"
+        self.source = source
+        self.started = time.perf_counter()
+        self.stages = []
+        self.status = "ok"
+        self.failed_stage = None
+        self.error = None
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations = {}   # (category, stage) -> deque[秒]
+        self._counters = {}    # (name, labels tuple) -> 数值
+        self._gauges = {}      # (name, labels tuple) -> 当前值 (队列深度等，会上下变化)
+        self._log_lock = threading.Lock()
+
+    # ================= 记录 =================
+
+    def _inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, category, stage, duration, **fields):
+        """
+        记录一个阶段事件 (同时写入 JSON 日志)
+        """
+        with self._lock:
+            window = self._durations.setdefault((category, stage), deque(maxlen=WINDOW_SIZE))
+            window.append(duration)
+            self._inc("stage_total", category=category, stage=stage, status="ok" if not fields.get("error") else "error")
+            if fields.get("polls"):
+                self._inc("ai_polls_total", fields["polls"], category=category, stage=stage)
+            if fields.get("prompt_chars"):
+                self._inc("prompt_chars_total", fields["prompt_chars"], category=category, stage=stage)
+            if fields.get("response_chars"):
+                self._inc("response_chars_total", fields["response_chars"], category=category, stage=stage)
+            if "cache_hit" in fields:
+                self._inc("cache_lookups_total", category=category, stage=stage, result="hit" if fields["cache_hit"] else "miss")
+
+        trace = _current_trace.get()
+        event = {"event": "stage", "category": category, "stage": stage, "duration_sec": round(duration, 4)}
+        if trace is not None:
+            event["report_id"] = trace.report_id
+            trace.stages.append(dict(event, **fields))
+        event.update(fields)
+        self.log(event)
+
+    def count(self, name, value=1, **labels):
+        with self._lock:
+            self._inc(name, value, **labels)
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def log(self, event):
+        path = config.METRICS_LOG_PATH
+        if not path:
+            return
+        event = dict(event, ts=datetime.now().isoformat(timespec="milliseconds"))
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._log_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    # ================= 导出 =================
+
+    def summary(self):
+        """
+        {类别: {阶段: {count, mean, p50, p95}}}
+        """
+        with self._lock:
+            snapshot = {key: list(values) for key, values in self._durations.items()}
+        result = {}
+        for (category, stage), values in sorted(snapshot.items()):
+            result.setdefault(category, {})[stage] = {
+                "count": len(values),
+                "mean": round(sum(values) / len(values), 4),
+                "p50": round(percentile(values, 50), 4),
+                "p95": round(percentile(values, 95), 4),
+            }
+        return result
+
+    def render_prometheus(self):
+        lines = [
+            "# HELP ai_report_stage_duration_seconds Pipeline stage duration (recent window).",
+            "# TYPE ai_report_stage_duration_seconds summary",
+        ]
+        with self._lock:
+            snapshot = {key: list(values) for key, values in self._durations.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        for (category, stage), values in sorted(snapshot.items()):
+            labels = f'category="{_escape(category)}",stage="{_escape(stage)}"'
+            for q in (0.5, 0.95):
+                lines.append(f'ai_report_stage_duration_seconds{{{labels},quantile="{q}"}} {percentile(values, q * 100):.6f}')
+            lines.append(f"ai_report_stage_duration_seconds_sum{{{labels}}} {sum(values):.6f}")
+            lines.append(f"ai_report_stage_duration_seconds_count{{{labels}}} {len(values)}")
+
+        seen = set()
+        for (name, labels), value in sorted(counters.items()):
+            metric = f"ai_report_{name}"
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} counter")
+                seen.add(metric)
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}")
+
+        for (name, labels), value in sorted(gauges.items()):
+            metric = f"ai_report_{name}"
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} gauge")
+                seen.add(metric)
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        path = path or config.METRICS_PROM_PATH
+        if not path:
+            return None
+        text = self.render_prometheus()
+        # 批量模式下多个报告线程同时结束、多进程共用同一文件：临时文件按进程区分，进程内串行写
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with self._log_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)  # 原子替换，node_exporter 不会读到半个文件
+        return path
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+registry = MetricsRegistry()
+
+
+# ================= 便捷接口 =================
+
+def current_category():
+    trace = _current_trace.get()
+    return trace.category if trace is not None else "unknown"
+
+
+def observe(stage, duration, **fields):
+    registry.observe(current_category(), stage, duration, **fields)
+
+
+@contextmanager
+def stage(name, **fields):
+    """
+    计时一个阶段：
+        with metrics.stage("extract") as info:
+            ...
+            info["chars"] = len(text)
+    异常会被记录为失败原因后继续抛出
+    """
+    info = dict(fields)
+    started = time.perf_counter()
+    try:
+        yield info
+    except Exception as e:
+        info.setdefault("error", getattr(e, "message", None) or str(e) or type(e).__name__)
+        raise
+    finally:
+        observe(name, time.perf_counter() - started, **info)
+
+
+@contextmanager
+def report_context(category, source=None):
+    """
+    包住一整份报告：结束时记录总耗时、状态、失败阶段，并刷新 Prometheus 文件
+    """
+    trace = ReportTrace(category, source)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except Exception as e:
+        trace.status = "failed"
+        trace.failed_stage = getattr(e, "stage", "unknown")
+        trace.error = getattr(e, "message", None) or str(e)
+        raise
+    finally:
+        _current_trace.reset(token)
+        total = time.perf_counter() - trace.started
+        registry.observe(trace.category, "total", total, **({"error": trace.error} if trace.error else {}))
+        registry.count("reports_total", category=trace.category, status=trace.status)
+        if trace.failed_stage:
+            registry.count("report_failures_total", category=trace.category, stage=trace.failed_stage)
+        registry.log({
+            "event": "report", "report_id": trace.report_id, "category": trace.category, "source": trace.source,
+            "status": trace.status, "failed_stage": trace.failed_stage, "error": trace.error,
+            "duration_sec": round(total, 4), "stages": [s["stage"] for s in trace.stages],
+        })
+        try:
+            registry.write_prometheus()
+        except OSError as e:
+            # 指标导出失败不影响报告本身
+            print(f"⚠️ 指标文件写入失败: {e}")
+
+
+# ================= /metrics 端点 =================
+
+def _serve(request):
+    """
+    处理一个 GET 请求 (request 为 BaseHTTPRequestHandler)
+    """
+    if request.path.rstrip("/") == "/metrics":
+        body, content_type = registry.render_prometheus(), "text/plain; version=0.0.4"
+    elif request.path.rstrip("/") == "/metrics/summary":
+        body, content_type = json.dumps(registry.summary(), ensure_ascii=False), "application/json"
+    else:
+        request.send_response(404)
+        request.end_headers()
+        return
+    data = body.encode("utf-8")
+    request.send_response(200)
+    request.send_header("Content-Type", content_type)
+    request.send_header("Content-Length", str(len(data)))
+    request.end_headers()
+    request.wfile.write(data)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host="0.0.0.0"):
+    """
+    启动 /metrics (Prometheus) 与 /metrics/summary (JSON) 端点；重复调用只启动一次
+    """
+    global _server
+    port = port or config.METRICS_PORT
+    if not port:
+        return None
+    # 延迟导入 http.server (会连带导入 email / html 等模块)，只有开启端点时才需要
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            _serve(self)
+
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            except OSError as e:
+                # Streamlit 多进程/重复启动时端口可能已被占用
+                print(f"⚠️ 指标端口 {port} 启动失败: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+            print(f"📈 指标端点: http://{host}:{port}/metrics")
+    return _server
+
+
+# ================= 离线汇总 =================
+
+def summarize_log(path):
+    """
+    读取 JSON 日志，按类别/阶段汇总 p50/p95 (进程重启后也能看历史)
+    """
+    samples = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get("event") == "stage":
+                samples.setdefault(event["category"], {}).setdefault(event["stage"], []).append(event["duration_sec"])
+    return {
+        category: {
+            name: {"count": len(v), "p50": percentile(v, 50), "p95": percentile(v, 95)}
+            for name, v in sorted(stages.items())
+        }
+        for category, stages in sorted(samples.items())
+    }
+
+
+if __name__ == "__main__":
+    log_path = sys.argv[1] if len(sys.argv) > 1 else config.METRICS_LOG_PATH
+    print(json.dumps(summarize_log(log_path), indent=2, ensure_ascii=False))
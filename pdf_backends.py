@@ -0,0 +1,160 @@
+# pdf_backends.py
+# PDF 文本提取后端：pdfplumber (原来的实现，按版面逐字符拼接，最慢)、pdfminer (pdfplumber 的底层)、
+# pypdfium2 / PyMuPDF (C 实现，快一到两个数量级)。每个后端逐页提取、用完即释放该页的缓存，
+# 页数再多内存也不会一直增长；选哪个后端由 pdf_extract.resolve_backend 决定 (显式指定或按质量自动选择)
+import io
+import re
+import importlib.util
+
+
+class TextBackend:
+    """
+    后端接口：extract(pdf_bytes, page_numbers) 返回 {页码: 文本}；在进程池的子进程里执行，重量级依赖在方法内导入
+    """
+    name = None
+    module = None  # 需要的第三方包 (用于判断是否已安装)
+    thread_safe = True  # pdfium / MuPDF 不是线程安全的，只能在子进程里调用
+
+    def available(self):
+        return importlib.util.find_spec(self.module) is not None
+
+    def count_pages(self, pdf_bytes):
+        raise NotImplementedError
+
+    def extract(self, pdf_bytes, page_numbers):
+        raise NotImplementedError
+
+
+def _clean(text):
+    # 统一换行、去掉行尾空白，使各后端的输出格式与 pdfplumber 一致
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\x00", "")
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip("\n")
+
+
+class PdfplumberBackend(TextBackend):
+    name = "pdfplumber"
+    module = "pdfplumber"
+
+    def count_pages(self, pdf_bytes):
+        import pdfplumber
+
+        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+            return len(pdf.pages)
+
+    def extract(self, pdf_bytes, page_numbers):
+        import pdfplumber
+
+        texts = {}
+        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+            for i in page_numbers:
+                page = pdf.pages[i]
+                texts[i] = page.extract_text() or ""
+                page.close()  # 释放该页的字符 / 对象缓存，否则要到整个文件关闭才释放
+        return texts
+
+
+class PdfminerBackend(TextBackend):
+    name = "pdfminer"
+    module = "pdfminer"
+
+    def count_pages(self, pdf_bytes):
+        from pdfminer.pdfpage import PDFPage
+
+        return sum(1 for _ in PDFPage.get_pages(io.BytesIO(pdf_bytes)))
+
+    def extract(self, pdf_bytes, page_numbers):
+        from pdfminer.converter import PDFPageAggregator
+        from pdfminer.layout import LAParams, LTTextContainer
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+
+        manager = PDFResourceManager(caching=False)
+        device = PDFPageAggregator(manager, laparams=LAParams())
+        interpreter = PDFPageInterpreter(manager, device)
+        wanted = sorted(set(page_numbers))
+        texts = {}
+        for i, page in zip(wanted, PDFPage.get_pages(io.BytesIO(pdf_bytes), pagenos=set(wanted))):
+            interpreter.process_page(page)
+            layout = device.get_result()
+            texts[i] = _clean("".join(obj.get_text() for obj in layout if isinstance(obj, LTTextContainer)))
+        return texts
+
+
+class Pypdfium2Backend(TextBackend):
+    name = "pypdfium2"
+    module = "pypdfium2"
+    thread_safe = False
+
+    def count_pages(self, pdf_bytes):
+        import pypdfium2 as pdfium
+
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    def extract(self, pdf_bytes, page_numbers):
+        import pypdfium2 as pdfium
+
+        texts = {}
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        try:
+            for i in page_numbers:
+                page = pdf[i]
+                textpage = page.get_textpage()
+                texts[i] = _clean(textpage.get_text_range())
+                textpage.close()
+                page.close()
+        finally:
+            pdf.close()
+        return texts
+
+
+class PymupdfBackend(TextBackend):
+    name = "pymupdf"
+    module = "fitz"
+    thread_safe = False
+
+    def count_pages(self, pdf_bytes):
+        import fitz
+
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf:
+            return pdf.page_count
+
+    def extract(self, pdf_bytes, page_numbers):
+        import fitz
+
+        texts = {}
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf:
+            for i in page_numbers:
+                texts[i] = _clean(pdf.load_page(i).get_text("text"))
+        return texts
+
+
+BACKENDS = {backend.name: backend for backend in (
+    PdfplumberBackend(), PdfminerBackend(), Pypdfium2Backend(), PymupdfBackend())}
+
+
+def get_backend(name):
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"未知的 PDF 文本后端 '{name}' (可选: {', '.join(BACKENDS)})")
+    return backend
+
+
+# ================= 质量检查 =================
+
+# 缺字形映射时的典型输出：pdfminer/pdfplumber 的 (cid:123)、替换字符、私用区字符、控制字符
+_GARBLED_RE = re.compile(r"\(cid:\d+\)|[\ufffd\ue000-\uf8ff\x01-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def garbled_ratio(text):
+    """
+    乱码字符占非空白字符的比例 (0 ~ 1)；没有文字时返回 None
+    """
+    visible = sum(1 for c in text if not c.isspace())
+    if not visible:
+        return None
+    bad = sum(len(m) for m in _GARBLED_RE.findall(text))
+    return min(1.0, bad / visible)
@@ -0,0 +1,215 @@
+# pdf_extract.py
+# 按页并行读取 PDF 文本：提取是纯 CPU 计算，几十页的策略报告用 pdfplumber 串行要几十秒
+# 页数多时把页面分段交给进程池，按页码顺序拼接；每页结果缓存在内存里，重复读取直接命中
+# 文本后端见 pdf_backends.py：config.PDF_TEXT_BACKEND 显式指定，或 auto 按试读质量自动选择
+import io
+import os
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import config
+import pdf_backends
+from result_cache import sha256_hex
+
+
+class PageCache:
+    """
+    进程内的按页文本缓存：键为 (PDF 哈希, 页码)，超过 max_pages 时淘汰最久未用的页面
+    """
+    def __init__(self, max_pages):
+        self.max_pages = max_pages
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, pdf_hash, page_count):
+        """
+        返回 {页码: 文本}，只包含已缓存的页
+        """
+        found = {}
+        with self._lock:
+            for i in range(page_count):
+                key = (pdf_hash, i)
+                if key in self._pages:
+                    self._pages.move_to_end(key)
+                    found[i] = self._pages[key]
+            self.hits += len(found)
+            self.misses += page_count - len(found)
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def put_many(self, pdf_hash, texts):
+        with self._lock:
+            for i, text in texts.items():
+                self._pages[(pdf_hash, i)] = text
+                self._pages.move_to_end((pdf_hash, i))
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+
+page_cache = PageCache(config.PDF_PAGE_CACHE_MAX_PAGES)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _pool_size():
+    return config.PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # 不用 fork：批量模式下其他线程可能正持有导入锁等，fork 出的子进程会卡死；Windows 上本来就是 spawn
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                _pool = ProcessPoolExecutor(max_workers=_pool_size(), mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+def _extract_page_range(pdf_bytes, page_numbers, backend="pdfplumber"):
+    """
+    进程池里执行：打开 PDF，只读取指定页，返回 {页码: 文本}
+    (后端在方法内导入依赖：启动时不加载，子进程里第一次用到时才加载)
+    """
+    return pdf_backends.get_backend(backend).extract(pdf_bytes, page_numbers)
+
+
+def _probe_backends(pdf_bytes, names, probe_pages, max_garbled):
+    """
+    进程池里执行：按顺序用各后端试读前 probe_pages 页，返回 (后端名称, 试读结果, 乱码比例)
+    第一个乱码比例不超过 max_garbled 的后端胜出；都不达标时取乱码最少的
+    """
+    best = None
+    for name in names:
+        backend = pdf_backends.BACKENDS.get(name)
+        if backend is None or not backend.available():
+            continue
+        try:
+            pages = list(range(min(probe_pages, backend.count_pages(pdf_bytes))))
+            texts = backend.extract(pdf_bytes, pages)
+        except Exception as e:
+            print(f"⚠️ PDF 文本后端 {name} 试读失败: {e}")
+            continue
+        ratio = pdf_backends.garbled_ratio("\n".join(texts.values()))
+        ratio = 0.0 if ratio is None else ratio  # 试读页没有文字 (扫描件 / 封面图)：各后端都一样，直接用
+        if ratio <= max_garbled:
+            return name, texts, ratio
+        if best is None or ratio < best[2]:
+            best = (name, texts, ratio)
+    return best or ("pdfplumber", {}, None)
+
+
+def _split_batches(page_numbers, n_batches):
+    # 连续页分到同一批，减少每个进程重复解析的开销
+    size = max(1, -(-len(page_numbers) // n_batches))
+    return [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+
+
+def count_pages(pdf_bytes):
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        return len(pdf.pages)
+
+
+# auto 模式下每个 PDF 选中的后端 {PDF 哈希: 后端名称}，以及页数 {PDF 哈希: 页数} (pdfplumber 数页数每页约 1ms)
+_chosen = OrderedDict()
+_page_counts = OrderedDict()
+_chosen_lock = threading.Lock()
+_CHOSEN_MAX = 1024
+
+
+def _remember(store, pdf_hash, value):
+    with _chosen_lock:
+        store[pdf_hash] = value
+        while len(store) > _CHOSEN_MAX:
+            store.popitem(last=False)
+
+
+def _count_pages_cached(pdf_bytes, pdf_hash):
+    with _chosen_lock:
+        if pdf_hash in _page_counts:
+            return _page_counts[pdf_hash]
+    page_count = count_pages(pdf_bytes)
+    _remember(_page_counts, pdf_hash, page_count)
+    return page_count
+
+
+def _cache_key(pdf_hash, backend):
+    # 不同后端的文本不同，按页缓存也要分开
+    return pdf_hash if backend == "pdfplumber" else f"{pdf_hash}:{backend}"
+
+
+def resolve_backend(pdf_bytes, pdf_hash=None):
+    """
+    返回该 PDF 使用的文本后端名称：config.PDF_TEXT_BACKEND 不是 auto 时直接使用；
+    auto 时按 PDF_TEXT_BACKEND_ORDER 依次试读前 PDF_TEXT_PROBE_PAGES 页，选第一个乱码比例
+    不超过 PDF_TEXT_MAX_GARBLED_RATIO 的后端 (同一 PDF 只试读一次，试读的页直接进缓存)
+    """
+    if config.PDF_TEXT_BACKEND != "auto":
+        return pdf_backends.get_backend(config.PDF_TEXT_BACKEND).name
+    pdf_hash = pdf_hash or sha256_hex(pdf_bytes)
+    with _chosen_lock:
+        if pdf_hash in _chosen:
+            _chosen.move_to_end(pdf_hash)
+            return _chosen[pdf_hash]
+
+    # pdfium / MuPDF 不是线程安全的，试读也放到子进程里
+    name, texts, ratio = _get_pool().submit(
+        _probe_backends, pdf_bytes, config.PDF_TEXT_BACKEND_ORDER, config.PDF_TEXT_PROBE_PAGES,
+        config.PDF_TEXT_MAX_GARBLED_RATIO).result()
+    if ratio:
+        print(f"🔤 PDF 文本后端: {name} (乱码比例 {ratio:.1%})")
+    page_cache.put_many(_cache_key(pdf_hash, name), texts)
+    _remember(_chosen, pdf_hash, name)
+    return name
+
+
+def extract_pages(pdf_bytes, parallel=None, backend=None):
+    """
+    返回每一页的文本列表 (按页码顺序)
+    parallel=None 时自动判断：页数不少于 PDF_PARALLEL_MIN_PAGES 才使用进程池
+    backend=None 时按 resolve_backend 选择
+    """
+    pdf_hash = sha256_hex(pdf_bytes)
+    backend = pdf_backends.get_backend(backend or resolve_backend(pdf_bytes, pdf_hash))
+    key = _cache_key(pdf_hash, backend.name)
+    page_count = _count_pages_cached(pdf_bytes, pdf_hash)
+    texts = page_cache.get_many(key, page_count)
+    missing = [i for i in range(page_count) if i not in texts]
+
+    if missing:
+        if parallel is None:
+            parallel = len(missing) >= config.PDF_PARALLEL_MIN_PAGES
+        if parallel or not backend.thread_safe:
+            # 不是线程安全的后端即使不并行也在子进程里读取 (批量模式下多个线程会同时读 PDF)
+            pool = _get_pool()
+            futures = [pool.submit(_extract_page_range, pdf_bytes, batch, backend.name)
+                       for batch in _split_batches(missing, _pool_size() * 2 if parallel else 1)]
+            fresh = {}
+            for future in futures:
+                fresh.update(future.result())
+        else:
+            fresh = _extract_page_range(pdf_bytes, missing, backend.name)
+        page_cache.put_many(key, fresh)
+        texts.update(fresh)
+
+    return [texts[i] for i in range(page_count)]
+
+
+def join_pages(page_texts):
+    """
+    与原来 full_text += text + "\\n" 的结果一致 (空白页跳过)，但只做一次拼接
+    """
+    return "".join(f"{text}\n" for text in page_texts if text)
+
+
+def extract_text(pdf_bytes, parallel=None, backend=None):
+    return join_pages(extract_pages(pdf_bytes, parallel=parallel, backend=backend))
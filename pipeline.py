@@ -0,0 +1,568 @@
+# pipeline.py
+# 研报生成流水线：PDF 读取 -> AI Step 1 -> AI Step 2 -> 后处理 -> Word 文档
+# Streamlit 界面 (app.py) 与批量命令行 (batch_run.py) 共用这里的逻辑
+import os
+import json
+import re
+import time
+from datetime import datetime
+import config  # 引用你现有的配置文件
+import pdf_extract
+import chunking
+import text_reduce
+import fund_flow_rules
+import figures
+import step2_batch
+import json_repair
+import metrics
+from ai_client import get_shared_client
+from job_engine import JobResult, run_job_sync, run_many_sync, deadline_scope
+from result_cache import get_shared_cache, make_key, sha256_hex
+from single_flight import get_shared_flights
+
+# --- WSH(Wall Street Highlight) ---
+# 步骤 1: 分析师
+STEP_1_PROMPT_TEMPLATE = config.STEP_1_PROMPT_TEMPLATE
+
+# 步骤 2: 编辑
+STEP_2_PROMPT_TEMPLATE = config.STEP_2_PROMPT_TEMPLATE
+
+# --- 资金流周报 (Weekly Fund Flow) ---
+FUND_FLOW_STEP1 = config.FUND_FLOW_STEP1
+FUND_FLOW_STEP2 = config.FUND_FLOW_STEP2
+
+# --- 单次调用 (fused) 模式 ---
+STEP_FUSED_PROMPT_TEMPLATE = config.STEP_FUSED_PROMPT_TEMPLATE
+FUND_FLOW_FUSED = config.FUND_FLOW_FUSED
+
+FUND_FLOW_CATEGORY = "Weekly Fund Flow"
+REPORT_CATEGORIES = ("Equity", "Macro", "FX&Commodity", FUND_FLOW_CATEGORY)
+PIPELINE_MODES = ("two_step", "fused")
+
+
+class PipelineError(Exception):
+    """
+    流水线某一步失败时抛出，stage 标明失败的步骤 (extract / step1 / step2 / fused / render)
+    """
+    def __init__(self, stage, message):
+        super().__init__(message)
+        self.stage = stage
+        self.message = message
+
+
+def get_bank_acronym(full_name):
+    """
+    根据 Step 1 提取的全名，返回对应的缩写
+    """
+    if not full_name: return "Unknown"
+
+    name_upper = full_name.upper()
+
+    if "J.P. MORGAN" in name_upper or "JPMORGAN" in name_upper: return "JPM"
+    if "GOLDMAN" in name_upper: return "GS"
+    if "MORGAN STANLEY" in name_upper: return "MS"
+    if "DEUTSCHE" in name_upper: return "DB"
+    if "CITIC" in name_upper: return "CITICS"
+    if "AMERICA" in name_upper or "BOFA" in name_upper: return "BofA"
+    if "UBS" in name_upper: return "UBS"
+    if "HSBC" in name_upper: return "HSBC"
+
+    # 如果没匹配到，就取前单词作为缩写，去除非法字符
+    clean_name = re.sub(r'[^\w]', '', full_name.split()[0])
+    return clean_name
+
+# 首页版面里的机构名 (整词匹配，大写)：正文里的 "China subsidies"、"Latin America" 不能被当成 UBS / BofA
+BANK_NAME_PATTERNS = (
+    ("JPM", r"J\.\s?P\.\s?MORGAN|JPMORGAN"),
+    ("GS", r"GOLDMAN SACHS"),
+    ("MS", r"MORGAN STANLEY"),
+    ("DB", r"DEUTSCHE BANK"),
+    ("CITICS", r"CITIC SECURITIES|CITICS|中信证券"),
+    ("BofA", r"BOFA|BANK OF AMERICA"),
+    ("UBS", r"UBS"),
+    ("HSBC", r"HSBC"),
+)
+_BANK_NAME_RES = [(acronym, re.compile(rf"(?<![A-Z0-9])(?:{pattern})(?![A-Z0-9])"))
+                  for acronym, pattern in BANK_NAME_PATTERNS]
+
+# ================= 功能函数 =================
+
+def detect_bank(first_page):
+    """
+    从首页开头几行判断机构缩写 (选择 text_reduce 的机构规则)；没有对应规则时返回 None
+    逐行查找，用最先出现机构名的那一行 (页眉 / 机构行)；同一行有多个时取最靠前、最长的
+    """
+    for line in (first_page or "").splitlines()[:20]:
+        upper = line.upper()
+        found = [(m.start(), -len(m.group()), acronym)
+                 for acronym, pattern in _BANK_NAME_RES for m in [pattern.search(upper)] if m]
+        if found:
+            acronym = min(found)[2]
+            return acronym if acronym in config.TEXT_REDUCE_RULES else None
+    return None
+
+def reduce_pdf_text(page_texts):
+    """
+    送入 AI 之前去掉页眉页脚和免责声明附录 (见 text_reduce.py)，返回精简后的全文
+    """
+    with metrics.stage("reduce") as info:
+        text, stats = text_reduce.reduce_pages(page_texts, bank=detect_bank(page_texts[0] if page_texts else ""))
+        info.update(stats)
+    if stats["removed_chars"]:
+        pct = stats["removed_chars"] * 100 // max(1, stats["chars_in"])
+        print(f"✂️ 已精简 PDF 文本: 去掉 {stats['removed_chars']} 字符 ({pct}%)，规则: {stats['bank']}")
+    return text
+
+def extract_pdf_text(path, reduce=True):
+    """
+    读取 PDF 全文；reduce=True 时去掉页眉页脚和免责声明 (即送给 Step 1 的文本)
+    """
+    label = f"<{len(path)} bytes>" if isinstance(path, (bytes, bytearray)) else getattr(path, "name", path)
+    print(f"📄 正在读取 PDF: {label}...")
+    with metrics.stage("extract") as info:
+        try:
+            # 按页并行读取 + 按页缓存 (见 pdf_extract.py)；文本后端按 config.PDF_TEXT_BACKEND 选择
+            pdf_bytes = read_pdf_bytes(path)
+            info["backend"] = pdf_extract.resolve_backend(pdf_bytes)
+            page_texts = pdf_extract.extract_pages(pdf_bytes, backend=info["backend"])
+        except Exception as e:
+            print(f"❌ 读取 PDF 失败: {e}")
+            info["error"] = str(e)
+            return None
+        info["chars"] = sum(len(text) + 1 for text in page_texts if text)
+    if not reduce:
+        return pdf_extract.join_pages(page_texts)
+    return reduce_pdf_text(page_texts)
+
+def extract_fund_flow_step1(pdf_bytes):
+    """
+    资金流周报 Step 1 的本地规则提取 (见 fund_flow_rules.py)；版面不匹配时返回 None，由调用方回退到 AI
+    """
+    with metrics.stage("step1_rules") as info:
+        data, problems = fund_flow_rules.extract_step1(pdf_bytes)
+        info["matched"] = data is not None
+        if problems:
+            info["fallback"] = "; ".join(problems)
+    metrics.registry.count("step1_rules_total", result="matched" if data is not None else "fallback")
+    if data is None:
+        print(f"↩️ 版面不符合规则 ({'; '.join(problems)})，改用 AI Step 1")
+    else:
+        print("📐 已按版面规则提取 Step 1，跳过 AI")
+    return data
+
+def get_token():
+    # Token 由共享客户端缓存，过期前不会重复请求认证服务器
+    return get_shared_client().get_token()
+
+def call_ai_job(system_prompt, user_content):
+    """
+    提交并等待一个 AI 任务，返回 job_engine.JobResult (包含失败原因、轮询次数等)
+    """
+    print("🚀 提交 AI 任务...")
+    result = run_job_sync(system_prompt, user_content, parser=clean_json)
+    if result.ok:
+        print(f"✅ AI 完成！(ID: {result.job_id}, 轮询 {result.polls} 次, {result.elapsed:.1f}s)")
+    else:
+        print(f"❌ AI 任务失败 (ID: {result.job_id}): {result.error}")
+    return result
+
+def call_step1(system_prompt, pdf_text):
+    """
+    Step 1：文本超过 STEP1_CHUNK_THRESHOLD 时自动切块并发提取再合并 (见 chunking.py)
+    """
+    if not chunking.should_chunk(pdf_text):
+        return call_ai_job(system_prompt, pdf_text)
+
+    chunks = chunking.split_text(pdf_text)
+    total = len(chunks)
+    print(f"🧩 长文本 ({len(pdf_text)} 字符)，分 {total} 块并发提取...")
+    requests = [(chunking.chunk_prompt(system_prompt, i + 1, total), chunk) for i, chunk in enumerate(chunks)]
+    results = run_many_sync(requests, parser=clean_json)
+
+    failed = [i + 1 for i, r in enumerate(results) if not r.ok]
+    # 第一块通常包含机构名、标题等元数据，必须成功；其他块允许个别失败
+    if not results[0].ok or len(failed) == total:
+        return JobResult(False, error=f"分块提取失败 (第 {failed} 块): {results[0].error or results[-1].error}")
+    if failed:
+        print(f"⚠️ 第 {failed} 块提取失败，使用其余 {total - len(failed)} 块的结果")
+
+    merged = chunking.merge_step1([r.data for r in results if r.ok])
+    print(f"✅ 分块提取完成！({total} 块, 最慢 {max(r.elapsed for r in results):.1f}s)")
+    return JobResult(
+        True, data=merged,
+        job_id=",".join(r.job_id for r in results if r.job_id),
+        polls=sum(r.polls for r in results),
+        elapsed=max(r.elapsed for r in results),
+        extra={"chunks": total, "failed_chunks": failed},
+    )
+
+def call_step2(system_prompt, step1_str):
+    """
+    Step 2：开启跨文档批处理时与其他文档合并成一个任务 (见 step2_batch.py)；
+    批处理中本文档的结果缺失或无法解析时单独提交
+    """
+    batcher = step2_batch.get_shared_batcher()
+    if batcher is not None:
+        result = batcher.run(system_prompt, step1_str)
+        if result is not None and result.ok:
+            return result
+        if result is not None:
+            print(f"⚠️ Step 2 批处理失败 ({result.error})，单独提交本文档...")
+            metrics.registry.count("step2_batch_fallbacks_total")
+    return call_ai_job(system_prompt, step1_str)
+
+def call_ai_and_wait_generic(system_prompt, user_content):
+    # 兼容旧接口：成功返回解析后的 JSON，失败返回 None
+    result = call_ai_job(system_prompt, user_content)
+    return result.data if result.ok else None
+
+def clean_json(raw_input):
+    text = ""
+    if isinstance(raw_input, dict):
+        text = raw_input.get("content") or raw_input.get("output") or raw_input.get("result")
+        if not text:
+            if "header_info" in raw_input or "meta" in raw_input: return raw_input
+            text = json.dumps(raw_input)
+    else:
+        text = str(raw_input)
+
+    if not text:
+        return None
+    # 宽松解析：多余逗号、未转义引号、被截断的结尾等在本地修复 (见 json_repair.py)
+    try:
+        data, repaired = json_repair.loads(text)
+    except ValueError as e:
+        print(f"⚠️ {e}")
+        return None
+    if repaired:
+        print("🩹 AI 返回的 JSON 格式有误，已在本地修复")
+    return data if isinstance(data, dict) else None
+
+def reformat_output(stage, schema, result, problems):
+    """
+    本地修复失败或结构不对时，只把原始输出发回 AI 重排格式 (不重新读 PDF)
+    """
+    raw = result.output if result.output is not None else result.data
+    if raw is None or not config.JSON_REFORMAT_ENABLED:
+        return None
+    raw_text = raw if isinstance(raw, str) else json.dumps(raw, ensure_ascii=False)
+    prompt = config.JSON_REFORMAT_PROMPT_TEMPLATE.format(schema=json_repair.describe(schema),
+                                                         problems="; ".join(problems))
+    print(f"🧹 {stage} 输出格式有误 ({'; '.join(problems)})，请求 AI 只重排格式...")
+    started = time.perf_counter()
+    fixed = call_ai_job(prompt, raw_text)
+    record_ai_metrics(f"{stage}_reformat", time.perf_counter() - started, prompt, raw_text, fixed)
+    return fixed
+
+def ensure_schema(stage, schema, result):
+    """
+    校验 AI 输出的结构；不通过时尝试重排格式，仍失败则返回带具体原因的失败结果
+    """
+    if result.ok:
+        problems = json_repair.validate(result.data, schema)
+        if not problems:
+            return result
+    elif result.output is not None:
+        problems = [result.error]  # 有输出但解析失败
+    else:
+        return result  # 任务本身失败 / 超时，重排格式没有意义
+
+    fixed = reformat_output(stage, schema, result, problems)
+    if fixed is not None and fixed.ok and not json_repair.validate(fixed.data, schema):
+        extra = dict(result.extra, reformatted=True)
+        return JobResult(True, data=fixed.data, output=fixed.output, job_id=result.job_id,
+                         polls=result.polls + fixed.polls, elapsed=result.elapsed + fixed.elapsed, extra=extra)
+    reason = "; ".join(problems)
+    if fixed is not None:
+        reason += f" (重排格式也失败: {fixed.error or '; '.join(json_repair.validate(fixed.data, schema))})"
+    return JobResult(False, data=result.data, output=result.output, error=f"AI 返回结构不正确: {reason}",
+                     job_id=result.job_id, polls=result.polls, elapsed=result.elapsed, extra=result.extra)
+
+# ================= 流水线 =================
+
+def build_filename(report_category, user_name, raw_data, source_name):
+    """
+    生成下载文件名：资金流用日期，其他类别用机构缩写 + 原文件名
+    """
+    if report_category == FUND_FLOW_CATEGORY:
+        # 构造文件名 (资金流用 Step 1 识别到的机构缩写 + 日期，识别不到时默认为高盛)
+        institution = (raw_data or {}).get("meta", {}).get("institution")
+        bank_acronym = get_bank_acronym(institution) if institution else "GS"
+        return f"WeeklyFlow_{user_name}_{bank_acronym}_{datetime.now().strftime('%Y%m%d')}.docx"
+
+    # 获取原文件名 (去除后缀)
+    original_filename = os.path.splitext(os.path.basename(source_name))[0]
+    # 获取银行缩写
+    institution = raw_data.get("meta", {}).get("institution", "Unknown")
+    bank_acronym = get_bank_acronym(institution)
+    # 拼接
+    final_filename = f"{report_category}_{user_name}_{bank_acronym}_{original_filename}.docx"
+    return final_filename.replace(" ", "_").replace("/", "-") # 清洗非法字符
+
+def call_ai_stage(stage, system_prompt, user_content, input_hash=None, runner=call_ai_job, schema=None,
+                  source_hash=None, category=None):
+    """
+    带缓存的 AI 调用：键为 (阶段, 输入哈希, 渲染后的 Prompt, 模型)
+    user_content 可以是函数，只有缓存未命中时才会调用 (例如延迟读取 PDF)
+    runner 为实际执行的函数 (默认单次任务，Step 1 使用 call_step1 以支持分块)
+    schema 为 json_repair.SCHEMAS 中的结构名；指定时校验输出，不通过则请求重排格式
+    source_hash / category 为来源 PDF 的哈希和报告类别，随结果存入缓存 (日报合并按 PDF 去重)
+    """
+    if input_hash is None:
+        if callable(user_content):
+            user_content = user_content()
+        input_hash = sha256_hex(user_content)
+
+    started = time.perf_counter()
+    cache = get_shared_cache()
+    key = make_key(stage, input_hash, system_prompt)
+    if cache is not None:
+        data = cache.get(key, stage=stage)
+        if data is not None:
+            print(f"⚡ 命中缓存: {stage}")
+            metrics.observe(stage, time.perf_counter() - started, cache_hit=True)
+            return JobResult(True, data=data, extra={"cache_hit": True})
+
+    def execute():
+        content = user_content() if callable(user_content) else user_content
+        begun = time.perf_counter()  # 不把延迟读取 PDF 的时间算进 AI 阶段
+        result = runner(system_prompt, content)
+        if schema:
+            result = ensure_schema(stage, schema, result)
+        if result.ok and cache is not None:
+            cache.set(key, result.data, stage=stage, source=source_hash, category=category)
+        record_ai_metrics(stage, time.perf_counter() - begun, system_prompt, content, result,
+                          cache_hit=False if cache is not None else None)
+        return result
+
+    # 相同的阶段正在运行 (其他会话 / 其他进程上传了同一份 PDF) 时等待它的结果，不重复提交 (见 single_flight.py)
+    flights = get_shared_flights()
+    if flights is None:
+        return execute()
+    result = flights.run(key, execute, stage=stage, cache=cache)
+    if result.extra.get("coalesced"):
+        metrics.observe(stage, time.perf_counter() - started, coalesced=result.extra["coalesced"],
+                        **({} if result.ok else {"error": result.error}))
+    return result
+
+def record_ai_metrics(stage, duration, system_prompt, user_content, result, cache_hit=None):
+    """
+    记录一次 AI 阶段：耗时、轮询次数、Prompt/返回大小、任务 ID、失败原因
+    """
+    response = result.output if result.output is not None else result.data  # 分块结果没有原始 output
+    fields = {
+        "job_id": result.job_id,
+        "polls": result.polls,
+        "prompt_chars": len(system_prompt) + len(user_content or ""),
+        "response_chars": 0 if response is None else len(response if isinstance(response, str) else json.dumps(response, ensure_ascii=False)),
+    }
+    for key in ("queue_sec", "submit_sec", "poll_sec", "parse_sec", "chunks", "failed_chunks", "resumed", "hedged", "hedge_won",
+                "batch_size"):
+        if result.extra.get(key) is not None:
+            fields[key] = round(result.extra[key], 4) if isinstance(result.extra[key], float) else result.extra[key]
+    if cache_hit is not None:
+        fields["cache_hit"] = cache_hit
+    if not result.ok:
+        fields["error"] = result.error
+    metrics.observe(stage, duration, **fields)
+
+def get_pipeline_mode(report_category, mode=None):
+    """
+    mode 未指定时按 config.PIPELINE_MODE_BY_CATEGORY 选择："two_step" 或 "fused"
+    """
+    mode = mode or config.PIPELINE_MODE_BY_CATEGORY.get(report_category, config.PIPELINE_MODE_DEFAULT)
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"未知的流水线模式: {mode} (可选: {', '.join(PIPELINE_MODES)})")
+    return mode
+
+def postprocess_fund_flow(final_json):
+    # 强制二次确认：除了指定的三个字段，其余全部清空或保持原样
+    allowed_keys = ["title", "summary", "body_content", "date", "from", "language"]
+    header = final_json.get("header_info", {})
+    for key in header.keys():
+        if key.lower() not in allowed_keys:
+            header[key] = "" # 确保不属于 fund flow 的字段绝对为空
+    return final_json
+
+def finalize_report_json(final_json, report_category, date=None):
+    """
+    生成 Word 之前的后处理 (单份报告与日报合并共用)：资金流只保留指定字段；日期改为生成当天 (date 默认现在)
+    """
+    if report_category == FUND_FLOW_CATEGORY:
+        postprocess_fund_flow(final_json)
+    if "header_info" in final_json:
+        final_json["header_info"]["date"] = (date or datetime.now()).strftime("%Y/%m/%d")
+    return final_json
+
+def run_fused_stage(pdf_text, report_category, on_status=print, pdf_hash=None):
+    """
+    单次调用模式：一次 AI 任务直接输出 header_info/body_content/footer_info + meta.institution
+    返回值与两步模式一致：(raw_data, final_json)，raw_data 只包含 meta
+    """
+    if report_category == FUND_FLOW_CATEGORY:
+        on_status("⚡ 单次调用: 提取并执行【市场动态】翻译标准...")
+        prompt, schema = FUND_FLOW_FUSED, "fund_flow_fused"
+    else:
+        on_status("⚡ 单次调用: 提取、格式化、缩写和标红...")
+        prompt, schema = STEP_FUSED_PROMPT_TEMPLATE.format(category=report_category), "wsh_fused"
+
+    fused = call_ai_stage("fused", prompt, pdf_text, input_hash=pdf_hash, schema=schema, source_hash=pdf_hash,
+                          category=report_category)
+    if not fused.ok:
+        raise PipelineError("fused", f"❌ 单次调用 AI 失败: {fused.error}")
+    final_json = fused.data
+    raw_data = {"meta": final_json.pop("meta", None) or {}}
+    return raw_data, final_json
+
+def run_ai_stages(pdf_text, report_category, on_status=print, pdf_hash=None, mode=None, pdf_bytes=None):
+    """
+    执行 AI 阶段：返回 (raw_data, final_json)，失败时抛出 PipelineError
+    pdf_text 可以是函数 (Step 1 命中缓存时不会被调用)；pdf_hash 用作 Step 1 的缓存键
+    mode: "two_step" (Step 1 + Step 2) 或 "fused" (一次调用)，默认按类别配置
+    pdf_bytes: 提供时资金流周报先尝试按版面规则在本地完成 Step 1 (config.FUND_FLOW_RULES_ENABLED)
+    """
+    if get_pipeline_mode(report_category, mode) == "fused":
+        raw_data, final_json = run_fused_stage(pdf_text, report_category, on_status=on_status, pdf_hash=pdf_hash)
+        if report_category == FUND_FLOW_CATEGORY:
+            postprocess_fund_flow(final_json)
+        return raw_data, final_json
+
+    if report_category == FUND_FLOW_CATEGORY:
+        # === A. 资金流模式 ===
+        raw_data = None
+        if pdf_bytes is not None and config.FUND_FLOW_RULES_ENABLED:
+            on_status("📐 Step 1: 按版面规则提取资金流数据...")
+            raw_data = extract_fund_flow_step1(pdf_bytes)
+        if raw_data is None:
+            on_status("🔍 Step 1: 提取资金流数据...")
+            step1 = call_ai_stage("step1", FUND_FLOW_STEP1, pdf_text, input_hash=pdf_hash, runner=call_step1,
+                                  schema="fund_flow_step1")
+            if not step1.ok:
+                raise PipelineError("step1", f"❌ Step 1 失败: {step1.error}")
+            raw_data = step1.data
+
+        on_status("✍️ Step 2: 执行【市场动态】翻译标准...")
+        step2 = call_ai_stage("step2", FUND_FLOW_STEP2, json.dumps(raw_data), runner=call_step2,
+                              schema="fund_flow_final", source_hash=pdf_hash, category=report_category)
+        if not step2.ok:
+            raise PipelineError("step2", f"❌ AI 生成失败: {step2.error}")
+        final_json = postprocess_fund_flow(step2.data)
+        return raw_data, final_json
+
+    # B. AI Step 1
+    on_status("🧠 AI Step 1: 正在提取关键数据...")
+    prompt_1 = STEP_1_PROMPT_TEMPLATE.format(category=report_category)
+    step1 = call_ai_stage("step1", prompt_1, pdf_text, input_hash=pdf_hash, runner=call_step1, schema="wsh_step1")
+    if not step1.ok:
+        raise PipelineError("step1", f"❌ 第一步 AI 分析失败: {step1.error}")
+    raw_data = step1.data
+
+    # C. AI Step 2
+    on_status("✍️ AI Step 2: 正在进行格式化、缩写和标红...")
+    prompt_2 = STEP_2_PROMPT_TEMPLATE.format(category=report_category)
+    step1_str = json.dumps(raw_data, indent=2, ensure_ascii=False)
+    step2 = call_ai_stage("step2", prompt_2, step1_str, runner=call_step2, schema="wsh_final",
+                          source_hash=pdf_hash, category=report_category)
+    if not step2.ok:
+        raise PipelineError("step2", f"❌ 第二步 AI 格式化失败: {step2.error}")
+    final_json = step2.data
+    return raw_data, final_json
+
+def read_pdf_bytes(pdf_source):
+    """
+    读取 PDF 原始字节：支持路径、bytes、以及 Streamlit 上传的文件对象
+    """
+    if isinstance(pdf_source, (bytes, bytearray)):
+        return bytes(pdf_source)
+    if hasattr(pdf_source, "getvalue"):
+        return pdf_source.getvalue()
+    if hasattr(pdf_source, "read"):
+        pdf_source.seek(0)
+        data = pdf_source.read()
+        pdf_source.seek(0)
+        return data
+    with open(pdf_source, "rb") as f:
+        return f.read()
+
+def build_report(pdf_source, report_category, user_name, source_name=None, image=None,
+                 on_status=print, mode=None, runner=run_ai_stages, on_payload=None, claim_name=None):
+    """
+    完整流水线：读取 PDF -> AI -> 在内存中生成 Word
+    pdf_source 可以是路径、bytes 或 Streamlit 上传的文件对象；image 可以是路径、bytes 或文件对象
+    (不提供 image 时按 config.FIGURE_AUTO_EXTRACT 从 PDF 中自动提取图表)
+    runner 为执行 AI 阶段的函数，签名同 run_ai_stages (app.py 用它套一层会话内缓存)
+    on_payload(final_json, 文件名) 在生成 Word 之前调用 (例如保存 JSON 供日报合并，见 digest.py)
+    claim_name(文件名) 返回实际使用的文件名 (批量模式用它避免同一批次里的文件互相覆盖)
+    返回 (docx 字节, 文件名)
+    """
+    if source_name is None:
+        source_name = getattr(pdf_source, "name", None) or str(pdf_source)
+
+    # 按类别的时间预算：所有 AI 任务共享同一个截止时间
+    budget = config.AI_REPORT_BUDGET_BY_CATEGORY.get(report_category, config.AI_REPORT_BUDGET_DEFAULT)
+    with metrics.report_context(report_category, source=os.path.basename(source_name)), deadline_scope(budget):
+        return _build_report(pdf_source, report_category, user_name, source_name, image, on_status, mode, runner,
+                             on_payload, claim_name)
+
+def _build_report(pdf_source, report_category, user_name, source_name, image, on_status, mode, runner, on_payload,
+                  claim_name):
+    pdf_bytes = read_pdf_bytes(pdf_source)
+    pdf_hash = sha256_hex(pdf_bytes)
+
+    # A. 读取 PDF (Step 1 命中缓存时不需要读取)
+    def load_pdf_text():
+        on_status("📄 正在读取 PDF 内容...")
+        pdf_text = extract_pdf_text(pdf_bytes)
+        if not pdf_text:
+            raise PipelineError("extract", "❌ PDF 读取失败或为空")
+        return pdf_text
+
+    # 没有上传封面图时从 PDF 里提取图表，与 AI 阶段同时进行
+    figure_future = None
+    if image is None and report_category != FUND_FLOW_CATEGORY and config.FIGURE_AUTO_EXTRACT:
+        figure_future = figures.extract_figures_async(pdf_bytes)
+
+    raw_data, final_json = runner(load_pdf_text, report_category, on_status=on_status,
+                                  pdf_hash=pdf_hash, mode=mode, pdf_bytes=pdf_bytes)
+
+    # D. 后处理 (日期 & 类别)
+    finalize_report_json(final_json, report_category)
+
+    # E. 生成文件名
+    final_filename = build_filename(report_category, user_name, raw_data, source_name)
+    if claim_name:
+        final_filename = claim_name(final_filename)
+    if on_payload:
+        on_payload(final_json, final_filename)
+
+    # G. 生成 Word
+    extracted = figure_future.result() if figure_future else []
+    if extracted:
+        on_status(f"🖼️ 已从 PDF 中提取 {len(extracted)} 张图表")
+    on_status("💾 正在生成 Word 文档...")
+    if report_category == FUND_FLOW_CATEGORY:
+        image = None # 资金流模式不插图
+    with metrics.stage("render") as info:
+        try:
+            from doc_generator import DocGenerator  # 延迟导入 python-docx，第一次生成时才加载
+            docx_bytes = DocGenerator().render_bytes(final_json, img_path=image, report_category=report_category,
+                                                     images=extracted)
+        except Exception as e:
+            raise PipelineError("render", f"❌ Word 生成失败: {e}")
+        if docx_bytes is None:
+            raise PipelineError("render", "❌ Word 生成失败: 数据为空")
+        info["bytes"] = len(docx_bytes)
+    return docx_bytes, final_filename
+
+def generate_report(pdf_source, report_category, user_name, output_dir=".",
+                    source_name=None, img_path=None, on_status=print, mode=None, on_payload=None, claim_name=None):
+    """
+    同 build_report，但把 Word 写到 output_dir；返回 (docx 路径, 文件名)
+    """
+    docx_bytes, final_filename = build_report(pdf_source, report_category, user_name, source_name=source_name,
+                                              image=img_path, on_status=on_status, mode=mode, on_payload=on_payload,
+                                              claim_name=claim_name)
+    output_docx_path = os.path.join(output_dir, final_filename)
+    with open(output_docx_path, "wb") as f:
+        f.write(docx_bytes)
+    return output_docx_path, final_filename
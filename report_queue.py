@@ -0,0 +1,360 @@
+# report_queue.py
+# 后台生成队列：按钮只负责入队，后台线程执行流水线；任务状态持久化在本地 SQLite
+# - 页面刷新 / 关闭浏览器不会丢任务，按用户名可以看到自己所有任务的进度并下载结果
+# - 同一用户重复点击 (同一 PDF + 类别 + 用户名) 不会重复提交
+# - 每个 AI 任务提交后立刻记下后端 job_id；进程中断后重新执行时恢复轮询，不重复提交
+# 其他机器上的 worker 不直接打开这个文件，而是通过流水线服务的 /worker 接口领取任务 (service_client.RemoteQueue)
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+import traceback
+from functools import partial
+from contextlib import contextmanager
+import config
+from job_engine import job_journal
+from result_cache import sha256_hex
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+# 列表查询不读取 PDF / Word 的二进制内容
+_SUMMARY_COLUMNS = ("id, owner, category, user_name, mode, source_name, status, stage, error, failed_stage,"
+                    " filename, attempts, created, updated")
+
+
+class ReportQueue:
+    """
+    基于 SQLite 的任务表，同一台机器上的多线程 / 多进程共用同一个文件
+    """
+    errors = (sqlite3.Error,)  # 读写任务表可能抛出的异常 (QueueWorkers 捕获后重试)
+
+    def __init__(self, path=None):
+        self.path = path or config.REPORT_QUEUE_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_jobs ("
+                " id TEXT PRIMARY KEY, owner TEXT, category TEXT, user_name TEXT, mode TEXT,"
+                " source_name TEXT, pdf_hash TEXT, pdf BLOB, image BLOB,"
+                " status TEXT, stage TEXT, error TEXT, failed_stage TEXT,"
+                " backend_jobs TEXT DEFAULT '{}', filename TEXT, docx BLOB,"
+                " worker TEXT, heartbeat REAL, attempts INTEGER DEFAULT 0, created REAL, updated REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_report_jobs_owner ON report_jobs (owner, created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_report_jobs_status ON report_jobs (status, created)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:  # 正常结束自动 commit，异常时 rollback
+                yield conn
+        finally:
+            conn.close()
+
+    # ================= 入队 / 查询 =================
+
+    def enqueue(self, pdf_bytes, category, user_name, source_name, image=None, mode=None, owner=None):
+        """
+        加入队列，返回任务 ID；同一用户相同的任务还在排队或运行时直接返回已有任务
+        """
+        owner = owner or user_name
+        pdf_hash = sha256_hex(pdf_bytes)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # 两次点击几乎同时到达时也只会插入一条
+            row = conn.execute(
+                "SELECT id FROM report_jobs WHERE owner = ? AND pdf_hash = ? AND category = ? AND user_name = ?"
+                " AND IFNULL(mode, '') = ? AND status IN (?, ?)",
+                (owner, pdf_hash, category, user_name, mode or "", *ACTIVE_STATUSES)
+            ).fetchone()
+            if row:
+                return row["id"]
+            job_id = uuid.uuid4().hex[:16]
+            conn.execute(
+                "INSERT INTO report_jobs (id, owner, category, user_name, mode, source_name, pdf_hash, pdf, image,"
+                " status, stage, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, owner, category, user_name, mode, source_name, pdf_hash, pdf_bytes, image,
+                 STATUS_QUEUED, "⏳ 排队中...", now, now)
+            )
+        return job_id
+
+    def list_jobs(self, owner, limit=20):
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {_SUMMARY_COLUMNS} FROM report_jobs WHERE owner = ? ORDER BY created DESC LIMIT ?",
+                (owner, limit)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {_SUMMARY_COLUMNS} FROM report_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def fetch_docx(self, job_id):
+        """
+        返回 (docx 字节, 文件名)；任务未完成时返回 (None, None)
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT docx, filename FROM report_jobs WHERE id = ? AND status = ?",
+                               (job_id, STATUS_DONE)).fetchone()
+        return (bytes(row["docx"]), row["filename"]) if row else (None, None)
+
+    def counts(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM report_jobs GROUP BY status").fetchall()
+        return {r[0]: r[1] for r in rows}
+
+    # ================= 执行 =================
+
+    def claim_next(self, worker):
+        """
+        取出最早排队的任务并标记为运行中；没有任务时返回 None
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, category, user_name, mode, source_name, pdf, image FROM report_jobs"
+                " WHERE status = ? ORDER BY created LIMIT 1", (STATUS_QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE report_jobs SET status = ?, worker = ?, heartbeat = ?, attempts = attempts + 1, updated = ?"
+                " WHERE id = ?", (STATUS_RUNNING, worker, now, now, row["id"])
+            )
+        return dict(row)
+
+    # 以下几个更新都带上 worker：任务被判定中断、重新排队并由别的 worker 接手后，原来的 worker
+    # 即使还活着 (例如卡住很久) 也不能覆盖新一次执行的进度和结果
+
+    def set_stage(self, job_id, worker, stage):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("UPDATE report_jobs SET stage = ?, heartbeat = ?, updated = ? WHERE id = ? AND worker = ?",
+                         (stage, now, now, job_id, worker))
+
+    def heartbeat(self, worker):
+        with self._connect() as conn:
+            conn.execute("UPDATE report_jobs SET heartbeat = ? WHERE worker = ? AND status = ?",
+                         (time.time(), worker, STATUS_RUNNING))
+
+    def finish(self, job_id, worker, docx_bytes, filename):
+        """
+        返回是否写入 (任务已被其他 worker 接手时返回 False)
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE report_jobs SET status = ?, stage = ?, docx = ?, filename = ?, pdf = NULL, updated = ?"
+                " WHERE id = ? AND worker = ? AND status = ?",
+                (STATUS_DONE, "✅ 生成成功！", docx_bytes, filename, now, job_id, worker, STATUS_RUNNING)
+            )
+        return cur.rowcount > 0
+
+    def fail(self, job_id, worker, stage, error):
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE report_jobs SET status = ?, failed_stage = ?, error = ?, updated = ?"
+                " WHERE id = ? AND worker = ? AND status = ?",
+                (STATUS_FAILED, stage, error, now, job_id, worker, STATUS_RUNNING)
+            )
+        return cur.rowcount > 0
+
+    def requeue_stale(self, stale_sec=None, max_attempts=None):
+        """
+        运行中但心跳超时的任务 (进程被杀、服务器重启) 重新排队；已记录的后端 job_id 保留，用于恢复轮询
+        已经执行了 max_attempts 次的任务标记为失败 (多半是任务本身让进程崩溃)；返回重新排队的条数
+        """
+        stale_sec = stale_sec if stale_sec is not None else config.REPORT_QUEUE_STALE_SEC
+        max_attempts = max_attempts or config.REPORT_QUEUE_MAX_ATTEMPTS
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            failed = conn.execute(
+                "UPDATE report_jobs SET status = ?, failed_stage = ?, error = ?, worker = NULL, pdf = NULL,"
+                " updated = ? WHERE status = ? AND heartbeat < ? AND attempts >= ?",
+                (STATUS_FAILED, "worker", f"❌ 连续 {max_attempts} 次执行都中断了 (进程崩溃或被杀)，不再重试",
+                 now, STATUS_RUNNING, now - stale_sec, max_attempts)
+            ).rowcount
+            if failed:
+                print(f"⚠️ {failed} 个任务多次中断，已标记为失败")
+            cur = conn.execute(
+                "UPDATE report_jobs SET status = ?, stage = ?, worker = NULL WHERE status = ? AND heartbeat < ?",
+                (STATUS_QUEUED, "🔁 进程中断，重新排队 (将恢复已提交的 AI 任务)...", STATUS_RUNNING, now - stale_sec)
+            )
+        return cur.rowcount
+
+    def purge(self, keep_days=None):
+        """
+        删除过期的已完成 / 失败任务；返回删除的条数
+        """
+        keep_days = keep_days if keep_days is not None else config.REPORT_QUEUE_KEEP_DAYS
+        with self._connect() as conn:
+            cur = conn.execute("DELETE FROM report_jobs WHERE status IN (?, ?) AND updated < ?",
+                               (STATUS_DONE, STATUS_FAILED, time.time() - keep_days * 86400))
+        return cur.rowcount
+
+    # ================= 后端任务日志 =================
+
+    def lookup_backend_job(self, job_id, prompt_key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT backend_jobs FROM report_jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["backend_jobs"] or "{}").get(prompt_key) if row else None
+
+    def record_backend_job(self, job_id, prompt_key, backend_job_id):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # 分块提取时多个任务会同时写入
+            row = conn.execute("SELECT backend_jobs FROM report_jobs WHERE id = ?", (job_id,)).fetchone()
+            backend_jobs = json.loads(row["backend_jobs"] or "{}") if row else {}
+            backend_jobs[prompt_key] = backend_job_id
+            conn.execute("UPDATE report_jobs SET backend_jobs = ?, heartbeat = ? WHERE id = ?",
+                         (json.dumps(backend_jobs), time.time(), job_id))
+
+
+class _Journal:
+    """
+    job_engine.job_journal 的实现：把 (Prompt 哈希 -> 后端 job_id) 记在当前任务的行上
+    """
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+
+    def lookup(self, prompt_key):
+        return self.queue.lookup_backend_job(self.job_id, prompt_key)
+
+    def record(self, prompt_key, backend_job_id):
+        self.queue.record_backend_job(self.job_id, prompt_key, backend_job_id)
+
+
+class QueueWorkers:
+    """
+    后台线程池：每个线程循环领取任务执行；另有一个心跳线程标记本进程仍在运行
+    queue 可以是本地的 ReportQueue，也可以是远程的 service_client.RemoteQueue (接口相同)
+    runner 会传给 pipeline.build_report (None 表示默认的 run_ai_stages)
+    """
+    def __init__(self, queue, workers=None, poll_interval=1.0, runner=None):
+        self.queue = queue
+        self.workers = workers or config.REPORT_QUEUE_WORKERS
+        self.runner = runner
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        try:
+            requeued = self.queue.requeue_stale()
+            if requeued:
+                print(f"🔁 {requeued} 个中断的任务已重新排队")
+            self.queue.purge()
+        except self.queue.errors as e:
+            # 远程任务表 (流水线服务) 可能还没启动：worker 照常启动，之后的心跳会再次接管中断的任务
+            print(f"⚠️ 队列维护失败: {e}")
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"report-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        threading.Thread(target=self._heartbeat_loop, name="report-heartbeat", daemon=True).start()
+        print(f"👷 后台队列已启动: {self.workers} 个 worker ({self.queue.path})")
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(config.REPORT_QUEUE_HEARTBEAT_SEC):
+            try:
+                self.queue.heartbeat(self.worker_id)
+                self.queue.requeue_stale()  # 顺便接管其他已退出进程留下的任务
+            except self.queue.errors as e:
+                print(f"⚠️ 队列心跳失败: {e}")
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                task = self.queue.claim_next(self.worker_id)
+            except self.queue.errors as e:
+                print(f"⚠️ 领取任务失败: {e}")
+                task = None
+            if task is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self.run_task(task)
+
+    def run_task(self, task):
+        # 延迟导入：pipeline 会导入 doc_generator 等较重的模块
+        from pipeline import PipelineError, build_report, run_ai_stages
+
+        job_id, worker = task["id"], self.worker_id
+
+        def on_status(msg):
+            # 进度只是展示用，写不进去不影响生成
+            try:
+                self.queue.set_stage(job_id, worker, msg)
+            except self.queue.errors as e:
+                print(f"⚠️ 任务 {job_id} 进度更新失败: {e}")
+
+        token = job_journal.set(_Journal(self.queue, job_id))
+        try:
+            docx_bytes, filename = build_report(
+                bytes(task["pdf"]), task["category"], task["user_name"], source_name=task["source_name"],
+                image=bytes(task["image"]) if task["image"] else None,
+                on_status=on_status, mode=task["mode"], runner=self.runner or run_ai_stages
+            )
+            write = partial(self.queue.finish, job_id, worker, docx_bytes, filename)
+        except PipelineError as e:
+            write = partial(self.queue.fail, job_id, worker, e.stage, e.message)
+        except Exception as e:
+            traceback.print_exc()
+            write = partial(self.queue.fail, job_id, worker, "unknown", f"❌ 发生未知错误: {e}")
+        finally:
+            job_journal.reset(token)
+        try:
+            written = write()
+        except self.queue.errors as e:
+            # 任务表暂时不可用：本次结果丢弃，心跳超时后任务重新排队 (已提交的 AI 任务会恢复轮询)
+            print(f"⚠️ 任务 {job_id} 结果写入失败: {e}")
+            return
+        if not written:
+            print(f"⚠️ 任务 {job_id} 已由其他 worker 重新执行，本次结果丢弃")
+
+
+_shared_queue = None
+_shared_workers = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_queue():
+    global _shared_queue
+    if _shared_queue is None:
+        with _shared_lock:
+            if _shared_queue is None:
+                _shared_queue = ReportQueue()
+    return _shared_queue
+
+
+def start_workers(workers=None, runner=None, queue=None):
+    """
+    启动本进程的后台 worker (重复调用只启动一次)；queue 默认是本地任务表
+    """
+    global _shared_workers
+    queue = queue or get_shared_queue()
+    with _shared_lock:
+        if _shared_workers is None:
+            _shared_workers = QueueWorkers(queue, workers, runner=runner).start()
+    return _shared_workers
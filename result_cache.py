@@ -0,0 +1,168 @@
+# result_cache.py
+# AI 结果缓存 (按内容寻址)：同一个 PDF + 同一个 Prompt + 同一个模型，直接复用上次解析好的 JSON
+# 重新上传同一份研报 (类别选错、用户名打错、下载丢了) 时不用再等一分钟
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+import config
+
+
+def sha256_hex(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(stage, input_hash, prompt, model=None):
+    """
+    缓存键 = hash(阶段 + 输入内容哈希 + 渲染后的 Prompt + 模型名)
+    """
+    model = model or config.AI_MODEL_NAME
+    return sha256_hex("\x1f".join([stage, input_hash, sha256_hex(prompt), model]))
+
+
+class ResultCache:
+    """
+    基于 SQLite 的持久化缓存，多线程 / 多进程共用同一个文件
+    淘汰策略：超过 max_age 的条目直接删除；总大小超过 max_bytes 时按最近访问时间 (LRU) 删除
+    """
+    def __init__(self, path=None, max_bytes=None, max_age=None):
+        self.path = path or config.RESULT_CACHE_PATH
+        self.max_bytes = max_bytes if max_bytes is not None else config.RESULT_CACHE_MAX_MB * 1024 * 1024
+        self.max_age = max_age if max_age is not None else config.RESULT_CACHE_MAX_AGE_DAYS * 86400
+        self.hits = {}
+        self.misses = {}
+        self._lock = threading.Lock()
+
+        parent = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(parent, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, stage TEXT, value TEXT, size INTEGER,"
+                " created REAL, last_access REAL, source TEXT, category TEXT)"
+            )
+            # 旧版本建的表没有 source / category (来源 PDF 的哈希、报告类别，日报合并用)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+            for column in ("source", "category"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE results ADD COLUMN {column} TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_source ON results (source, created)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:  # 正常结束自动 commit，异常时 rollback
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, counter, stage):
+        with self._lock:
+            counter[stage] = counter.get(stage, 0) + 1
+
+    def get(self, key, stage="default"):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.max_age:
+                conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+                self._count(self.hits, stage)
+                return json.loads(row[0])
+            if row:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+        self._count(self.misses, stage)
+        return None
+
+    def set(self, key, value, stage="default", source=None, category=None):
+        """
+        source / category 为来源 PDF 的哈希与报告类别 (可选)，只用于日报合并 (见 iter_values)
+        """
+        text = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, stage, value, size, created, last_access, source, category)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, stage, text, len(text.encode("utf-8")), now, now, source, category)
+            )
+        self.evict()
+
+    def evict(self):
+        """
+        删除过期条目，并把总大小压回 max_bytes 以内；返回删除的条数
+        """
+        removed = 0
+        with self._connect() as conn:
+            removed += conn.execute("DELETE FROM results WHERE created < ?", (time.time() - self.max_age,)).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total > self.max_bytes:
+                for key, size in conn.execute("SELECT key, size FROM results ORDER BY last_access ASC").fetchall():
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    removed += 1
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+        return removed
+
+    def iter_values(self, stages, since=None, batch_size=50, latest_per_source=False):
+        """
+        按创建时间逐条返回 (created, stage, category, value)，分批读取，不会一次把所有结果载入内存 (日报合并用)
+        latest_per_source=True 时同一份 PDF (source) 只返回最新的一条 (换类别 / 模式重新生成过的不重复收录)；
+        没有记录 source 的旧条目全部返回
+        """
+        placeholders = ",".join("?" for _ in stages)
+        sql = (f"SELECT created, stage, category, value FROM results r WHERE stage IN ({placeholders})"
+               " AND created >= ?")
+        params = [*stages, since or 0]
+        if latest_per_source:
+            sql += (f" AND (source IS NULL OR created = (SELECT MAX(created) FROM results"
+                    f" WHERE source = r.source AND stage IN ({placeholders}) AND created >= ?))")
+            params += [*stages, since or 0]
+        with self._connect() as conn:
+            cursor = conn.execute(sql + " ORDER BY created", params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for created, stage, category, value in rows:
+                    yield created, stage, category, json.loads(value)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results")
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        with self._lock:
+            return {
+                "entries": entries,
+                "bytes": total,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+            }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """
+    进程内共享的缓存实例；config.RESULT_CACHE_ENABLED = False 时返回 None
+    """
+    global _shared_cache
+    if not config.RESULT_CACHE_ENABLED:
+        return None
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = ResultCache()
+    return _shared_cache
@@ -0,0 +1,267 @@
+# scheduler.py
+# AI 任务提交的集中调度：令牌桶限速 + 最大在途任务数 + 优先级通道 (interactive 网页用户优先于 batch 批量模式)
+# 后端返回 429 / 5xx 时自动退避：暂停所有提交一段时间 (有 Retry-After 时按它来)，同时把速率减半，
+# 之后每次提交成功逐步恢复 (AIMD)。进程内所有线程、所有事件循环共用一个实例
+# (同步调用都跑在 job_engine 共享的后台事件循环上，但 async 调用方也可能在自己的事件循环里使用 JobEngine，
+#  所以这里用线程锁 + 短间隔轮询，而不是 asyncio 的锁)
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+import config
+import metrics
+
+# 当前请求所在的优先级通道；批量模式 (batch_run.py) 设为 "batch"，其余默认 "interactive"
+priority_lane = contextvars.ContextVar("priority_lane", default="interactive")
+
+# 视为后端限流 / 过载、值得退避后重试的状态码
+THROTTLE_STATUS = (429, 500, 502, 503, 504)
+
+
+@contextmanager
+def lane_scope(lane):
+    token = priority_lane.set(lane)
+    try:
+        yield
+    finally:
+        priority_lane.reset(token)
+
+
+class SchedulerTimeout(Exception):
+    pass
+
+
+class Scheduler:
+    """
+    用法 (JobEngine 内部):
+        wait_sec = await scheduler.acquire("batch")        # 排队拿到令牌 + 在途名额
+        try: ... 提交、等待结果 ...
+        finally: scheduler.release()
+    排队规则：优先级高的通道 (config.AI_PRIORITY_LANES 中靠前的) 先走，同一通道先到先得；
+    例外：在途名额占满时，已经占着名额的重试 (need_slot=False) 可以越过前面只差名额的请求，
+    否则重试等前面的请求拿名额、前面的请求等重试释放名额，互相卡死到截止时间
+    """
+    def __init__(self, rate=None, burst=None, max_in_flight=None, lanes=None):
+        self.max_rate = rate or config.AI_SUBMIT_RATE
+        self.rate = self.max_rate
+        self.burst = burst or config.AI_SUBMIT_BURST
+        self.max_in_flight = max_in_flight or config.AI_MAX_IN_FLIGHT
+        self.lanes = dict(lanes or config.AI_PRIORITY_LANES)  # {通道: metadata.priority}
+        self._rank = {lane: i for i, lane in enumerate(self.lanes)}
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._in_flight = 0
+        self._queue = []  # 堆: (通道排名, 序号, 是否需要名额)
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._backoff = 0.0
+        self._adjusted = time.monotonic()  # 上次调整速率的时间
+        self._waits = {lane: deque(maxlen=500) for lane in self.lanes}
+        self._publish()
+
+    def lane(self, lane=None):
+        lane = lane or priority_lane.get()
+        return lane if lane in self.lanes else next(iter(self.lanes))
+
+    def priority(self, lane=None):
+        """
+        通道对应的 metadata.priority (写进提交的 payload)
+        """
+        return self.lanes[self.lane(lane)]
+
+    # ================= 排队 =================
+
+    def _refill(self, now):
+        self._tokens = min(float(self.burst), self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _blocked_by_queue(self, ticket):
+        """
+        前面还有请求时要排队；只有名额占满、且前面的请求都在等名额 (反正走不了) 时，不需要名额的请求可以先走
+        """
+        if self._queue[0] == ticket:
+            return False
+        if ticket[2] or self._in_flight < self.max_in_flight:
+            return True
+        return any(t < ticket and not t[2] for t in self._queue)
+
+    def _try_take(self, ticket, need_token, need_slot, now):
+        """
+        返回 0 表示已拿到；否则返回建议的等待秒数
+        """
+        if self._blocked_by_queue(ticket):
+            return config.AI_SCHEDULER_POLL_SEC
+        if now < self._paused_until:
+            return self._paused_until - now
+        if need_slot and self._in_flight >= self.max_in_flight:
+            return config.AI_SCHEDULER_POLL_SEC
+        self._refill(now)
+        if need_token and self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        if need_token:
+            self._tokens -= 1
+        if need_slot:
+            self._in_flight += 1
+        if self._queue[0] == ticket:
+            heapq.heappop(self._queue)
+        else:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+        return 0
+
+    def _publish(self):
+        # 调用方持有锁 (或在构造时)：把队列深度 / 在途数 / 当前速率写成指标
+        depth = {lane: 0 for lane in self.lanes}
+        lanes = list(self.lanes)
+        for rank, _, _ in self._queue:
+            depth[lanes[rank]] += 1
+        for lane, n in depth.items():
+            metrics.registry.set_gauge("ai_scheduler_queue_depth", n, lane=lane)
+        metrics.registry.set_gauge("ai_scheduler_in_flight", self._in_flight)
+        metrics.registry.set_gauge("ai_scheduler_rate", round(self.rate, 3))
+
+    async def acquire(self, lane=None, need_token=True, need_slot=True, deadline=None):
+        """
+        排队等待一个提交令牌 (need_token) 和在途名额 (need_slot)，返回排队秒数
+        deadline (time.monotonic()) 之前没排到时抛出 SchedulerTimeout
+        """
+        lane = self.lane(lane)
+        ticket = (self._rank[lane], next(self._seq), need_slot)
+        started = time.monotonic()
+        with self._lock:
+            heapq.heappush(self._queue, ticket)
+            self._publish()
+        try:
+            while True:
+                now = time.monotonic()
+                with self._lock:
+                    delay = self._try_take(ticket, need_token, need_slot, now)
+                    if delay == 0:
+                        self._publish()
+                        break
+                if deadline is not None and now + min(delay, config.AI_SCHEDULER_POLL_SEC) >= deadline:
+                    raise SchedulerTimeout()
+                await asyncio.sleep(min(max(delay, 0.001), config.AI_SCHEDULER_POLL_SEC))
+        except BaseException:
+            # 超时 / 被取消：把自己从队列里移除，别挡住后面的请求
+            with self._lock:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                self._publish()
+            raise
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._waits[lane].append(waited)
+        metrics.registry.count("ai_scheduler_acquired_total", lane=lane)
+        metrics.registry.count("ai_scheduler_wait_seconds_total", round(waited, 4), lane=lane)
+        return waited
+
+    def release(self):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._publish()
+
+    def try_token(self):
+        """
+        不排队，立即尝试拿一个令牌 (对冲请求用：限流时宁可不对冲)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._queue or now < self._paused_until:
+                return False
+            self._refill(now)
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    # ================= 退避 =================
+
+    def on_throttle(self, status, retry_after=None):
+        """
+        后端返回 429 / 5xx：暂停所有提交 (指数退避 + 抖动，或按 Retry-After)，速率减半
+        """
+        metrics.registry.count("ai_scheduler_throttled_total", status=str(status))
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                # 同一波限流里其他并发请求的 429：只按 Retry-After 延长暂停，不重复减速
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+                return
+            self._backoff = min(config.AI_THROTTLE_BACKOFF_MAX, max(config.AI_THROTTLE_BACKOFF_BASE, self._backoff * 2))
+            pause = retry_after if retry_after else self._backoff * random.uniform(0.5, 1.0)
+            self._paused_until = now + pause
+            self.rate = max(config.AI_THROTTLE_MIN_RATE, self.rate / 2)
+            self._adjusted = now + pause
+            self._tokens = min(self._tokens, 1.0)  # 暂停结束后不要一下子把积攒的令牌全用掉
+            rate = self.rate
+            self._publish()
+        print(f"🚦 后端限流 (HTTP {status})，暂停提交 {pause:.1f}s，速率降为 {rate:.2f}/s")
+
+    def on_success(self):
+        # 加性恢复：距上次调整每过 1 秒，速率加回上限的 AI_THROTTLE_RECOVERY 比例
+        with self._lock:
+            self._backoff = 0.0
+            now = time.monotonic()
+            if self.rate < self.max_rate:
+                gained = (now - self._adjusted) * self.max_rate * config.AI_THROTTLE_RECOVERY
+                self.rate = min(self.max_rate, self.rate + gained)
+                self._publish()
+            self._adjusted = now
+
+    def stats(self):
+        with self._lock:
+            lanes = list(self.lanes)
+            depth = {lane: 0 for lane in lanes}
+            for rank, _, _ in self._queue:
+                depth[lanes[rank]] += 1
+            waits = {lane: list(values) for lane, values in self._waits.items()}
+            return {
+                "in_flight": self._in_flight,
+                "rate": round(self.rate, 3),
+                "paused_sec": round(max(0.0, self._paused_until - time.monotonic()), 2),
+                "lanes": {lane: {"queued": depth[lane], "acquired": len(waits[lane]),
+                                 "wait_p50": _round(metrics.percentile(waits[lane], 50)),
+                                 "wait_p95": _round(metrics.percentile(waits[lane], 95))} for lane in lanes},
+            }
+
+
+def _round(value):
+    return None if value is None else round(value, 4)
+
+
+def retry_after_seconds(resp):
+    """
+    解析 Retry-After 头 (秒数)；没有或无法解析时返回 None
+    """
+    try:
+        return min(config.AI_THROTTLE_BACKOFF_MAX, float(resp.headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_scheduler():
+    """
+    进程内共享的调度器；config.AI_SCHEDULER_ENABLED = False 时返回 None (不限速、不退避)
+    """
+    global _shared
+    if not config.AI_SCHEDULER_ENABLED:
+        return None
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = Scheduler()
+    return _shared
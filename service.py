@@ -0,0 +1,214 @@
+# service.py
+# 流水线 HTTP 服务：提交 / 查询状态 / 下载。任务、进度和生成的 Word 都在 report_queue 的任务表 (本地 SQLite，WAL 模式) 里，
+# 这个服务是任务表的唯一入口 (有状态，只能部署在一台机器上；同机的多个进程可以共用任务表)。
+# 生成 (读取 PDF、两步 AI、资金流字段过滤、文件命名、Word 渲染) 由 worker 执行：worker 可以跑在 API 进程里、
+# 同机的单独进程里 (直接读写任务表)，或者任意其他机器上 (--queue-url，通过下面的 /worker 接口领取任务、回传结果，
+# 本身不保存任何状态，可以随时增减)。不要把 SQLite 任务表放到共享盘上给多台机器直接打开：WAL 不支持网络文件系统
+#
+# /metrics 只包含本进程的指标；单独的 worker 进程设置 METRICS_PORT 后各自提供 /metrics
+#
+#   python service.py --port 8000                   # API + 本进程 worker
+#   SERVICE_RUN_WORKERS=0 python service.py         # 只提供 API
+#   python service.py --worker-only --workers 8     # 同机 worker，直接读写任务表
+#   python service.py --worker-only --queue-url http://api-host:8000   # 其他机器上的 worker
+#
+#   curl -F pdf=@report.pdf -F category=Equity -F user_name=Charlotte http://127.0.0.1:8000/reports
+#   curl http://127.0.0.1:8000/reports/<id>
+#   curl -OJ http://127.0.0.1:8000/reports/<id>/download
+import sys
+import hmac
+import base64
+import argparse
+import threading
+from urllib.parse import quote
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Depends, FastAPI, File, Form, Header, HTTPException, Query, UploadFile
+from fastapi.responses import PlainTextResponse, Response
+import config
+import metrics
+from pipeline import PIPELINE_MODES, REPORT_CATEGORIES
+from report_queue import STATUS_DONE, get_shared_queue, start_workers
+from service_client import RemoteQueue
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if config.SERVICE_RUN_WORKERS:
+        start_workers()
+    yield
+
+
+app = FastAPI(title="AI 研报生成服务", lifespan=lifespan)
+
+
+def _read_upload(upload, label):
+    limit = config.SERVICE_MAX_UPLOAD_MB * 1024 * 1024
+    data = upload.file.read(limit + 1)
+    if len(data) > limit:
+        raise HTTPException(413, f"{label}超过 {config.SERVICE_MAX_UPLOAD_MB}MB")
+    return data
+
+
+def _job_view(job):
+    # 状态接口的返回：任务表的摘要字段 + 完成后的下载地址
+    job = dict(job)
+    job["download_url"] = f"/reports/{job['id']}/download" if job["status"] == STATUS_DONE else None
+    return job
+
+
+@app.post("/reports", status_code=202)
+def submit_report(pdf: UploadFile = File(...), category: str = Form(...), user_name: str = Form(...),
+                  owner: str = Form(None), mode: str = Form(None), image: UploadFile = File(None)):
+    """
+    提交一份 PDF，返回任务状态 (含 id)；同一用户相同的任务还在排队或运行时返回已有任务
+    """
+    if category not in REPORT_CATEGORIES:
+        raise HTTPException(422, f"未知的报告类别 '{category}' (可选: {', '.join(REPORT_CATEGORIES)})")
+    if mode and mode not in PIPELINE_MODES:
+        raise HTTPException(422, f"未知的流水线模式 '{mode}' (可选: {', '.join(PIPELINE_MODES)})")
+    pdf_bytes = _read_upload(pdf, "PDF ")
+    if not pdf_bytes.startswith(b"%PDF"):
+        raise HTTPException(422, "上传的文件不是 PDF")
+    image_bytes = _read_upload(image, "封面图") if image is not None else None
+
+    queue = get_shared_queue()
+    job_id = queue.enqueue(pdf_bytes, category, user_name, pdf.filename or "report.pdf", image=image_bytes or None,
+                           mode=mode or None, owner=owner or None)
+    return _job_view(queue.get(job_id))
+
+
+@app.get("/reports")
+def list_reports(owner: str, limit: int = Query(20, ge=1, le=100)):
+    return [_job_view(job) for job in get_shared_queue().list_jobs(owner, limit=limit)]
+
+
+@app.get("/reports/{job_id}")
+def report_status(job_id: str):
+    job = get_shared_queue().get(job_id)
+    if job is None:
+        raise HTTPException(404, "任务不存在")
+    return _job_view(job)
+
+
+@app.get("/reports/{job_id}/download")
+def download_report(job_id: str):
+    queue = get_shared_queue()
+    docx_bytes, filename = queue.fetch_docx(job_id)
+    if docx_bytes is None:
+        job = queue.get(job_id)
+        if job is None:
+            raise HTTPException(404, "任务不存在")
+        raise HTTPException(409, f"任务尚未完成 (状态: {job['status']})")
+    return Response(docx_bytes, media_type=DOCX_MIME,
+                    headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"})
+
+
+@app.get("/healthz")
+def health():
+    return {"ok": True, "jobs": get_shared_queue().counts()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus():
+    # 只有本进程 (API + 进程内 worker) 的指标
+    return metrics.registry.render_prometheus()
+
+
+# ================= 远程 worker 接口 (service_client.RemoteQueue) =================
+
+def _check_worker_token(x_worker_token: str = Header(None)):
+    expected = config.SERVICE_WORKER_TOKEN
+    if expected and not hmac.compare_digest(x_worker_token or "", expected):
+        raise HTTPException(401, "worker 口令错误")
+
+
+worker_api = APIRouter(prefix="/worker", dependencies=[Depends(_check_worker_token)])
+
+
+@worker_api.post("/claim")
+def worker_claim(worker: str = Form(...)):
+    task = get_shared_queue().claim_next(worker)
+    if task is None:
+        return Response(status_code=204)
+    task["pdf"] = base64.b64encode(task["pdf"]).decode("ascii")
+    task["image"] = base64.b64encode(task["image"]).decode("ascii") if task["image"] else None
+    return task
+
+
+@worker_api.post("/heartbeat")
+def worker_heartbeat(worker: str = Form(...)):
+    get_shared_queue().heartbeat(worker)
+    return {"ok": True}
+
+
+@worker_api.post("/jobs/{job_id}/stage")
+def worker_stage(job_id: str, worker: str = Form(...), stage: str = Form(...)):
+    get_shared_queue().set_stage(job_id, worker, stage)
+    return {"ok": True}
+
+
+@worker_api.post("/jobs/{job_id}/finish")
+def worker_finish(job_id: str, worker: str = Form(...), filename: str = Form(...), docx: UploadFile = File(...)):
+    return {"written": get_shared_queue().finish(job_id, worker, docx.file.read(), filename)}
+
+
+@worker_api.post("/jobs/{job_id}/fail")
+def worker_fail(job_id: str, worker: str = Form(...), stage: str = Form(...), error: str = Form(...)):
+    return {"written": get_shared_queue().fail(job_id, worker, stage, error)}
+
+
+@worker_api.post("/requeue")
+def worker_requeue():
+    return {"requeued": get_shared_queue().requeue_stale()}
+
+
+@worker_api.post("/purge")
+def worker_purge():
+    return {"purged": get_shared_queue().purge()}
+
+
+@worker_api.get("/jobs/{job_id}/backend_jobs/{prompt_key}")
+def worker_lookup_backend_job(job_id: str, prompt_key: str):
+    return {"backend_job_id": get_shared_queue().lookup_backend_job(job_id, prompt_key)}
+
+
+@worker_api.put("/jobs/{job_id}/backend_jobs/{prompt_key}")
+def worker_record_backend_job(job_id: str, prompt_key: str, backend_job_id: str = Form(...)):
+    get_shared_queue().record_backend_job(job_id, prompt_key, backend_job_id)
+    return {"ok": True}
+
+
+app.include_router(worker_api)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI 研报生成 HTTP 服务")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, help="本进程的 worker 线程数 (默认 config.REPORT_QUEUE_WORKERS)")
+    parser.add_argument("--worker-only", action="store_true", help="不提供 API，只执行队列里的任务")
+    parser.add_argument("--queue-url", default=config.SERVICE_QUEUE_URL,
+                        help="通过这个地址的流水线服务领取任务 (其他机器上的 worker)；默认直接读写本机任务表")
+    args = parser.parse_args(argv)
+
+    if args.worker_only:
+        metrics.start_metrics_server()
+        workers = start_workers(args.workers, queue=RemoteQueue(args.queue_url) if args.queue_url else None)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            workers.stop(timeout=5)
+        return 0
+
+    if args.workers:
+        config.REPORT_QUEUE_WORKERS = args.workers
+    import uvicorn
+
+    uvicorn.run(app, host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
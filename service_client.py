@@ -0,0 +1,124 @@
+# service_client.py
+# 流水线 HTTP 服务 (service.py) 的客户端：方法与 report_queue.ReportQueue 中网页用到的部分一致 (enqueue / get / list_jobs /
+# fetch_docx)，app.py 在设置了 config.PIPELINE_SERVICE_URL 时用它代替本地队列，页面本身不再执行任何生成；
+# RemoteQueue 是 worker 一侧的客户端 (领取任务、更新进度、回传结果)，让 worker 跑在 API 以外的机器上
+import base64
+from urllib.parse import quote, unquote
+import config
+
+
+class ServiceError(Exception):
+    pass
+
+
+class ServiceClient:
+    """
+    线程安全 (requests.Session 的连接池可以跨线程复用)；一个进程共用一个实例即可
+    """
+    def __init__(self, base_url=None, timeout=None):
+        # 延迟导入 requests：只导入本模块不需要加载它
+        import requests
+
+        self.base_url = (base_url or config.PIPELINE_SERVICE_URL).rstrip("/")
+        self.timeout = timeout or config.SERVICE_CLIENT_TIMEOUT
+        self.session = requests.Session()
+        self._errors = (requests.RequestException, ValueError)
+
+    def _call(self, method, path, allow=(), **kwargs):
+        try:
+            resp = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        except self._errors as e:
+            raise ServiceError(f"无法连接流水线服务: {e}")
+        if resp.status_code >= 400 and resp.status_code not in allow:
+            try:
+                detail = resp.json().get("detail")
+            except ValueError:
+                detail = resp.text[:200]
+            raise ServiceError(f"流水线服务返回 HTTP {resp.status_code}: {detail}")
+        return resp
+
+    def enqueue(self, pdf_bytes, category, user_name, source_name, image=None, mode=None, owner=None):
+        """
+        提交任务，返回任务 ID
+        """
+        files = {"pdf": (source_name, pdf_bytes, "application/pdf")}
+        if image:
+            files["image"] = ("image", image, "application/octet-stream")
+        data = {"category": category, "user_name": user_name}
+        if mode:
+            data["mode"] = mode
+        if owner:
+            data["owner"] = owner
+        return self._call("POST", "/reports", files=files, data=data).json()["id"]
+
+    def get(self, job_id):
+        resp = self._call("GET", f"/reports/{job_id}", allow=(404,))
+        return None if resp.status_code == 404 else resp.json()
+
+    def list_jobs(self, owner, limit=20):
+        return self._call("GET", "/reports", params={"owner": owner, "limit": limit}).json()
+
+    def fetch_docx(self, job_id):
+        """
+        返回 (docx 字节, 文件名)；任务未完成或不存在时返回 (None, None)
+        """
+        resp = self._call("GET", f"/reports/{job_id}/download", allow=(404, 409))
+        if resp.status_code != 200:
+            return None, None
+        disposition = resp.headers.get("Content-Disposition", "")
+        filename = unquote(disposition.split("filename*=UTF-8''", 1)[-1]) if "filename*=" in disposition else None
+        return resp.content, filename or f"{job_id}.docx"
+
+
+class RemoteQueue(ServiceClient):
+    """
+    通过流水线服务的 /worker 接口访问任务表，方法与 report_queue.ReportQueue 中 QueueWorkers 用到的部分一致
+        QueueWorkers(RemoteQueue("http://api-host:8000")).start()
+    """
+    errors = (ServiceError,)
+
+    def __init__(self, base_url=None, timeout=None, token=None):
+        super().__init__(base_url or config.SERVICE_QUEUE_URL, timeout)
+        self.path = self.base_url  # 启动日志里显示任务表的位置
+        token = token or config.SERVICE_WORKER_TOKEN
+        if token:
+            self.session.headers["X-Worker-Token"] = token
+
+    def claim_next(self, worker):
+        resp = self._call("POST", "/worker/claim", data={"worker": worker})
+        if resp.status_code == 204:
+            return None
+        task = resp.json()
+        task["pdf"] = base64.b64decode(task["pdf"])
+        task["image"] = base64.b64decode(task["image"]) if task["image"] else None
+        return task
+
+    def set_stage(self, job_id, worker, stage):
+        self._call("POST", f"/worker/jobs/{job_id}/stage", data={"worker": worker, "stage": stage})
+
+    def heartbeat(self, worker):
+        self._call("POST", "/worker/heartbeat", data={"worker": worker})
+
+    def finish(self, job_id, worker, docx_bytes, filename):
+        files = {"docx": (filename, docx_bytes, "application/octet-stream")}
+        data = {"worker": worker, "filename": filename}
+        return self._call("POST", f"/worker/jobs/{job_id}/finish", files=files, data=data).json()["written"]
+
+    def fail(self, job_id, worker, stage, error):
+        data = {"worker": worker, "stage": stage, "error": error}
+        return self._call("POST", f"/worker/jobs/{job_id}/fail", data=data).json()["written"]
+
+    def requeue_stale(self, stale_sec=None, max_attempts=None):
+        # 按 API 一侧的配置判断超时和重试次数
+        return self._call("POST", "/worker/requeue").json()["requeued"]
+
+    def purge(self, keep_days=None):
+        return self._call("POST", "/worker/purge").json()["purged"]
+
+    def lookup_backend_job(self, job_id, prompt_key):
+        resp = self._call("GET", f"/worker/jobs/{job_id}/backend_jobs/{quote(prompt_key)}")
+        return resp.json()["backend_job_id"]
+
+    def record_backend_job(self, job_id, prompt_key, backend_job_id):
+        self._call("PUT", f"/worker/jobs/{job_id}/backend_jobs/{quote(prompt_key)}",
+                   data={"backend_job_id": backend_job_id})
@@ -0,0 +1,192 @@
+# single_flight.py
+# 相同 AI 阶段的请求合并 (single-flight)：研报一发布，几位分析师几分钟内会上传同一份 PDF，
+# 同一个 (阶段, 输入哈希, Prompt, 模型) 正在运行时，后来的请求不再提交新任务，而是等待那一份的结果
+# 进程内：同一个键只有一个线程执行，其余线程等待 Event；
+# 跨进程：在结果缓存的 SQLite 文件里登记「谁在跑」(inflight 表)，领跑的进程把结果写入缓存后再注销，等待方从缓存取结果
+import os
+import copy
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+import dataclasses
+from contextlib import contextmanager
+import config
+import metrics
+from job_engine import JobResult, remaining_budget
+
+BUDGET_ERROR = "超出报告时间预算 (等待相同任务)"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # 没有权限发信号，但进程存在
+    return True
+
+
+class InflightStore:
+    """
+    跨进程的登记表：key 为主键，同一时刻只有一个进程能登记成功
+    登记超过 expires，或登记它的进程 (同一台机器上) 已退出，都视为失效，可以被接管
+    """
+    def __init__(self, path=None):
+        self.path = path or config.RESULT_CACHE_PATH
+        self.host = socket.gethostname()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS inflight ("
+                " key TEXT PRIMARY KEY, owner TEXT, host TEXT, pid INTEGER, started REAL, expires REAL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:  # 正常结束自动 commit，异常时 rollback
+                yield conn
+        finally:
+            conn.close()
+
+    def _valid(self, row):
+        _, host, pid, expires = row
+        if expires < time.time():
+            return False
+        return host != self.host or _pid_alive(pid)
+
+    def claim(self, key, owner, ttl):
+        """
+        尝试登记为 key 的执行者；已有有效登记时返回 False
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT owner, host, pid, expires FROM inflight WHERE key = ?", (key,)).fetchone()
+            if row and not self._valid(row):
+                conn.execute("DELETE FROM inflight WHERE key = ? AND owner = ?", (key, row[0]))
+            now = time.time()
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO inflight (key, owner, host, pid, started, expires) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, owner, self.host, os.getpid(), now, now + ttl)
+            )
+            return cursor.rowcount == 1
+
+    def running(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT owner, host, pid, expires FROM inflight WHERE key = ?", (key,)).fetchone()
+        return bool(row) and self._valid(row)
+
+    def release(self, key, owner):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM inflight WHERE key = ? AND owner = ?", (key, owner))
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    """
+    用法:
+        result = flights.run(key, execute, stage="step1", cache=cache)
+    execute() 实际提交 AI 任务，成功时自己把结果写入 cache (跨进程的等待方从 cache 取)；
+    合并得到的结果 extra["coalesced"] 为 "process" (同进程) 或 "cross_process"
+    """
+    def __init__(self, store=None):
+        self.store = store
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.saved = {}  # {(阶段, 范围): 省下的任务数}
+
+    def _count_saved(self, stage, scope):
+        with self._lock:
+            self.saved[(stage, scope)] = self.saved.get((stage, scope), 0) + 1
+        metrics.registry.count("ai_jobs_coalesced_total", stage=stage, scope=scope)
+
+    def stats(self):
+        with self._lock:
+            return {"running": len(self._flights),
+                    "saved": {f"{stage}/{scope}": n for (stage, scope), n in sorted(self.saved.items())}}
+
+    def run(self, key, execute, stage="default", cache=None):
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+            if leader:
+                try:
+                    flight.result = self._lead(key, execute, stage, cache)
+                    return flight.result
+                finally:
+                    with self._lock:
+                        self._flights.pop(key, None)
+                    flight.done.set()
+
+            print(f"🔗 相同的 {stage} 任务正在运行，等待其结果...")
+            budget = remaining_budget()
+            if not flight.done.wait(None if budget is None else max(0.0, budget)):
+                return JobResult(False, error=BUDGET_ERROR)
+            result = flight.result
+            if result is not None and result.ok:
+                self._count_saved(stage, "process")
+                # 返回副本：各报告之后会各自修改日期等字段
+                return dataclasses.replace(result, data=copy.deepcopy(result.data),
+                                           extra=dict(result.extra, coalesced="process"))
+            # 领跑者失败 (可能只是它自己的预算用完)：重新来过，由某一个等待者接手执行
+
+    def _lead(self, key, execute, stage, cache):
+        if self.store is None or cache is None:
+            return execute()
+        owner = uuid.uuid4().hex
+        waited = False
+        while True:
+            budget = remaining_budget()
+            ttl = budget if budget is not None else config.AI_REPORT_BUDGET_DEFAULT
+            if self.store.claim(key, owner, max(1.0, ttl) + config.SINGLE_FLIGHT_POLL_SEC):
+                try:
+                    return execute()
+                finally:
+                    self.store.release(key, owner)
+
+            # 其他进程正在执行：等它注销登记，再从结果缓存取
+            if not waited:
+                print(f"🔗 其他进程正在运行相同的 {stage} 任务，等待其结果...")
+                waited = True
+            while self.store.running(key):
+                budget = remaining_budget()
+                if budget is not None and budget <= 0:
+                    return JobResult(False, error=BUDGET_ERROR)
+                time.sleep(config.SINGLE_FLIGHT_POLL_SEC)
+            data = cache.get(key, stage=stage)
+            if data is not None:
+                self._count_saved(stage, "cross_process")
+                return JobResult(True, data=data, extra={"cache_hit": True, "coalesced": "cross_process"})
+            # 对方没有得到结果 (失败 / 进程退出)：自己登记执行
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_flights():
+    """
+    进程内共享的实例；config.SINGLE_FLIGHT_ENABLED = False 时返回 None
+    跨进程合并需要结果缓存 (RESULT_CACHE_ENABLED) 来传递结果
+    """
+    global _shared
+    if not config.SINGLE_FLIGHT_ENABLED:
+        return None
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                cross = config.SINGLE_FLIGHT_CROSS_PROCESS and config.RESULT_CACHE_ENABLED
+                _shared = SingleFlight(InflightStore() if cross else None)
+    return _shared
@@ -0,0 +1,175 @@
+# step2_batch.py
+# Step 2 跨文档批处理：Step 2 只是格式化 / 翻译，生成本身很快，单独提交时大部分时间花在提交、排队和轮询上
+# 同一 Prompt (同一类别) 的请求在 STEP2_BATCH_WINDOW_SEC 内攒成一批，按 Prompt 大小预算切分后一个任务提交，
+# 结果按文档 ID 拆回；某份文档的部分缺失或无法解析时由调用方单独重试 (见 pipeline.call_step2)
+import threading
+import contextvars
+import config
+import json_repair
+import metrics
+from job_engine import JobResult, job_journal, run_many_sync
+
+BATCH_NOTE = """
+
+# Batch Notice
+The INPUT DATA below contains {count} independent documents. Each one starts with a line "=== DOCUMENT <ID> ===".
+Apply the instructions above to EACH document separately; never mix content between documents.
+Output ONE JSON object whose keys are the document IDs and whose values are the complete Output Schema object for that document:
+{{"D1": {{ ... }}, "D2": {{ ... }}}}
+"""
+
+DOC_HEADER = "=== DOCUMENT {doc_id} ==="
+
+
+def doc_id(index):
+    return f"D{index + 1}"
+
+
+def build_batch_input(contents):
+    return "\n\n".join(f"{DOC_HEADER.format(doc_id=doc_id(i))}\n{c}" for i, c in enumerate(contents))
+
+
+def split_batch_output(output, count):
+    """
+    按文档 ID 拆分批任务的输出，返回长度为 count 的列表 (缺失或无法解析的位置为 None)
+    输出被截断时 json_repair 会保留前面完整的文档
+    """
+    data = output
+    if isinstance(data, dict) and doc_id(0) not in data:
+        data = data.get("content") or data.get("output") or data.get("result")
+    if not isinstance(data, dict):
+        try:
+            data, repaired = json_repair.loads(str(data))
+        except ValueError:
+            return [None] * count
+        if repaired:
+            print("🩹 批处理返回的 JSON 格式有误，已在本地修复")
+    if not isinstance(data, dict):
+        return [None] * count
+    sections = [data.get(doc_id(i)) for i in range(count)]
+    return [s if isinstance(s, dict) else None for s in sections]
+
+
+def pack(items, system_prompt, max_chars, max_docs):
+    """
+    按 Prompt 大小预算把请求切成若干批 (保持顺序)；单个就超出预算的请求自成一批
+    """
+    base = len(system_prompt) + len(BATCH_NOTE) + 16
+    batches, current, size = [], [], base
+    for item in items:
+        cost = len(item.content) + len(DOC_HEADER) + 8
+        if current and (size + cost > max_chars or len(current) >= max_docs):
+            batches.append(current)
+            current, size = [], base
+        current.append(item)
+        size += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+class _Item:
+    def __init__(self, content):
+        self.content = content
+        self.context = contextvars.copy_context()  # 报告的截止时间、指标上下文
+        self.done = threading.Event()
+        self.result = None
+
+
+class _Group:
+    def __init__(self):
+        self.items = []
+        self.chars = 0
+        self.flushed = False
+
+
+class Step2Batcher:
+    """
+    线程安全的攒批器：
+        result = batcher.run(system_prompt, step1_json)   # 阻塞到所在批次完成
+    返回本文档的 JobResult；返回 None 表示这一批只有它自己，由调用方按普通任务提交
+    """
+    def __init__(self, window=None, max_chars=None, max_docs=None):
+        self.window = config.STEP2_BATCH_WINDOW_SEC if window is None else window
+        self.max_chars = max_chars or config.STEP2_BATCH_MAX_CHARS
+        self.max_docs = max_docs or config.STEP2_BATCH_MAX_DOCS
+        self.lock = threading.Lock()
+        self.groups = {}  # system_prompt -> 正在攒的 _Group
+
+    def run(self, system_prompt, user_content):
+        item = _Item(user_content)
+        with self.lock:
+            group = self.groups.get(system_prompt)
+            if group is None:
+                group = self.groups[system_prompt] = _Group()
+                timer = threading.Timer(self.window, self._flush, args=(system_prompt, group))
+                timer.daemon = True
+                timer.start()
+            group.items.append(item)
+            group.chars += len(user_content)
+            full = len(group.items) >= self.max_docs or group.chars >= self.max_chars
+        if full:
+            # 攒够了就在当前线程立即提交，不等窗口结束
+            self._flush(system_prompt, group)
+        item.done.wait()
+        return item.result
+
+    def _flush(self, system_prompt, group):
+        with self.lock:
+            if group.flushed:
+                return
+            group.flushed = True
+            if self.groups.get(system_prompt) is group:
+                del self.groups[system_prompt]
+
+        batches = pack(group.items, system_prompt, self.max_chars, self.max_docs)
+        runnable = [b for b in batches if len(b) > 1]
+        try:
+            if runnable:
+                # 截止时间、指标上下文沿用这一批的第一份文档
+                runnable[0][0].context.copy().run(self._execute, system_prompt, runnable)
+        except Exception as e:
+            for batch in runnable:
+                for item in batch:
+                    item.result = JobResult(False, error=f"批处理失败: {e}")
+        finally:
+            for item in group.items:
+                item.done.set()
+
+    def _execute(self, system_prompt, batches):
+        job_journal.set(None)  # 批任务不属于任何一份报告的任务日志
+        requests = [(system_prompt + BATCH_NOTE.format(count=len(batch)),
+                     build_batch_input([item.content for item in batch])) for batch in batches]
+        print(f"📦 Step 2 批处理: {sum(len(b) for b in batches)} 份文档合并为 {len(batches)} 个任务")
+        results = run_many_sync(requests)
+        for batch, result in zip(batches, results):
+            metrics.registry.count("step2_batches_total", status="ok" if result.ok else "failed")
+            metrics.registry.count("step2_batch_docs_total", value=len(batch))
+            sections = split_batch_output(result.output, len(batch)) if result.ok else [None] * len(batch)
+            extra = dict(result.extra, batch_size=len(batch))
+            for item, section in zip(batch, sections):
+                if section is None:
+                    error = result.error if not result.ok else "批处理结果中缺少本文档或无法解析"
+                    item.result = JobResult(False, error=error, job_id=result.job_id, polls=result.polls,
+                                            elapsed=result.elapsed, extra=extra)
+                else:
+                    item.result = JobResult(True, data=section, job_id=result.job_id, polls=result.polls,
+                                            elapsed=result.elapsed, extra=extra)
+
+
+_shared_batcher = None
+_shared_batcher_lock = threading.Lock()
+
+
+def get_shared_batcher():
+    """
+    进程内共享的攒批器；config.STEP2_BATCH_ENABLED 关闭时返回 None
+    """
+    global _shared_batcher
+    if not config.STEP2_BATCH_ENABLED:
+        return None
+    if _shared_batcher is None:
+        with _shared_batcher_lock:
+            if _shared_batcher is None:
+                _shared_batcher = Step2Batcher()
+    return _shared_batcher
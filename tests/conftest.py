@@ -0,0 +1,36 @@
+# tests/conftest.py
+# 测试共用的夹具：仓库根目录加入 sys.path (模块都在根目录)；mock_ai 在本地启动模拟 AI 服务并把共享客户端指向它
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def mock_ai(monkeypatch, tmp_path):
+    """
+    模拟 AI 服务 (benchmarks/mock_server.py)：关闭结果缓存、跨进程去重和指标日志，避免测试之间互相影响
+    """
+    import config
+    import ai_client
+    import scheduler
+    from benchmarks.mock_server import MockAIServer
+
+    server = MockAIServer(latency=0, jitter=0, seed=0).start()
+    monkeypatch.setattr(config, "AUTH_URL", server.auth_url)
+    monkeypatch.setattr(config, "API_BASE_URL", server.api_base_url)
+    # 凭据可能还没加载 (第一次访问时才读 Streamlit secrets)，直接写进模块字典
+    monkeypatch.setitem(vars(config), "CLIENT_ID", "test")
+    monkeypatch.setitem(vars(config), "CLIENT_SECRET", "test")
+    monkeypatch.setattr(config, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "SINGLE_FLIGHT_ENABLED", False)
+    monkeypatch.setattr(config, "METRICS_LOG_PATH", "")
+    monkeypatch.setattr(config, "FIGURE_AUTO_EXTRACT", False)
+    monkeypatch.setattr(ai_client, "_shared_client", None)
+    monkeypatch.setattr(scheduler, "_shared", None)
+    monkeypatch.chdir(tmp_path)
+    yield server
+    server.stop()
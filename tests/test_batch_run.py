@@ -0,0 +1,69 @@
+# tests/test_batch_run.py
+import os
+import json
+import time
+from datetime import datetime
+import batch_run
+from benchmarks.fixtures import make_fund_flow_pdf, make_report_pdf
+from pipeline import FUND_FLOW_CATEGORY, build_filename
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_output_names_add_suffix_on_collision():
+    names = batch_run.OutputNames()
+    assert names.claim("Equity_A_GS_report.docx") == "Equity_A_GS_report.docx"
+    assert names.claim("Equity_A_GS_report.docx") == "Equity_A_GS_report_2.docx"
+    assert names.claim("equity_a_gs_report.docx") == "equity_a_gs_report_3.docx"
+    assert names.claim("Equity_A_GS_other.docx") == "Equity_A_GS_other.docx"
+
+
+def test_fund_flow_filename_uses_institution():
+    gs = build_filename(FUND_FLOW_CATEGORY, "A", {"meta": {"institution": "Goldman Sachs"}}, "gs.pdf")
+    ms = build_filename(FUND_FLOW_CATEGORY, "A", {"meta": {"institution": "Morgan Stanley"}}, "ms.pdf")
+    assert "_GS_" in gs and "_MS_" in ms
+
+
+def test_batch_outputs_do_not_overwrite_each_other(mock_ai, tmp_path):
+    tasks = [
+        {"file": _write(tmp_path / "in" / "gs_flows.pdf", make_fund_flow_pdf(2, seed=1)),
+         "category": FUND_FLOW_CATEGORY, "user_name": "A"},
+        {"file": _write(tmp_path / "in" / "ms_flows.pdf", make_fund_flow_pdf(2, seed=2, institution="Morgan Stanley")),
+         "category": FUND_FLOW_CATEGORY, "user_name": "A"},
+        {"file": _write(tmp_path / "in" / "gs_flows_2.pdf", make_fund_flow_pdf(2, seed=3)),
+         "category": FUND_FLOW_CATEGORY, "user_name": "A"},
+        # 不同目录下同名的 PDF
+        {"file": _write(tmp_path / "a" / "note.pdf", make_report_pdf(2, seed=1)), "category": "Equity", "user_name": "A"},
+        {"file": _write(tmp_path / "b" / "note.pdf", make_report_pdf(2, seed=2)), "category": "Equity", "user_name": "A"},
+    ]
+    out = tmp_path / "out"
+    summary = batch_run.run_batch(tasks, str(out), workers=5, save_json=True)
+
+    assert summary["succeeded"] == len(tasks)
+    outputs = [r["output"] for r in summary["results"]]
+    assert len(set(outputs)) == len(tasks)
+    assert all(os.path.isfile(path) for path in outputs)
+    assert sum(1 for r in summary["results"] if r.get("renamed_from")) == 2
+    sources = set()
+    for r in summary["results"]:
+        with open(r["json"], encoding="utf-8") as f:
+            sources.add(json.load(f)["source"])
+    assert sources == {task["file"] for task in tasks}
+
+
+def test_summary_started_at_is_batch_start(tmp_path, monkeypatch):
+    def slow(task, output_dir, mode=None, save_json=False, names=None):
+        time.sleep(2.5)
+        return {"file": task["file"], "status": "ok"}
+
+    monkeypatch.setattr(batch_run, "process_one", slow)
+    before = datetime.now().replace(microsecond=0)
+    summary = batch_run.run_batch([{"file": "a.pdf"}], str(tmp_path))
+    # 记录的是开始时间，而不是整批跑完的时间
+    started_at = datetime.strptime(summary["started_at"], "%Y-%m-%d %H:%M:%S")
+    assert 0 <= (started_at - before).total_seconds() <= 1
@@ -0,0 +1,93 @@
+# tests/test_chunking.py
+import config
+import chunking
+import pipeline
+from benchmarks.mock_server import CANNED_WSH_STEP1
+
+
+def _report(sections=6, lines=20):
+    parts = []
+    for s in range(sections):
+        parts.append(f"{s + 1}. Section {s + 1}")
+        parts.extend(f"Paragraph {s + 1}.{i} about revenue, margins and valuation." for i in range(lines))
+    return "\n".join(parts)
+
+
+def test_should_chunk_modes(monkeypatch):
+    monkeypatch.setattr(config, "STEP1_CHUNK_THRESHOLD", 100)
+    monkeypatch.setattr(config, "STEP1_CHUNK_MODE", "auto")
+    assert not chunking.should_chunk("x" * 100)
+    assert chunking.should_chunk("x" * 101)
+    monkeypatch.setattr(config, "STEP1_CHUNK_MODE", "off")
+    assert not chunking.should_chunk("x" * 1000)
+    monkeypatch.setattr(config, "STEP1_CHUNK_MODE", "on")
+    assert chunking.should_chunk("x")
+
+
+def test_split_text_respects_size_and_keeps_every_line():
+    text = _report()
+    chunks = chunking.split_text(text, max_chars=1500, overlap=200)
+    assert len(chunks) > 1
+    assert all(len(c) <= 1500 for c in chunks)
+    lines = set(line for c in chunks for line in c.splitlines())
+    assert lines == set(text.splitlines())
+
+
+def test_split_text_prefers_section_boundaries_and_overlaps():
+    text = _report(sections=4, lines=10)
+    section = len("\n".join(text.splitlines()[:11]))
+    chunks = chunking.split_text(text, max_chars=section * 2 + 150, overlap=150)
+    # 除了带过来的重叠行，每块都从章节标题开始
+    for prev, chunk in zip(chunks, chunks[1:]):
+        head = chunk.splitlines()
+        overlap = [line for line in head if line in prev.splitlines()]
+        assert overlap and head[:len(overlap)] == overlap
+        assert chunking.HEADING_RE.match(head[len(overlap)])
+
+
+def test_split_text_breaks_long_section_by_lines():
+    text = "KEY RISKS\n" + "\n".join("risk line %03d %s" % (i, "x" * 40) for i in range(100))
+    chunks = chunking.split_text(text, max_chars=800, overlap=0)
+    assert len(chunks) > 1 and all(len(c) <= 800 for c in chunks)
+    assert "\n".join(chunks) == text
+
+
+def test_merge_step1_combines_partials():
+    first = {
+        "meta": {"institution": "Goldman Sachs", "analyst": ""},
+        "stock": {"ticker": "0700.HK", "rating": "Buy"},
+        "content_raw": {"thesis_summary": "Cloud re-accelerates.", "drivers": ["Gaming", "Ads"],
+                        "financial_outlook": ""},
+    }
+    second = {
+        "meta": {"institution": "GS Research", "analyst": "Jane Doe"},
+        "stock": {"ticker": "", "rating": "Sell"},
+        "content_raw": {"thesis_summary": "Cloud re-accelerates.", "drivers": ["Ads", "Cloud margin"],
+                        "financial_outlook": "FY26 growth of 8-10%.", "risks": ["Regulation"]},
+    }
+    merged = chunking.merge_step1([first, None, second])
+    # 标量取最靠前的非空值，列表去重拼接，长文本拼接且去掉重叠造成的重复段落
+    assert merged["meta"] == {"institution": "Goldman Sachs", "analyst": "Jane Doe"}
+    assert merged["stock"] == {"ticker": "0700.HK", "rating": "Buy"}
+    assert merged["content_raw"]["drivers"] == ["Gaming", "Ads", "Cloud margin"]
+    assert merged["content_raw"]["thesis_summary"] == "Cloud re-accelerates."
+    assert merged["content_raw"]["financial_outlook"] == "FY26 growth of 8-10%."
+    assert merged["content_raw"]["risks"] == ["Regulation"]
+    assert chunking.merge_step1([None, "oops"]) is None
+
+
+def test_merge_step1_concatenates_distinct_text():
+    merged = chunking.merge_step1([{"raw_content": {"body_text": "Part one."}},
+                                   {"raw_content": {"body_text": "Part two."}}])
+    assert merged["raw_content"]["body_text"] == "Part one.\nPart two."
+
+
+def test_call_step1_chunks_and_merges(mock_ai, monkeypatch):
+    monkeypatch.setattr(config, "STEP1_CHUNK_MODE", "on")
+    monkeypatch.setattr(config, "STEP1_CHUNK_SIZE", 1500)
+    monkeypatch.setattr(config, "STEP1_CHUNK_OVERLAP", 200)
+    result = pipeline.call_step1("Extract the report.", _report())
+    assert result.ok
+    assert result.extra["chunks"] > 1 and result.extra["failed_chunks"] == []
+    assert result.data == CANNED_WSH_STEP1
+    assert mock_ai.state.counters["submit"] == result.extra["chunks"]
@@ -0,0 +1,52 @@
+# tests/test_digest.py
+import copy
+import pytest
+from docx import Document
+from docx.shared import Pt
+import config
+import digest
+from benchmarks.mock_server import CANNED_FINAL
+from result_cache import ResultCache
+
+FUND_FLOW_FINAL = {
+    "header_info": {"Category": "", "date": "2026/01/01", "title": "Robust Bond Flows", "summary": "Inflows of $12bn.",
+                    "tags": "should be cleared", "language": "English"},
+    "body_content": ["Equity funds saw outflows.", "Fixed income funds recorded inflows."],
+}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "RESULT_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    return ResultCache()
+
+
+def test_iter_cached_keeps_latest_per_pdf_and_postprocesses(cache):
+    cache.set("k1", dict(CANNED_FINAL, meta={"institution": "Goldman Sachs"}), stage="fused", source="pdf-a",
+              category="Equity")
+    cache.set("k2", copy.deepcopy(CANNED_FINAL), stage="step2", source="pdf-a", category="Macro")
+    cache.set("k3", copy.deepcopy(FUND_FLOW_FINAL), stage="step2", source="pdf-b", category="Weekly Fund Flow")
+    cache.set("k4", copy.deepcopy(CANNED_FINAL), stage="step2")  # 旧条目：没有来源信息
+
+    items = list(digest.iter_cached())
+    assert [category for category, _ in items] == ["Macro", "Weekly Fund Flow", "Equity"]
+    fund_flow = items[1][1]
+    assert fund_flow["header_info"]["tags"] == ""
+    assert fund_flow["header_info"]["title"] == "Robust Bond Flows"
+    assert all(payload["header_info"]["date"] != "2026/01/01" for _, payload in items)
+    assert all("meta" not in payload for _, payload in items)
+
+
+def test_digest_uses_fund_flow_style_for_fund_flow_sections(tmp_path):
+    path = str(tmp_path / "digest.docx")
+    count = digest.write_digest([("Equity", copy.deepcopy(CANNED_FINAL)),
+                                 ("Weekly Fund Flow", copy.deepcopy(FUND_FLOW_FINAL))], path, title="Digest")
+    assert count == 2
+
+    doc = Document(path)
+    sizes = {}
+    for p in doc.paragraphs:
+        if p.text in ("Equity funds saw outflows.", CANNED_FINAL["body_content"][1].replace("**", "")):
+            sizes[p.text] = p.style.font.size
+    assert sizes["Equity funds saw outflows."] == Pt(14)
+    assert sizes[CANNED_FINAL["body_content"][1].replace("**", "")] == Pt(11)
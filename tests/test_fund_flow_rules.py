@@ -0,0 +1,68 @@
+# tests/test_fund_flow_rules.py
+import pytest
+import config
+import fund_flow_rules
+import pipeline
+from benchmarks.fixtures import FUND_FLOW_TITLES, make_fund_flow_pages, make_fund_flow_pdf, make_pdf, make_report_pdf
+from pipeline import FUND_FLOW_CATEGORY
+
+
+def _good_data():
+    return {
+        "meta": {"institution": "Goldman Sachs", "title_en": "Robust Bond Flows Year-to-Date"},
+        "raw_content": {"summary_text": "Mutual funds saw net inflows of $12.5bn this week, led by the US." * 2,
+                        "body_text": "Equity funds saw flows of $3.2bn (vs. $1.1bn the week before)."},
+    }
+
+
+@pytest.mark.parametrize("institution", ["Goldman Sachs", "Morgan Stanley"])
+def test_fixture_layout_is_extracted_without_ai(institution):
+    data, problems = fund_flow_rules.extract_step1(make_fund_flow_pdf(2, seed=1, institution=institution))
+    assert problems == []
+    assert data["meta"]["institution"] == institution
+    assert data["meta"]["title_en"] in FUND_FLOW_TITLES
+    summary, body = data["raw_content"]["summary_text"], data["raw_content"]["body_text"]
+    # 项目符号去掉，折行的段落接回一段
+    assert summary.startswith("Mutual funds saw net") and "money market funds recorded" in summary
+    assert body.split("\n")[0].startswith("Equity funds saw flows")
+    assert "Cross-border FX flows" in body
+    # 图表标题之后的内容不算正文
+    assert "Exhibit" not in body
+
+
+def test_title_on_marker_line():
+    pages = make_fund_flow_pages(2, seed=2)
+    title = pages[0].pop(2)
+    pages[0][1] = f"WEEKLY FUND FLOWS: {title}"
+    data, problems = fund_flow_rules.extract_step1(make_pdf(pages))
+    assert problems == [] and data["meta"]["title_en"] == title
+
+
+def test_other_layouts_fall_back():
+    data, problems = fund_flow_rules.extract_step1(make_report_pdf(2, seed=1))
+    assert data is None and problems
+    data, problems = fund_flow_rules.extract_step1(b"not a pdf")
+    assert data is None and problems[0].startswith("版面读取失败")
+
+
+def test_check_flags_low_confidence_fields():
+    assert fund_flow_rules.check(_good_data(), "Mutual funds saw net inflows") == []
+    data = _good_data()
+    data["meta"] = {"institution": "", "title_en": "WEEKLY FUND FLOWS"}
+    data["raw_content"]["summary_text"] = "Short."
+    data["raw_content"]["body_text"] = "No numbers here."
+    problems = fund_flow_rules.check(data, "(cid:1)(cid:2)(cid:3) text")
+    assert len(problems) == 5
+    assert any("乱码" in p for p in problems)
+
+
+def test_pipeline_skips_ai_step1_when_rules_match(mock_ai, monkeypatch):
+    pdf = make_fund_flow_pdf(2, seed=3)
+    pipeline.build_report(pdf, FUND_FLOW_CATEGORY, "A", source_name="flows.pdf", on_status=lambda msg: None,
+                          mode="two_step")
+    assert mock_ai.state.counters["submit"] == 1  # 只有 Step 2
+
+    monkeypatch.setattr(config, "FUND_FLOW_RULES_ENABLED", False)
+    pipeline.build_report(make_fund_flow_pdf(2, seed=4), FUND_FLOW_CATEGORY, "A", source_name="flows2.pdf",
+                          on_status=lambda msg: None, mode="two_step")
+    assert mock_ai.state.counters["submit"] == 3
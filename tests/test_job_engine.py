@@ -0,0 +1,75 @@
+# tests/test_job_engine.py
+import time
+import threading
+import job_engine
+from job_engine import PollPolicy, deadline_scope, job_journal, run_job_sync, run_many_sync
+
+FAST = PollPolicy(initial_delay=0.02, max_interval=0.05, backoff=1.5, deadline=5)
+PROMPT = "Output Schema"
+
+
+def test_sync_calls_share_one_connection_pool(mock_ai):
+    for i in range(5):
+        assert run_job_sync(PROMPT, f"doc {i}", policy=FAST).ok
+    # 1 个取 Token 的连接 + 1 个任务连接；以前每次调用都新建客户端 (6 个连接)
+    assert mock_ai.state.counters["connections"] == 2
+    results = run_many_sync([(PROMPT, f"doc {i}") for i in range(3)], policy=FAST)
+    assert all(r.ok for r in results)
+    assert mock_ai.state.counters["connections"] <= 4
+    assert job_engine.get_background_loop().http is not None
+
+
+def test_caller_context_reaches_background_loop(mock_ai):
+    with deadline_scope(-1):
+        result = run_job_sync(PROMPT, "doc", policy=FAST)
+    assert not result.ok and "预算" in result.error
+    assert mock_ai.state.counters["submit"] == 0
+
+
+def test_html_poll_response_is_retried(mock_ai):
+    mock_ai.state.html_error_rate = 0.5
+    results = run_many_sync([(PROMPT, f"doc {i}") for i in range(5)], policy=FAST)
+    assert all(r.ok for r in results)
+    assert mock_ai.state.counters["html_errors"] > 0
+
+
+def test_html_poll_response_until_deadline_is_structured_error(mock_ai):
+    mock_ai.state.html_error_rate = 1.0
+    result = run_job_sync(PROMPT, "doc", policy=PollPolicy(initial_delay=0.02, max_interval=0.05, deadline=0.3))
+    assert not result.ok
+    assert "不是 JSON" in result.error
+
+
+class _SlowJournal:
+    # 模拟等 SQLite 写锁的任务日志
+    def __init__(self):
+        self.recorded = {}
+
+    def lookup(self, prompt_key):
+        time.sleep(1.0)
+        return None
+
+    def record(self, prompt_key, job_id):
+        time.sleep(1.0)
+        self.recorded[prompt_key] = job_id
+
+
+def test_journal_calls_do_not_block_shared_loop(mock_ai):
+    journal = _SlowJournal()
+    slow = []
+
+    def journaled():
+        token = job_journal.set(journal)
+        try:
+            slow.append(run_job_sync(PROMPT, "journaled", policy=FAST))
+        finally:
+            job_journal.reset(token)
+
+    thread = threading.Thread(target=journaled)
+    thread.start()
+    time.sleep(0.2)
+    started = time.monotonic()
+    assert run_job_sync(PROMPT, "other", policy=FAST).ok
+    assert time.monotonic() - started < 0.7
+    thread.join(timeout=10)
+    assert slow[0].ok and len(journal.recorded) == 1
@@ -0,0 +1,74 @@
+# tests/test_json_repair.py
+import pytest
+import json_repair
+from json_repair import loads, repair_json, validate
+
+
+def test_valid_json_is_not_marked_repaired():
+    assert loads('{"a": 1, "b": [1, 2]}') == ({"a": 1, "b": [1, 2]}, False)
+
+
+def test_trailing_commas():
+    assert loads('{"a": 1, "b": [1, 2,],}') == ({"a": 1, "b": [1, 2]}, True)
+
+
+def test_code_fences_and_trailing_text():
+    assert loads('```json\n{"a": 1}\n```\nLet me know if you need more.')[0] == {"a": 1}
+
+
+def test_brackets_in_preamble_are_skipped():
+    assert loads('Here is the result [JSON]:\n```json\n{"a": 1}\n```')[0] == {"a": 1}
+    assert loads('Note (see [1]): {"a": 1}')[0] == {"a": 1}
+    # 没有 object 时才把 [ 当作开头
+    assert loads("Result: [1, 2]")[0] == [1, 2]
+
+
+def test_truncated_output_is_closed():
+    assert loads('```json\n{"a": "x", "b": [1, 2') == ({"a": "x", "b": [1, 2]}, True)
+    assert loads('{"title": "Robust bond flo') == ({"title": "Robust bond flo"}, True)
+
+
+def test_truncation_that_drops_content_fails():
+    with pytest.raises(ValueError):
+        loads('{"a": 1, "b')
+
+
+def test_inner_quotes_are_kept():
+    data, repaired = loads('{"title": "Stocks "rallied", analysts said"}')
+    assert repaired and data == {"title": 'Stocks "rallied", analysts said'}
+    assert loads('{"a": "He said "hi" today", "b": 2}')[0] == {"a": 'He said "hi" today', "b": 2}
+    assert loads('{"a": ["x "y" z", "w"]}')[0] == {"a": ['x "y" z', "w"]}
+
+
+def test_newlines_literals_comments_and_missing_commas():
+    data, _ = loads('{"a": "line 1\nline 2", "b": True, "c": None // note\n "d": 1}')
+    assert data == {"a": "line 1\nline 2", "b": True, "c": None, "d": 1}
+    assert loads('{"a": "x" "b": 1}')[0] == {"a": "x", "b": 1}
+
+
+def test_repair_json_returns_text():
+    assert repair_json('{"a": [1, 2,') == '{"a": [1, 2]}'
+
+
+def test_unrepairable_raises():
+    with pytest.raises(ValueError):
+        loads("no json here")
+
+
+def test_validate_accepts_expected_shape():
+    assert validate({"header_info": {}, "body_content": ["p"], "footer_info": {}}, "wsh_final") == []
+    assert validate({"meta": {}, "raw_content": {}}, "fund_flow_step1") == []
+
+
+def test_validate_reports_problems():
+    assert validate([], "wsh_final") == ["顶层应为 object，实际为 list"]
+    problems = validate({"header_info": "x", "body_content": [1], "footer_info": []}, "wsh_final")
+    assert "header_info 应为 object" in problems
+    assert "footer_info 应为 object" in problems
+    assert "body_content 的每一项都应为 string" in problems
+    assert validate({"header_info": {}, "body_content": []}, "wsh_fused") == ["缺少字段 meta"]
+
+
+def test_describe_lists_fields():
+    text = json_repair.describe("wsh_final")
+    assert '"header_info": object' in text and '"footer_info": object (optional)' in text
@@ -0,0 +1,26 @@
+# tests/test_metrics.py
+import threading
+import metrics
+
+
+def test_concurrent_prometheus_writes(tmp_path):
+    registry = metrics.MetricsRegistry()
+    registry.count("reports_total", category="Equity", status="ok")
+    path = str(tmp_path / "metrics.prom")
+    errors = []
+
+    def writer():
+        try:
+            for _ in range(50):
+                registry.write_prometheus(path)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert "ai_report_reports_total" in open(path, encoding="utf-8").read()
+    assert [p.name for p in tmp_path.iterdir()] == ["metrics.prom"]
@@ -0,0 +1,99 @@
+# tests/test_pdf_backends.py
+import pytest
+import config
+import pdf_backends
+import pdf_extract
+from benchmarks.fixtures import make_report_pdf
+from pdf_backends import TextBackend
+
+
+class _FakeBackend(TextBackend):
+    module = "json"
+
+    def __init__(self, name, text=None, error=None, installed=True):
+        self.name = name
+        self.text = text
+        self.error = error
+        self.installed = installed
+        self.calls = 0
+
+    def available(self):
+        return self.installed
+
+    def count_pages(self, pdf_bytes):
+        return 5
+
+    def extract(self, pdf_bytes, page_numbers):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return {i: self.text for i in page_numbers}
+
+
+def _register(monkeypatch, *backends):
+    for backend in backends:
+        monkeypatch.setitem(pdf_backends.BACKENDS, backend.name, backend)
+    return [backend.name for backend in backends]
+
+
+def test_garbled_ratio():
+    assert pdf_backends.garbled_ratio("Revenue grew 8%") == 0.0
+    assert pdf_backends.garbled_ratio("ab(cid:12)") > 0.5
+    assert pdf_backends.garbled_ratio("a\ufffd") == 0.5
+    assert pdf_backends.garbled_ratio(" \n ") is None
+
+
+def test_get_backend_rejects_unknown_name():
+    assert pdf_backends.get_backend("pdfminer").name == "pdfminer"
+    with pytest.raises(ValueError, match="pdfplumber"):
+        pdf_backends.get_backend("acrobat")
+
+
+def test_probe_picks_first_clean_backend(monkeypatch):
+    names = _register(monkeypatch, _FakeBackend("fast", "Revenue grew 8%"), _FakeBackend("slow", "Revenue grew 8%"))
+    name, texts, ratio = pdf_extract._probe_backends(b"%PDF", names, 3, 0.02)
+    assert (name, ratio) == ("fast", 0.0)
+    assert texts == {0: "Revenue grew 8%", 1: "Revenue grew 8%", 2: "Revenue grew 8%"}
+    assert pdf_backends.BACKENDS["slow"].calls == 0
+
+
+def test_probe_falls_back_past_garbled_failing_and_missing_backends(monkeypatch):
+    garbled = _FakeBackend("garbled", "(cid:1)(cid:2) text")
+    broken = _FakeBackend("broken", error=RuntimeError("bad xref"))
+    missing = _FakeBackend("missing", "Revenue", installed=False)
+    clean = _FakeBackend("clean", "Revenue grew 8%")
+    names = _register(monkeypatch, garbled, broken, missing, clean)
+    # 未知名称、未安装的后端跳过；真实的 pymupdf 在这里可能没有安装，同样跳过
+    name, _, _ = pdf_extract._probe_backends(b"%PDF", ["unknown", "pymupdf"] + names, 3, 0.02)
+    assert name == "clean"
+    assert garbled.calls == broken.calls == 1 and missing.calls == 0
+
+
+def test_probe_keeps_least_garbled_when_none_pass(monkeypatch):
+    names = _register(monkeypatch, _FakeBackend("worse", "(cid:1)(cid:2)ab"), _FakeBackend("bad", "(cid:1)abcdefgh"))
+    name, _, ratio = pdf_extract._probe_backends(b"%PDF", names, 3, 0.02)
+    assert name == "bad" and 0 < ratio < 1
+    # 没有可用的后端时退回 pdfplumber
+    assert pdf_extract._probe_backends(b"%PDF", ["unknown"], 3, 0.02) == ("pdfplumber", {}, None)
+
+
+def test_explicit_backend_skips_probe(monkeypatch):
+    monkeypatch.setattr(config, "PDF_TEXT_BACKEND", "pdfminer")
+    monkeypatch.setattr(pdf_extract, "_get_pool", lambda: pytest.fail("不应试读"))
+    assert pdf_extract.resolve_backend(b"%PDF") == "pdfminer"
+    monkeypatch.setattr(config, "PDF_TEXT_BACKEND", "acrobat")
+    with pytest.raises(ValueError):
+        pdf_extract.resolve_backend(b"%PDF")
+
+
+def test_available_backends_read_same_text():
+    pdf = make_report_pdf(2, seed=7)
+    texts = {}
+    for name, backend in pdf_backends.BACKENDS.items():
+        if backend.available():
+            assert backend.count_pages(pdf) == 2
+            texts[name] = backend.extract(pdf, [1])[1]
+    assert "pdfplumber" in texts
+    # 各后端的换行 / 空白可能不同，文字内容一致
+    words = {name: text.split() for name, text in texts.items()}
+    assert all(w == words["pdfplumber"] for w in words.values()), words
@@ -0,0 +1,20 @@
+# tests/test_pipeline.py
+from pipeline import detect_bank
+
+
+def test_detect_bank_from_header_line():
+    assert detect_bank("Goldman Sachs | Global Investment Research\nTencent (0700.HK)") == "GS"
+    assert detect_bank("J.P. Morgan Asia Pacific Equity Research\n12 March 2026") == "JPM"
+    assert detect_bank("UBS Global Research\nChina internet") == "UBS"
+
+
+def test_detect_bank_ignores_substrings_in_body_text():
+    assert detect_bank("HSBC Global Research\nHow to subscribe to our Latin America notes") == "HSBC"
+    assert detect_bank("China subsidies boost EV demand\nOutlook for 2H") is None
+    assert detect_bank("Deutsche Bank Research\nChina subsidies and the Bank of America survey") == "DB"
+
+
+def test_detect_bank_prefers_first_and_longest_match():
+    # "Morgan Stanley" 与 "J.P. Morgan" 同在一行时取最靠前的
+    assert detect_bank("Morgan Stanley Research, data from J.P. Morgan\n") == "MS"
+    assert detect_bank("") is None
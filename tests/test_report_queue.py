@@ -0,0 +1,97 @@
+# tests/test_report_queue.py
+import time
+import pytest
+from benchmarks.fixtures import make_report_pdf
+from benchmarks.mock_server import CANNED_FINAL, CANNED_WSH_STEP1
+from report_queue import QueueWorkers, ReportQueue, STATUS_DONE, STATUS_FAILED, STATUS_QUEUED, STATUS_RUNNING
+
+PDF = b"%PDF-1.4 test"
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return ReportQueue(str(tmp_path / "queue.sqlite3"))
+
+
+def _expire_heartbeats(queue):
+    with queue._connect() as conn:
+        conn.execute("UPDATE report_jobs SET heartbeat = ?", (time.time() - 3600,))
+
+
+def test_enqueue_dedupes_active_jobs(queue):
+    first = queue.enqueue(PDF, "Equity", "A", "a.pdf")
+    assert queue.enqueue(PDF, "Equity", "A", "a.pdf") == first
+    # 类别、模式、用户不同都是新任务
+    assert queue.enqueue(PDF, "Macro", "A", "a.pdf") != first
+    assert queue.enqueue(PDF, "Equity", "A", "a.pdf", mode="fused") != first
+    assert queue.enqueue(PDF, "Equity", "B", "a.pdf") != first
+    assert len(queue.list_jobs("A")) == 3 and len(queue.list_jobs("B")) == 1
+
+
+def test_finished_job_can_be_enqueued_again(queue):
+    first = queue.enqueue(PDF, "Equity", "A", "a.pdf")
+    queue.claim_next("w1")
+    assert queue.finish(first, "w1", b"docx", "a.docx")
+    assert queue.enqueue(PDF, "Equity", "A", "a.pdf") != first
+
+
+def test_claim_takes_oldest_queued_job_once(queue):
+    first = queue.enqueue(PDF, "Equity", "A", "a.pdf")
+    second = queue.enqueue(PDF, "Macro", "A", "a.pdf")
+    assert queue.claim_next("w1")["id"] == first
+    assert queue.claim_next("w2")["id"] == second
+    assert queue.claim_next("w3") is None
+    job = queue.get(first)
+    assert job["status"] == STATUS_RUNNING and job["attempts"] == 1
+
+
+def test_stale_job_is_requeued_and_keeps_backend_jobs(queue):
+    job_id = queue.enqueue(PDF, "Equity", "A", "a.pdf")
+    queue.claim_next("w1")
+    queue.record_backend_job(job_id, "prompt", "backend-1")
+    assert queue.requeue_stale() == 0  # 心跳还新鲜
+    _expire_heartbeats(queue)
+    assert queue.requeue_stale() == 1
+    assert queue.get(job_id)["status"] == STATUS_QUEUED
+    assert queue.lookup_backend_job(job_id, "prompt") == "backend-1"
+
+
+def test_job_that_keeps_crashing_is_failed(queue):
+    job_id = queue.enqueue(PDF, "Equity", "A", "a.pdf")
+    for attempt in range(3):
+        assert queue.claim_next(f"w{attempt}")["id"] == job_id
+        _expire_heartbeats(queue)
+        queue.requeue_stale(max_attempts=3)
+    job = queue.get(job_id)
+    assert job["status"] == STATUS_FAILED and job["failed_stage"] == "worker"
+    assert queue.claim_next("w9") is None
+
+
+def test_original_worker_cannot_overwrite_rerun(queue):
+    job_id = queue.enqueue(PDF, "Equity", "A", "a.pdf")
+    queue.claim_next("old")
+    _expire_heartbeats(queue)
+    queue.requeue_stale()
+    queue.claim_next("new")
+    assert not queue.finish(job_id, "old", b"stale", "old.docx")
+    assert not queue.fail(job_id, "old", "step1", "boom")
+    assert queue.get(job_id)["status"] == STATUS_RUNNING
+    assert queue.finish(job_id, "new", b"fresh", "new.docx")
+    assert queue.fetch_docx(job_id) == (b"fresh", "new.docx")
+
+
+def test_worker_runs_task_to_done(queue, monkeypatch):
+    import config
+    monkeypatch.setattr(config, "METRICS_LOG_PATH", "")
+    monkeypatch.setattr(config, "FIGURE_AUTO_EXTRACT", False)
+
+    def runner(pdf_text, category, **kwargs):
+        return dict(CANNED_WSH_STEP1), {k: dict(v) if isinstance(v, dict) else list(v) for k, v in CANNED_FINAL.items()}
+
+    job_id = queue.enqueue(make_report_pdf(2), "Equity", "A", "tencent.pdf")
+    workers = QueueWorkers(queue, workers=1, runner=runner)
+    workers.run_task(queue.claim_next(workers.worker_id))
+    job = queue.get(job_id)
+    assert job["status"] == STATUS_DONE, job["error"]
+    docx, filename = queue.fetch_docx(job_id)
+    assert docx.startswith(b"PK") and filename == "Equity_A_GS_tencent.docx"
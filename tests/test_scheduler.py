@@ -0,0 +1,203 @@
+# tests/test_scheduler.py
+import time
+import asyncio
+import pytest
+import config
+from job_engine import PollPolicy, deadline_scope, run_many_sync
+from scheduler import Scheduler, SchedulerTimeout, lane_scope, retry_after_seconds
+
+LANES = {"interactive": 1, "batch": 2}
+
+
+def _scheduler(rate=100, burst=3, max_in_flight=100):
+    return Scheduler(rate=rate, burst=burst, max_in_flight=max_in_flight, lanes=LANES)
+
+
+class _Resp:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def test_token_bucket_limits_burst_then_refills():
+    s = _scheduler(rate=10, burst=3)
+    assert [s.try_token() for _ in range(4)] == [True, True, True, False]
+    # 每秒 10 个：0.1 秒补回 1 个，且不超过 burst
+    time.sleep(0.15)
+    assert s.try_token() is True
+    assert s.try_token() is False
+    s._refilled -= 60
+    assert [s.try_token() for _ in range(4)] == [True, True, True, False]
+
+
+def test_acquire_waits_for_token():
+    s = _scheduler(rate=20, burst=1)
+
+    async def run():
+        first = await s.acquire()
+        s.release()
+        second = await s.acquire()
+        s.release()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first < 0.02
+    assert second >= 0.03  # 令牌用完，要等约 1 / 20 秒
+
+
+def test_in_flight_cap_and_deadline():
+    s = _scheduler(max_in_flight=1)
+
+    async def run():
+        await s.acquire()
+        with pytest.raises(SchedulerTimeout):
+            await s.acquire(deadline=time.monotonic() + 0.1)
+        assert s.stats()["lanes"]["interactive"]["queued"] == 0  # 超时的请求已离开队列
+        s.release()
+        await s.acquire(deadline=time.monotonic() + 1)
+        return s.stats()["in_flight"]
+
+    assert asyncio.run(run()) == 1
+
+
+def test_interactive_lane_served_before_earlier_batch():
+    s = _scheduler(max_in_flight=1)
+    order = []
+
+    async def waiter(lane):
+        await s.acquire(lane)
+        order.append(lane)
+        s.release()
+
+    async def run():
+        await s.acquire("batch")
+        batch = asyncio.create_task(waiter("batch"))
+        await asyncio.sleep(0.05)
+        interactive = asyncio.create_task(waiter("interactive"))
+        await asyncio.sleep(0.05)
+        assert order == []
+        s.release()
+        await asyncio.gather(batch, interactive)
+
+    asyncio.run(run())
+    assert order == ["interactive", "batch"]
+
+
+def test_slot_holding_retry_skips_tickets_waiting_for_slot():
+    s = _scheduler(max_in_flight=1)
+
+    async def run():
+        await s.acquire()  # 在途名额已占满，这个任务被限流后要重试
+        waiting = asyncio.create_task(s.acquire(deadline=time.monotonic() + 3))
+        await asyncio.sleep(0.05)
+        # 重试不能排在等名额的请求后面，否则双方都等到截止时间
+        waited = await s.acquire(need_slot=False, deadline=time.monotonic() + 1)
+        s.release()
+        await waiting
+        s.release()
+        return waited
+
+    assert asyncio.run(run()) < 0.2
+
+
+def test_batch_retry_not_blocked_by_waiting_interactive():
+    s = _scheduler(max_in_flight=1)
+
+    async def run():
+        await s.acquire("batch")
+        interactive = asyncio.create_task(s.acquire("interactive", deadline=time.monotonic() + 3))
+        await asyncio.sleep(0.05)
+        await s.acquire("batch", need_slot=False, deadline=time.monotonic() + 1)
+        s.release()
+        await interactive
+        s.release()
+
+    asyncio.run(run())
+
+
+def test_retry_keeps_lane_order_when_slots_are_free():
+    s = _scheduler(rate=10, burst=1, max_in_flight=5)
+    order = []
+
+    async def waiter(lane, need_slot):
+        await s.acquire(lane, need_slot=need_slot)
+        order.append(lane)
+
+    async def run():
+        await s.acquire("batch")  # 用掉唯一的令牌
+        interactive = asyncio.create_task(waiter("interactive", True))
+        await asyncio.sleep(0.02)
+        retry = asyncio.create_task(waiter("batch", False))
+        await asyncio.gather(interactive, retry)
+
+    asyncio.run(run())
+    # 名额没满时重试不能插队：下一个令牌先给 interactive
+    assert order == ["interactive", "batch"]
+
+
+def test_throttled_retries_finish_with_saturated_slots(mock_ai, monkeypatch):
+    monkeypatch.setattr(config, "AI_MAX_IN_FLIGHT", 1)
+    mock_ai.state.rate_limit = 1  # 每秒只接受 1 次提交，其余返回 429 + Retry-After: 1
+    policy = PollPolicy(initial_delay=0.02, max_interval=0.05, backoff=1.5, deadline=10)
+    with deadline_scope(8):
+        results = run_many_sync([("Output Schema", f"doc {i}") for i in range(3)], policy=policy)
+    assert all(r.ok for r in results), [r.error for r in results]
+    assert mock_ai.state.counters["throttled"] >= 1
+
+
+def test_lane_scope_and_priority():
+    s = _scheduler()
+    assert s.priority() == 1
+    with lane_scope("batch"):
+        assert s.lane() == "batch" and s.priority() == 2
+    assert s.lane("unknown") == "interactive"
+
+
+def test_throttle_halves_rate_once_per_pause():
+    s = _scheduler(rate=8)
+    s.on_throttle(429, retry_after=0.2)
+    assert s.rate == 4
+    assert 0.1 < s.stats()["paused_sec"] <= 0.2
+    assert s.try_token() is False
+    # 同一波暂停里的其他 429 不再减速，只按 Retry-After 延长
+    s.on_throttle(429, retry_after=1.0)
+    s.on_throttle(503)
+    assert s.rate == 4
+    assert 0.9 < s.stats()["paused_sec"] <= 1.0
+
+
+def test_throttle_backoff_grows_and_rate_has_floor(monkeypatch):
+    monkeypatch.setattr(config, "AI_THROTTLE_BACKOFF_BASE", 1.0)
+    monkeypatch.setattr(config, "AI_THROTTLE_BACKOFF_MAX", 4.0)
+    monkeypatch.setattr(config, "AI_THROTTLE_MIN_RATE", 0.5)
+    s = _scheduler(rate=2)
+    backoffs = []
+    for _ in range(5):
+        s._paused_until = 0.0  # 上一次暂停已结束
+        s.on_throttle(503)
+        backoffs.append(s._backoff)
+        # 无 Retry-After 时按退避时长加抖动暂停 (0.5x ~ 1x)
+        assert s._backoff * 0.5 - 0.01 <= s.stats()["paused_sec"] <= s._backoff
+    assert backoffs == [1.0, 2.0, 4.0, 4.0, 4.0]
+    assert s.rate == 0.5
+
+
+def test_success_recovers_rate_additively(monkeypatch):
+    monkeypatch.setattr(config, "AI_THROTTLE_RECOVERY", 0.1)
+    s = _scheduler(rate=10)
+    s.on_throttle(429, retry_after=0.01)
+    assert s.rate == 5
+    s._adjusted = time.monotonic() - 2  # 2 秒内恢复上限的 20%
+    s.on_success()
+    assert s.rate == pytest.approx(7, abs=0.1)
+    assert s._backoff == 0
+    s._adjusted = time.monotonic() - 60
+    s.on_success()
+    assert s.rate == 10
+
+
+def test_retry_after_seconds(monkeypatch):
+    monkeypatch.setattr(config, "AI_THROTTLE_BACKOFF_MAX", 60.0)
+    assert retry_after_seconds(_Resp({"Retry-After": "3"})) == 3.0
+    assert retry_after_seconds(_Resp({"Retry-After": "600"})) == 60.0
+    assert retry_after_seconds(_Resp({"Retry-After": "Wed, 21 Oct 2026 07:28:00 GMT"})) is None
+    assert retry_after_seconds(_Resp({})) is None
@@ -0,0 +1,93 @@
+# tests/test_service.py
+import pytest
+from fastapi.testclient import TestClient
+import config
+import report_queue
+import service
+from benchmarks.fixtures import make_report_pdf
+from benchmarks.mock_server import CANNED_FINAL, CANNED_WSH_STEP1
+from report_queue import QueueWorkers, STATUS_DONE, STATUS_QUEUED, STATUS_RUNNING
+from service_client import RemoteQueue, ServiceError
+
+# TestClient 对 requests 风格的 timeout 参数给出弃用警告
+pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning")
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "REPORT_QUEUE_PATH", str(tmp_path / "queue.sqlite3"))
+    monkeypatch.setattr(config, "SERVICE_WORKER_TOKEN", None)
+    monkeypatch.setattr(config, "METRICS_LOG_PATH", "")
+    monkeypatch.setattr(config, "FIGURE_AUTO_EXTRACT", False)
+    monkeypatch.setattr(report_queue, "_shared_queue", None)
+    return TestClient(service.app)  # 不进入 lifespan：API 进程里不起 worker
+
+
+def _remote(api, token=None):
+    # 远程 worker 的客户端，请求直接交给测试用的 API (不经过网络)
+    remote = RemoteQueue("http://testserver", token=token)
+    api.headers.update({k: v for k, v in remote.session.headers.items() if k == "X-Worker-Token"})
+    remote.session = api
+    return remote
+
+
+def _submit(api, name="tencent.pdf"):
+    resp = api.post("/reports", files={"pdf": (name, make_report_pdf(2), "application/pdf")},
+                    data={"category": "Equity", "user_name": "A"})
+    assert resp.status_code == 202
+    return resp.json()["id"]
+
+
+def _runner(pdf_text, category, **kwargs):
+    return dict(CANNED_WSH_STEP1), {k: dict(v) if isinstance(v, dict) else list(v) for k, v in CANNED_FINAL.items()}
+
+
+def test_remote_worker_runs_job_through_api(api):
+    job_id = _submit(api)
+    remote = _remote(api)
+    workers = QueueWorkers(remote, workers=1, runner=_runner)
+    task = remote.claim_next(workers.worker_id)
+    assert task["id"] == job_id and task["pdf"].startswith(b"%PDF") and task["image"] is None
+    assert api.get(f"/reports/{job_id}").json()["status"] == STATUS_RUNNING
+    assert remote.claim_next("other") is None
+
+    workers.run_task(task)
+    job = api.get(f"/reports/{job_id}").json()
+    assert job["status"] == STATUS_DONE, job["error"]
+    resp = api.get(job["download_url"])
+    assert resp.status_code == 200 and resp.content.startswith(b"PK")
+    assert "Equity_A_GS_tencent.docx" in resp.headers["Content-Disposition"]
+
+
+def test_remote_journal_and_superseded_worker(api):
+    job_id = _submit(api)
+    remote = _remote(api)
+    remote.claim_next("old")
+    assert remote.lookup_backend_job(job_id, "prompt") is None
+    remote.record_backend_job(job_id, "prompt", "backend-1")
+    assert remote.lookup_backend_job(job_id, "prompt") == "backend-1"
+
+    # 原 worker 心跳超时，任务重新排队并被新 worker 接手
+    with report_queue.get_shared_queue()._connect() as conn:
+        conn.execute("UPDATE report_jobs SET heartbeat = 0")
+    assert remote.requeue_stale() == 1
+    assert api.get(f"/reports/{job_id}").json()["status"] == STATUS_QUEUED
+    remote.claim_next("new")
+    assert remote.lookup_backend_job(job_id, "prompt") == "backend-1"
+    assert not remote.finish(job_id, "old", b"stale", "old.docx")
+    assert not remote.fail(job_id, "old", "step1", "boom")
+    remote.set_stage(job_id, "new", "Step 2")
+    assert api.get(f"/reports/{job_id}").json()["stage"] == "Step 2"
+    assert remote.finish(job_id, "new", b"fresh", "new.docx")
+    assert api.get(f"/reports/{job_id}/download").content == b"fresh"
+    assert remote.purge() == 0
+
+
+def test_worker_endpoints_check_token(api, monkeypatch):
+    anonymous = _remote(api)
+    monkeypatch.setattr(config, "SERVICE_WORKER_TOKEN", "secret")
+    with pytest.raises(ServiceError, match="401"):
+        anonymous.claim_next("w")
+    assert _remote(api, token="secret").claim_next("w") is None
+    # 网页用的接口不需要口令
+    assert api.get("/reports", params={"owner": "A"}, headers={"X-Worker-Token": ""}).status_code == 200
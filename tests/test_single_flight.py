@@ -0,0 +1,153 @@
+# tests/test_single_flight.py
+import time
+import socket
+import threading
+import subprocess
+import sys
+import config
+from job_engine import JobResult, deadline_scope
+from result_cache import ResultCache
+from single_flight import BUDGET_ERROR, InflightStore, SingleFlight
+
+
+class _Execute:
+    """
+    模拟提交 AI 任务：记录调用次数，按顺序返回 results 里的结果
+    """
+    def __init__(self, *results, delay=0.3, cache=None, key=None):
+        self.results = list(results)
+        self.delay = delay
+        self.cache = cache
+        self.key = key
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        time.sleep(self.delay)
+        if result.ok and self.cache is not None:
+            self.cache.set(self.key, result.data, stage="step1")
+        return result
+
+
+def _run_threads(flights, key, execute, n, **kwargs):
+    results = [None] * n
+
+    def worker(i):
+        results[i] = flights.run(key, execute, stage="step1", **kwargs)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+        time.sleep(0.02)  # 第一个线程先成为领跑者
+    for t in threads:
+        t.join(timeout=10)
+    return results
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def test_same_key_in_process_runs_once():
+    flights = SingleFlight()
+    execute = _Execute(JobResult(True, data={"rating": "Buy"}))
+    results = _run_threads(flights, "k", execute, 4)
+    assert execute.calls == 1
+    assert all(r.ok and r.data == {"rating": "Buy"} for r in results)
+    assert [r.extra.get("coalesced") for r in results] == [None, "process", "process", "process"]
+    # 等待方拿到的是副本
+    results[1].data["rating"] = "Sell"
+    assert results[2].data == {"rating": "Buy"}
+    assert flights.stats() == {"running": 0, "saved": {"step1/process": 3}}
+
+
+def test_waiter_takes_over_when_leader_fails():
+    flights = SingleFlight()
+    execute = _Execute(JobResult(False, error="boom"), JobResult(True, data={"ok": 1}))
+    results = _run_threads(flights, "k", execute, 2)
+    # 领跑者失败后，等待者自己重新执行，而不是照搬失败结果
+    assert execute.calls == 2
+    assert [r.ok for r in results] == [False, True]
+    assert "coalesced" not in results[1].extra
+
+
+def test_waiter_gives_up_at_budget():
+    flights = SingleFlight()
+    execute = _Execute(JobResult(True, data={}), delay=1.0)
+    leader = threading.Thread(target=flights.run, args=("k", execute))
+    leader.start()
+    time.sleep(0.05)
+    with deadline_scope(0.2):
+        result = flights.run("k", execute)
+    leader.join()
+    assert not result.ok and result.error == BUDGET_ERROR
+    assert execute.calls == 1
+
+
+def test_cross_process_waiter_reads_leader_result_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SINGLE_FLIGHT_POLL_SEC", 0.05)
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResultCache(path)
+    other = InflightStore(path)  # 另一个进程的登记
+    assert other.claim("k", "other-process", ttl=30)
+
+    def other_finishes():
+        time.sleep(0.3)
+        cache.set("k", {"rating": "Buy"}, stage="step1")
+        other.release("k", "other-process")
+
+    threading.Thread(target=other_finishes).start()
+    flights = SingleFlight(InflightStore(path))
+    execute = _Execute(JobResult(True, data={"rating": "Sell"}))
+    result = flights.run("k", execute, stage="step1", cache=cache)
+    assert execute.calls == 0
+    assert result.ok and result.data == {"rating": "Buy"}
+    assert result.extra["coalesced"] == "cross_process"
+    assert flights.stats()["saved"] == {"step1/cross_process": 1}
+
+
+def test_cross_process_takeover_when_other_leader_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SINGLE_FLIGHT_POLL_SEC", 0.05)
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResultCache(path)
+    other = InflightStore(path)
+    assert other.claim("k", "other-process", ttl=30)
+    # 对方注销登记但没有写入结果 (失败)
+    threading.Timer(0.2, other.release, args=("k", "other-process")).start()
+
+    store = InflightStore(path)
+    flights = SingleFlight(store)
+    execute = _Execute(JobResult(True, data={"rating": "Buy"}), delay=0, cache=cache, key="k")
+    result = flights.run("k", execute, stage="step1", cache=cache)
+    assert execute.calls == 1 and result.ok
+    assert "coalesced" not in result.extra
+    assert not store.running("k")  # 执行完后注销了自己的登记
+    assert cache.get("k") == {"rating": "Buy"}
+
+
+def test_stale_inflight_entries_can_be_taken_over(tmp_path):
+    store = InflightStore(str(tmp_path / "cache.sqlite3"))
+    # 过期的登记
+    assert store.claim("expired", "a", ttl=-1)
+    assert not store.running("expired")
+    assert store.claim("expired", "b", ttl=30)
+    # 同一台机器上登记它的进程已退出
+    with store._connect() as conn:
+        conn.execute("INSERT INTO inflight VALUES (?, ?, ?, ?, ?, ?)",
+                     ("dead", "a", socket.gethostname(), _dead_pid(), time.time(), time.time() + 30))
+    assert not store.running("dead")
+    assert store.claim("dead", "b", ttl=30)
+    # 其他机器的登记无法检查进程，未过期就视为有效
+    with store._connect() as conn:
+        conn.execute("INSERT INTO inflight VALUES (?, ?, ?, ?, ?, ?)",
+                     ("remote", "a", "other-host", _dead_pid(), time.time(), time.time() + 30))
+    assert store.running("remote")
+    assert not store.claim("remote", "b", ttl=30)
+    # 只有登记者本人能注销
+    store.release("remote", "b")
+    assert store.running("remote")
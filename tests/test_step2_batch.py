@@ -0,0 +1,106 @@
+# tests/test_step2_batch.py
+import json
+import threading
+import pytest
+import config
+import pipeline
+import step2_batch
+from benchmarks.mock_server import CANNED_FINAL, canned_output
+from step2_batch import Step2Batcher, pack, split_batch_output
+
+SYSTEM_PROMPT = "Reformat the Step 1 JSON.\n\n# Output Schema\n{...}"
+
+
+class _Req:
+    def __init__(self, content):
+        self.content = content
+
+
+def test_split_batch_output_by_doc_id():
+    a, b = {"title": "A"}, {"title": "B"}
+    assert split_batch_output({"D1": a, "D2": b}, 2) == [a, b]
+    assert split_batch_output({"content": "```json\n" + json.dumps({"D2": b}) + "\n```"}, 2) == [None, b]
+    # 不是对象的部分视为缺失
+    assert split_batch_output({"D1": a, "D2": "oops"}, 3) == [a, None, None]
+    assert split_batch_output("sorry, I cannot help", 2) == [None, None]
+
+
+def test_split_batch_output_keeps_complete_docs_when_truncated():
+    text = json.dumps({"D1": {"title": "A"}, "D2": {"title": "B", "body": ["x", "y"]}})
+    sections = split_batch_output(text[:-20], 2)
+    assert sections[0] == {"title": "A"}
+
+
+def test_pack_respects_doc_and_char_budget():
+    items = [_Req("x" * 100) for _ in range(5)]
+    assert [len(b) for b in pack(items, "p", max_chars=100000, max_docs=2)] == [2, 2, 1]
+    budget = len("p") + len(step2_batch.BATCH_NOTE) + 16 + 2 * (100 + len(step2_batch.DOC_HEADER) + 8)
+    assert [len(b) for b in pack(items, "p", max_chars=budget, max_docs=10)] == [2, 2, 1]
+    # 单个就超出预算的请求自成一批，顺序不变
+    items = [_Req("a"), _Req("b" * 5000), _Req("c")]
+    batches = pack(items, "p", max_chars=2000, max_docs=10)
+    assert [[i.content[0] for i in b] for b in batches] == [["a"], ["b"], ["c"]]
+
+
+def _run_concurrently(fn, contents):
+    results = [None] * len(contents)
+
+    def worker(i):
+        results[i] = fn(SYSTEM_PROMPT, contents[i])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(contents))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=30)
+    return results
+
+
+def test_batcher_merges_documents_into_one_job(mock_ai):
+    batcher = Step2Batcher(window=0.3, max_docs=3)
+    results = _run_concurrently(batcher.run, ['{"doc": 1}', '{"doc": 2}', '{"doc": 3}'])
+    assert all(r.ok and r.data == CANNED_FINAL for r in results)
+    assert {r.extra["batch_size"] for r in results} == {3}
+    assert mock_ai.state.counters["submit"] == 1
+
+
+def test_batcher_returns_none_for_lone_document(mock_ai):
+    batcher = Step2Batcher(window=0.05)
+    assert batcher.run(SYSTEM_PROMPT, '{"doc": 1}') is None
+    assert mock_ai.state.counters["submit"] == 0
+
+
+def test_call_step2_falls_back_for_missing_document(mock_ai, monkeypatch):
+    def drop_second(prompt):
+        output = canned_output(prompt)
+        if "# Batch Notice" not in prompt:
+            return output
+        data = json.loads(output.split("```json\n", 1)[1].rsplit("\n```", 1)[0])
+        data.pop("D2")
+        return json.dumps(data)
+
+    mock_ai.state.output_fn = drop_second
+    monkeypatch.setattr(config, "STEP2_BATCH_ENABLED", True)
+    monkeypatch.setattr(step2_batch, "_shared_batcher", Step2Batcher(window=0.3, max_docs=2))
+    results = _run_concurrently(pipeline.call_step2, ['{"doc": 1}', '{"doc": 2}'])
+    assert all(r.ok and r.data == CANNED_FINAL for r in results)
+    # 第一份来自批任务，第二份缺失后单独提交
+    assert results[0].extra["batch_size"] == 2
+    assert "batch_size" not in results[1].extra
+    assert mock_ai.state.counters["submit"] == 2
+
+
+def test_failed_batch_job_falls_back_for_every_document(mock_ai, monkeypatch):
+    mock_ai.state.output_fn = lambda prompt: "not json" if "# Batch Notice" in prompt else canned_output(prompt)
+    monkeypatch.setattr(config, "STEP2_BATCH_ENABLED", True)
+    monkeypatch.setattr(step2_batch, "_shared_batcher", Step2Batcher(window=0.3, max_docs=3))
+    results = _run_concurrently(pipeline.call_step2, ['{"doc": 1}', '{"doc": 2}', '{"doc": 3}'])
+    assert all(r.ok and r.data == CANNED_FINAL for r in results)
+    assert mock_ai.state.counters["submit"] == 4
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_shared_batcher_follows_config(monkeypatch, enabled):
+    monkeypatch.setattr(config, "STEP2_BATCH_ENABLED", enabled)
+    monkeypatch.setattr(step2_batch, "_shared_batcher", None)
+    assert (step2_batch.get_shared_batcher() is not None) == enabled
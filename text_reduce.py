@@ -0,0 +1,104 @@
+# text_reduce.py
+# 送入 AI 之前的文本精简：去掉每页重复的页眉页脚，以及免责声明 / 分析师声明 / 分发说明等附录
+# 券商研报往往一半以上是这类内容，删掉之后 Step 1 的 Prompt 更短，等待时间也更短
+# 规则按机构配置 (config.TEXT_REDUCE_RULES，键与 pipeline.get_bank_acronym 的缩写一致)，"*" 为通用规则
+import re
+from collections import Counter
+import config
+
+GENERIC = "*"
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def _normalize(line):
+    # 页码、日期等数字不同的行视为同一行 ("Page 3 of 20" / "Page 4 of 20")
+    return _DIGITS_RE.sub("#", " ".join(line.split())).lower()
+
+
+def get_rules(bank=None):
+    """
+    合并通用规则与机构规则，返回 {"enabled", "sections", "lines"} (后两者为编译好的正则列表)
+    """
+    rules = config.TEXT_REDUCE_RULES
+    generic = rules.get(GENERIC, {})
+    specific = rules.get(bank, {}) if bank else {}
+    merged = {"enabled": specific.get("enabled", generic.get("enabled", True))}
+    for key in ("sections", "lines"):
+        patterns = list(generic.get(key, ())) + list(specific.get(key, ()))
+        merged[key] = [re.compile(p, re.I) for p in patterns]
+    return merged
+
+
+def repeated_lines(pages):
+    """
+    找出出现在大多数页面顶部 / 底部的行 (页眉页脚)，返回归一化后的行集合
+    只看每页开头和结尾 TEXT_REDUCE_EDGE_LINES 行，正文里重复的句子不受影响
+    """
+    edge = config.TEXT_REDUCE_EDGE_LINES
+    counts = Counter()
+    for lines in pages:
+        edges = lines[:edge] + lines[-edge:] if len(lines) > edge * 2 else lines
+        counts.update({_normalize(line) for line in edges if line.strip()})
+    threshold = max(config.TEXT_REDUCE_REPEAT_MIN_PAGES, len(pages) * config.TEXT_REDUCE_REPEAT_MIN_RATIO)
+    return {line for line, n in counts.items() if n >= threshold}
+
+
+def _find_appendix(pages, patterns, min_offset):
+    """
+    返回附录开始的位置 (页序号, 行序号)；起始行必须在全文 min_offset 个字符之后，
+    避免把首页的「详见附录」之类的提示当成附录开头
+    """
+    offset = 0
+    for p, lines in enumerate(pages):
+        for i, line in enumerate(lines):
+            if offset >= min_offset and any(pattern.match(line.strip()) for pattern in patterns):
+                return p, i
+            offset += len(line) + 1
+    return None
+
+
+def reduce_pages(page_texts, bank=None):
+    """
+    page_texts: 每页的文本 (pdf_extract.extract_pages 的结果)；bank: 机构缩写 (选择机构规则)
+    返回 (精简后的全文, 统计)；统计里 removed_chars 为删掉的字符数
+    """
+    rules = get_rules(bank)
+    pages = [text.splitlines() for text in page_texts if text]
+    chars_in = sum(len(text) + 1 for text in page_texts if text)
+    stats = {"bank": bank or GENERIC, "chars_in": chars_in, "chars_out": chars_in, "removed_chars": 0,
+             "header_chars": 0, "appendix_chars": 0, "boilerplate_chars": 0}
+    if not config.TEXT_REDUCE_ENABLED or not rules["enabled"] or not pages:
+        return "".join(f"{text}\n" for text in page_texts if text), stats
+
+    # 1. 附录 (免责声明 / 分析师声明等) 一般在文末，从起始行截到最后
+    appendix = _find_appendix(pages, rules["sections"], chars_in * config.TEXT_REDUCE_APPENDIX_MIN_RATIO)
+    if appendix:
+        p, i = appendix
+        cut = pages[p][i:] + [line for lines in pages[p + 1:] for line in lines]
+        stats["appendix_chars"] = sum(len(line) + 1 for line in cut)
+        pages = pages[:p] + [pages[p][:i]]
+
+    # 2. 页眉页脚：每种只保留第一次出现 (首页的标题行往往也是页眉)；3. 机构固定的提示语整行删除
+    repeated = repeated_lines(pages) if len(pages) >= config.TEXT_REDUCE_REPEAT_MIN_PAGES else set()
+    seen = set()
+    out = []
+    for lines in pages:
+        kept = []
+        for line in lines:
+            key = _normalize(line)
+            if key in repeated:
+                if key in seen:
+                    stats["header_chars"] += len(line) + 1
+                    continue
+                seen.add(key)
+            if any(pattern.search(line) for pattern in rules["lines"]):
+                stats["boilerplate_chars"] += len(line) + 1
+                continue
+            kept.append(line)
+        if kept:
+            out.append("\n".join(kept) + "\n")
+
+    text = "".join(out)
+    stats["chars_out"] = len(text)
+    stats["removed_chars"] = chars_in - len(text)
+    return text, stats